@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Measures how many messages per second the Bayes adapters of a bot can evaluate.
+
+`--adapters` adapters are created, each with its own examples. Every message goes through
+`can_process` and `process` of each adapter, as in `ChatBot.generate_response`.
+The previous implementation (vocabulary rebuilt for every statement, no memoized features)
+and the intent router are measured for comparison.
+
+Usage: python benchmarks/chatbot_intents.py --adapters=24 --messages=500
+"""
+import argparse
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from chatterbot.conversation import Statement
+
+from live_agent.modules.chatbot.logic_adapters.base import BaseBayesAdapter
+from live_agent.modules.chatbot.src.router import IntentRouter
+
+__all__ = []
+
+WORDS = [
+    "show",
+    "list",
+    "start",
+    "stop",
+    "analyse",
+    "value",
+    "curve",
+    "asset",
+    "monitor",
+    "help",
+    "current",
+    "select",
+    "which",
+    "what",
+    "run",
+    "query",
+    "rig",
+    "well",
+    "depth",
+    "pressure",
+]
+
+
+class LegacyFeaturesMixin:
+    """The previous implementation of the vocabulary and the features"""
+
+    @property
+    def negative_examples(self):
+        examples = []
+        my_name = str(self.__class__)
+        for adapter in self.chatbot.logic_adapters:
+            adapter_name = str(adapter.__class__)
+            if (adapter_name != my_name) and hasattr(adapter, "positive_examples"):
+                examples.extend(adapter.positive_examples)
+
+        return examples
+
+    def prepare_features(self):
+        all_examples = self.positive_examples + self.negative_examples
+        self.all_words = " ".join(all_examples).split()
+        self.all_first_words = [sentence.split(" ", 1)[0] for sentence in all_examples]
+
+    def analyze_features(self, text):
+        self.prepare_features()
+        features = {}
+
+        for word in text.split():
+            features["first_word({})".format(word)] = word in self.all_first_words
+
+        for word in text.split():
+            features["contains({})".format(word)] = word in self.all_words
+
+        for letter in "abcdefghijklmnopqrstuvwxyz":
+            features["count({})".format(letter)] = text.lower().count(letter)
+            features["has({})".format(letter)] = letter in text.lower()
+
+        return features
+
+    def get_confidence(self, statement):
+        my_features = self.analyze_features(statement.text.lower())
+        return self.classifier.classify(my_features) * self.confidence_damping_thresold
+
+
+class FakeChatBot:
+    def __init__(self, directory):
+        self.logic_adapters = []
+        self.search_algorithms = defaultdict(lambda: None)
+        self.context = {"settings": {"training": {"directory": directory}}}
+        self.router = None
+
+
+def build_examples(rng, num_examples=10):
+    return [" ".join(rng.sample(WORDS, rng.randint(1, 4))) for _ in range(num_examples)]
+
+
+def build_bot(num_adapters, legacy, directory):
+    rng = random.Random(42)
+    chatbot = FakeChatBot(directory)
+    bases = (LegacyFeaturesMixin, BaseBayesAdapter) if legacy else (BaseBayesAdapter,)
+
+    for index in range(num_adapters):
+        adapter_class = type(
+            f"IntentAdapter{index}", bases, {"positive_examples": build_examples(rng)}
+        )
+        chatbot.logic_adapters.append(adapter_class(chatbot))
+
+    return chatbot
+
+
+def handle_message(chatbot, statement):
+    if chatbot.router is not None:
+        chatbot.router.refresh(chatbot.logic_adapters)
+
+    for adapter in chatbot.logic_adapters:
+        if chatbot.router is not None and not chatbot.router.is_candidate(adapter, statement):
+            continue
+
+        if adapter.can_process(statement):
+            adapter.process(statement)
+
+
+def measure(label, chatbot, messages):
+    # Train the classifiers before measuring
+    handle_message(chatbot, Statement(text=messages[0]))
+
+    started_at = time.perf_counter()
+    for text in messages:
+        handle_message(chatbot, Statement(text=text))
+
+    elapsed = time.perf_counter() - started_at
+    print(f"{label:>18}: {len(messages) / elapsed:>8.0f} messages/s")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Chatbot intents benchmark")
+    parser.add_argument("--adapters", type=int, default=24, help="Number of Bayes adapters")
+    parser.add_argument("--messages", type=int, default=500, help="Number of messages")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    rng = random.Random(7)
+    messages = build_examples(rng, args.messages)
+
+    with tempfile.TemporaryDirectory() as directory:
+        measure("before", build_bot(args.adapters, True, directory), messages)
+        measure("after", build_bot(args.adapters, False, directory), messages)
+
+        chatbot = build_bot(args.adapters, False, directory)
+        chatbot.router = IntentRouter(directory=directory)
+        measure("with router", chatbot, messages)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compares sending events to Live one by one (`raw.create`) and in batches (`EventBuffer`).
+
+The events are sent to a local stub of the REST input, which counts the requests and the
+events received and can simulate a slow Live with `--delay`.
+
+Usage: python benchmarks/event_output.py --events=5000 --delay=0.005
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from live_client.events import raw
+
+from live_agent.services.output import EventBuffer
+
+__all__ = []
+
+received = {"requests": 0, "events": 0}
+received_lock = threading.Lock()
+
+
+class RestInputStub(BaseHTTPRequestHandler):
+    delay = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.delay)
+
+        with received_lock:
+            received["requests"] += 1
+            received["events"] += len(body) if isinstance(body, list) else 1
+
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(delay):
+    RestInputStub.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RestInputStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_event(index):
+    return {"TIME": {"value": index, "uom": "s"}, "ROP": {"value": index * 0.1, "uom": "m/h"}}
+
+
+def measure(label, num_events, create_event):
+    received.update(requests=0, events=0)
+    started_at = time.perf_counter()
+
+    for index in range(num_events):
+        create_event(build_event(index))
+
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"{label:>8}: {received['events']} events in {received['requests']} requests, "
+        f"{elapsed:.2f}s ({num_events / elapsed:.0f} events/s)"
+    )
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Event output benchmark")
+    parser.add_argument("--events", type=int, default=5000, help="Number of events sent")
+    parser.add_argument("--delay", type=float, default=0, help="Delay for each request, in seconds")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    server = start_server(args.delay)
+    live_settings = {
+        "url": f"http://127.0.0.1:{server.server_port}",
+        "rest_input": "/services/plugin-restinput/benchmark/",
+        "username": "benchmark",
+        "password": "benchmark",
+    }
+
+    try:
+        measure(
+            "single",
+            args.events,
+            lambda event: raw.create("benchmark", event, {"live": live_settings}),
+        )
+
+        event_buffer = EventBuffer(live_settings)
+
+        def create_and_flush(event):
+            event_buffer.create("benchmark", event)
+            if event["TIME"]["value"] == args.events - 1:
+                event_buffer.flush()
+
+        measure("batched", args.events, create_and_flush)
+        event_buffer.close()
+    finally:
+        server.shutdown()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Measures how fast the frames replayed by `las_replayer` are built from a synthetic LAS file,
+reading it with `LASReader` (streaming) and with `lasio.read` (in memory).
+
+The file is generated on a temporary dir (or at `--path`) with `--rows` rows and `--curves`
+curves, around 11 bytes per value. Use `--rows=20000000 --curves=10` for a file with ~2GB.
+Nothing is sent to Live and there is no delay between the frames.
+
+Usage: python benchmarks/las_replay.py --rows=100000 --curves=200
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import lasio
+import numpy as np
+
+from live_agent.modules.las.utils import frames
+from live_agent.modules.las.utils.reader import LASReader
+
+__all__ = []
+
+HEADER_TEMPLATE = """~Version information
+VERS.   2.0 : CWLS LOG ASCII STANDARD - VERSION 2.0
+WRAP.   NO  : One line per depth step
+~Well information
+STRT.s  {start} : START
+STOP.s  {stop} : STOP
+STEP.s  1 : STEP
+NULL.   -999.25 : NULL VALUE
+SOURCE.  benchmark : SOURCE
+~Curve information
+{curves}
+~A
+"""
+
+
+def generate_las_file(path, num_rows, num_curves, block_size=10000, nan_ratio=0.1):
+    curves = ["TIME.s : Time index"] + [
+        f"CURVE{index}.unit{index} : Curve {index}" for index in range(num_curves)
+    ]
+
+    with open(path, "w") as las_file:
+        las_file.write(HEADER_TEMPLATE.format(start=1, stop=num_rows, curves="\n".join(curves)))
+        for start in range(0, num_rows, block_size):
+            size = min(block_size, num_rows - start)
+            index = np.arange(start + 1, start + size + 1, dtype=float)
+            values = np.random.random((size, num_curves)) * 1000
+            values[np.random.random((size, num_curves)) < nan_ratio] = -999.25
+            np.savetxt(las_file, np.column_stack([index, values]), fmt="%.4f")
+
+
+def iterrows_frames(las_data, index_mnemonic):
+    """The previous implementation, using `DataFrame.iterrows`"""
+    curves_data = dict((item.mnemonic, item.unit) for item in las_data.curves)
+    las_df = las_data.df()
+    curves = las_df.columns
+
+    for index, values in las_df.iterrows():
+        output_frame = {index_mnemonic: {"value": index, "uom": "s"}}
+        for position, channel in enumerate(curves):
+            output_frame[channel] = {
+                "value": values.iloc[position],
+                "uom": curves_data.get(channel),
+            }
+
+        yield index, output_frame
+
+
+def iter_blocks(las_data, chunk_size=1000):
+    """
+    Reads the curves from a `lasio.LASFile` as columns, in blocks of `chunk_size` rows,
+    in the same format as `LASReader.blocks`
+    """
+    index_data = las_data.curves[0].data
+    columns = [curve.data for curve in las_data.curves[1:]]
+
+    for start in range(0, len(index_data), chunk_size):
+        end = start + chunk_size
+        index = index_data[start:end]
+        values = np.empty((len(index), len(columns)))
+        for position, column in enumerate(columns):
+            values[:, position] = column[start:end]
+
+        yield index, values
+
+
+def chunked_frames(las_data, index_mnemonic):
+    curves = [(item.mnemonic, item.unit) for item in las_data.curves[1:]]
+    blocks = iter_blocks(las_data)
+    return frames.iter_frames(blocks, curves, index_mnemonic)
+
+
+def streaming_frames(path, index_mnemonic):
+    las_reader = LASReader(path)
+    curves = [(item.mnemonic, item.unit) for item in las_reader.curves[1:]]
+    return frames.iter_frames(las_reader.blocks(), curves, index_mnemonic)
+
+
+def measure(label, frames_iterator):
+    started_at = time.perf_counter()
+    count = 0
+    for count, _frame in enumerate(frames_iterator, start=1):
+        pass
+
+    elapsed = time.perf_counter() - started_at
+    print(f"{label:>10}: {count} frames in {elapsed:.2f}s ({count / elapsed:.0f} frames/s)")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="LAS replay benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows on the LAS file")
+    parser.add_argument("--curves", type=int, default=200, help="Curves on the LAS file")
+    parser.add_argument("--path", help="Path for the LAS file (kept after the benchmark)")
+    parser.add_argument(
+        "--skip-iterrows", action="store_true", help="Do not measure the previous implementation"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if args.path:
+        path = args.path
+    else:
+        fd, path = tempfile.mkstemp(suffix=".las")
+        os.close(fd)
+
+    try:
+        generate_las_file(path, args.rows, args.curves)
+        print(f"LAS file with {os.path.getsize(path) / 2 ** 20:.1f}MB at {path}")
+
+        measure("streaming", streaming_frames(path, "TIME"))
+
+        started_at = time.perf_counter()
+        las_data = lasio.read(path)
+        print(f"{'lasio.read':>10}: {time.perf_counter() - started_at:.2f}s")
+
+        if not args.skip_iterrows:
+            measure("iterrows", iterrows_frames(las_data, "TIME"))
+        measure("chunked", chunked_frames(las_data, "TIME"))
+    finally:
+        if not args.path:
+            os.remove(path)
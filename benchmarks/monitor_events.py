@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Measures how many events per second a monitor built on `handle_events` can process.
+
+Each event has one item with `--curves` curves, one second apart, and the window holds
+`--window` seconds of data. The previous implementation (settings read on every event and
+the window rebuilt as a new list) is measured for comparison.
+
+Usage: python benchmarks/monitor_events.py --events=20000 --window=3600 --curves=10
+"""
+import argparse
+import time
+
+from live_agent.services.monitors.utils import query
+
+__all__ = []
+
+
+def legacy_validate_event(event, settings):
+    """The previous implementation of `validate_event`"""
+    valid_events = []
+    mnemonics_settings = settings.get("monitor", {}).get("mnemonics", {})
+    expected_curves = set(mnemonics_settings.values())
+
+    event_content = event.get("data", {}).get("content", [])
+    if event_content:
+        missing_curves = expected_curves
+        for item in event_content:
+            item_curves = set(item.keys())
+            missing_curves = missing_curves - item_curves
+            is_valid = len(expected_curves - item_curves) == 0
+            if is_valid:
+                valid_events.append(item)
+    else:
+        missing_curves = []
+
+    return valid_events, missing_curves
+
+
+def legacy_refresh_accumulator(latest_events, accumulator, index_mnemonic, window_duration):
+    """The previous implementation of `refresh_accumulator`"""
+    latest_event = latest_events[-1]
+    window_end = latest_event.get(index_mnemonic, 0)
+    window_start = window_end - window_duration
+    last_index = window_start
+
+    accumulator.extend(latest_events)
+    purged_accumulator = []
+    for item in accumulator:
+        index = item.get(index_mnemonic, 0)
+        if (window_start <= index <= window_end) and (index >= last_index):
+            purged_accumulator.append(item)
+            last_index = index
+        elif index < last_index:
+            purged_accumulator = [item]
+            last_index = index
+
+    return purged_accumulator, window_start, window_end
+
+
+def legacy_handle_events(event, callback, settings, accumulator):
+    monitor_settings = settings.get("monitor", {})
+    window_duration = monitor_settings.get("window_duration", 60)
+    index_mnemonic = monitor_settings.get("mnemonics", {}).get("index", "timestamp")
+
+    latest_data, missing_curves = legacy_validate_event(event, settings)
+    if latest_data:
+        accumulator, start, end = legacy_refresh_accumulator(
+            latest_data, accumulator, index_mnemonic, window_duration
+        )
+        if accumulator:
+            callback(accumulator)
+
+    return accumulator
+
+
+def build_settings(num_curves, window_duration):
+    mnemonics = {f"curve{index}": f"CURVE{index}" for index in range(num_curves)}
+    mnemonics["index"] = "timestamp"
+    return {"monitor": {"window_duration": window_duration, "mnemonics": mnemonics}}
+
+
+def build_events(num_events, num_curves):
+    return [
+        {
+            "data": {
+                "content": [
+                    dict(
+                        {f"CURVE{index}": float(index) for index in range(num_curves)},
+                        timestamp=position,
+                    )
+                ]
+            }
+        }
+        for position in range(1, num_events + 1)
+    ]
+
+
+def measure(label, events, handle_event):
+    started_at = time.perf_counter()
+    for event in events:
+        handle_event(event)
+
+    elapsed = time.perf_counter() - started_at
+    print(f"{label:>18}: {len(events) / elapsed:>10.0f} events/s")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Monitor events benchmark")
+    parser.add_argument("--events", type=int, default=20000, help="Number of events")
+    parser.add_argument("--window", type=int, default=3600, help="Window duration, in seconds")
+    parser.add_argument("--curves", type=int, default=10, help="Curves on each event")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    settings = build_settings(args.curves, args.window)
+    events = build_events(args.events, args.curves)
+    spec = query.compile_spec(settings)
+
+    def noop(window):
+        pass
+
+    measure("validation before", events, lambda event: legacy_validate_event(event, settings))
+    measure(
+        "validation after",
+        events,
+        lambda event: spec.validate(event.get("data", {}).get("content", [])),
+    )
+
+    legacy_state = {"accumulator": []}
+
+    def legacy_handle_event(event):
+        legacy_state["accumulator"] = legacy_handle_events(
+            event, noop, settings, legacy_state["accumulator"]
+        )
+
+    state = {"accumulator": None}
+
+    def handle_event(event):
+        state["accumulator"] = query.handle_events(event, noop, spec, state["accumulator"])
+
+    measure("monitor before", events, legacy_handle_event)
+    measure("monitor after", events, handle_event)
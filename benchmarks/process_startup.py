@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compares the time needed to start a process using a plain `fork` and using the zygote.
+
+Each process imports the modules passed on the command line and exits,
+simulating a chatbot or a monitor being started on demand.
+
+Usage: python benchmarks/process_startup.py --runs=20 --modules nltk chatterbot
+"""
+import argparse
+import importlib
+import statistics
+import time
+
+from live_agent.services import processes, zygote
+
+__all__ = []
+
+
+def load_modules(module_names, **kwargs):
+    for name in module_names:
+        importlib.import_module(name)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Process startup latency benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="Processes started on each mode")
+    parser.add_argument(
+        "--modules", nargs="*", default=["json"], help="Modules imported by each process"
+    )
+    return parser.parse_args()
+
+
+def measure(runs, module_names):
+    start_process = processes.agent_function(load_modules, name="benchmark")
+    timings = []
+
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        process = start_process(module_names)
+        process.start()
+        process.join()
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    return timings
+
+
+def report(label, timings):
+    print(
+        "{:>8}: median={:.2f}ms min={:.2f}ms max={:.2f}ms".format(
+            label, statistics.median(timings), min(timings), max(timings)
+        )
+    )
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    report("fork", measure(args.runs, args.modules))
+
+    zygote_instance = zygote.start_zygote(preload=args.modules)
+    try:
+        report("zygote", measure(args.runs, args.modules))
+    finally:
+        zygote_instance.process.terminate()
+        zygote_instance.process.join()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compares the throughput of a `multiprocessing.Queue` and a `SharedMemoryQueue`
+sending chat-like events from one process to another.
+
+Usage: python benchmarks/queue_throughput.py --items=100000 --size=300
+"""
+import argparse
+import time
+from multiprocessing import get_context as get_mp_context
+
+from live_agent.services.shared_queue import SharedMemoryQueue
+
+__all__ = []
+
+
+def build_event(index, size):
+    return {
+        "data": {
+            "type": "event",
+            "content": [{"__type": "__message", "message": "x" * size, "index": index}],
+        }
+    }
+
+
+def consume(events_queue, num_items, results_queue):
+    for _ in range(num_items):
+        events_queue.get(timeout=10)
+
+    results_queue.put(time.perf_counter())
+
+
+def measure(label, events_queue, num_items, size):
+    mp = get_mp_context("fork")
+    results_queue = mp.Queue()
+    consumer = mp.Process(target=consume, args=(events_queue, num_items, results_queue))
+    consumer.start()
+
+    started_at = time.perf_counter()
+    for index in range(num_items):
+        events_queue.put(build_event(index, size))
+
+    elapsed = results_queue.get() - started_at
+    consumer.join()
+    print(f"{label:>18}: {num_items / elapsed:>8.0f} items/s")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Queue throughput benchmark")
+    parser.add_argument("--items", type=int, default=100000, help="Number of items sent")
+    parser.add_argument("--size", type=int, default=300, help="Size of the message on each item")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    measure("multiprocessing", get_mp_context("fork").Queue(), args.items, args.size)
+
+    shared_queue = SharedMemoryQueue()
+    try:
+        measure("shared memory", shared_queue, args.items, args.size)
+        print(f"{'':>18}  {shared_queue.stats}")
+    finally:
+        shared_queue.unlink()
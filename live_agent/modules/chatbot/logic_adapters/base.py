@@ -1,18 +1,79 @@
 # -*- coding: utf-8 -*-
 from pprint import pformat
+from weakref import WeakValueDictionary
 from chatterbot.logic import LogicAdapter
 from chatterbot.conversation import Statement
 from eliot import start_action
-import nltk
 from nltk import NaiveBayesClassifier
 
 from live_client.assets.curves import only_enabled_curves
 from live_client.utils import logging
-from live_client.query import on_event
 
+from live_agent.services.query import on_event
+from live_agent.modules.chatbot.src import nltk_resources
+from live_agent.modules.chatbot.src.classifiers import get_classifier
+from live_agent.modules.chatbot.src.curves import CurveMatcher
 
 __all__ = []
 
+# Vocabularies are kept while some adapter uses them
+_vocabularies = WeakValueDictionary()
+
+
+class Vocabulary(object):
+    """
+    The words of the examples known by the Bayes adapters.
+
+    Adapters which know the same examples (usually, all the Bayes adapters of a bot) share
+    the same vocabulary, so the features of each statement are extracted only once.
+    """
+
+    def __init__(self, all_examples):
+        # All words from the known sentences
+        self.all_words = frozenset(" ".join(all_examples).split())
+
+        # The first word in each of the known sentences
+        self.all_first_words = frozenset(sentence.split(" ", 1)[0] for sentence in all_examples)
+        self.last_features = (None, None)
+
+    @classmethod
+    def get(cls, all_examples):
+        key = frozenset(all_examples)
+        vocabulary = _vocabularies.get(key)
+        if vocabulary is None:
+            vocabulary = _vocabularies[key] = cls(all_examples)
+
+        return vocabulary
+
+    def extract_features(self, text):
+        words = text.split()
+        lower_text = text.lower()
+        features = {}
+
+        for word in words:
+            features["first_word({})".format(word)] = word in self.all_first_words
+
+        for word in words:
+            features["contains({})".format(word)] = word in self.all_words
+
+        for letter in "abcdefghijklmnopqrstuvwxyz":
+            features["count({})".format(letter)] = lower_text.count(letter)
+            features["has({})".format(letter)] = letter in lower_text
+
+        return features
+
+    def features(self, text):
+        """
+        The features of the last text are kept, as `can_process` and `process` of every
+        adapter analyze the same text
+        """
+        last_text, features = self.last_features
+        if text != last_text:
+            features = self.extract_features(text)
+            self.last_features = (text, features)
+
+        return features
+
 
 class BaseBayesAdapter(LogicAdapter):
     """
@@ -23,20 +84,49 @@ class BaseBayesAdapter(LogicAdapter):
     confidence_threshold = 0.75
     confidence_damping_thresold = 0.9
     _classifier = None
+    _signature = None
+    _negative_examples = None
+    _vocabulary = None
+    _last_confidence = (None, None)
 
-    @property
-    def negative_examples(self):
-        examples = []
+    def refresh_vocabulary(self):
+        """
+        Compiles the examples known by the bot, once for each list of logic adapters
+        """
+        signature = tuple(
+            (adapter.__class__, getattr(adapter, "positive_examples", None))
+            for adapter in self.chatbot.logic_adapters
+        )
+        if signature == self._signature:
+            return
+
+        negative_examples = []
         my_name = str(self.__class__)
         for adapter in self.chatbot.logic_adapters:
             adapter_name = str(adapter.__class__)
             if (adapter_name != my_name) and hasattr(adapter, "positive_examples"):
-                examples.extend(adapter.positive_examples)
+                negative_examples.extend(adapter.positive_examples)
+
+        # Extract meaningful features from the examples
+        self._vocabulary = Vocabulary.get(self.positive_examples + negative_examples)
+        self._negative_examples = negative_examples
+        self._signature = signature
+        self._classifier = None
+        self._last_confidence = (None, None)
 
-        return examples
+    @property
+    def vocabulary(self):
+        self.refresh_vocabulary()
+        return self._vocabulary
+
+    @property
+    def negative_examples(self):
+        self.refresh_vocabulary()
+        return self._negative_examples
 
     @property
     def classifier(self):
+        self.refresh_vocabulary()
         if self._classifier is None:
             self._classifier = self.prepare_classifier()
 
@@ -47,40 +137,37 @@ class BaseBayesAdapter(LogicAdapter):
         labeled_data.extend([(name, 0) for name in self.negative_examples])
         labeled_data.extend([(name, 1) for name in self.positive_examples])
 
-        train_set = [(self.analyze_features(text), n) for (text, n) in labeled_data]
-        return NaiveBayesClassifier.train(train_set)
-
-    def prepare_features(self):
-        # Extract meaningful features from the examples
-        # A list of all words from the known sentences
-        all_examples = self.positive_examples + self.negative_examples
-        self.all_words = " ".join(all_examples).split()
+        settings = self.chatbot.context.get("settings", {})
+        return get_classifier(
+            self.__class__.__name__,
+            labeled_data,
+            self.train_classifier,
+            directory=settings.get("training", {}).get("directory"),
+        )
 
-        # A list of the first word in each of the known sentence
-        self.all_first_words = [sentence.split(" ", 1)[0] for sentence in all_examples]
+    def train_classifier(self, labeled_data):
+        vocabulary = self.vocabulary
+        train_set = [(vocabulary.extract_features(text), n) for (text, n) in labeled_data]
+        return NaiveBayesClassifier.train(train_set)
 
     def analyze_features(self, text):
         """
         Provide an analysis of significant features in the string.
         """
-        self.prepare_features()
-        features = {}
+        return self.vocabulary.features(text)
 
-        for word in text.split():
-            features["first_word({})".format(word)] = word in self.all_first_words
-
-        for word in text.split():
-            features["contains({})".format(word)] = word in self.all_words
-
-        for letter in "abcdefghijklmnopqrstuvwxyz":
-            features["count({})".format(letter)] = text.lower().count(letter)
-            features["has({})".format(letter)] = letter in text.lower()
+    def get_confidence(self, statement):
+        # Clears the last confidence when the adapters change
+        classifier = self.classifier
 
-        return features
+        text = statement.text.lower()
+        last_text, confidence = self._last_confidence
+        if text != last_text:
+            my_features = self.analyze_features(text)
+            confidence = classifier.classify(my_features) * self.confidence_damping_thresold
+            self._last_confidence = (text, confidence)
 
-    def get_confidence(self, statement):
-        my_features = self.analyze_features(statement.text.lower())
-        return self.classifier.classify(my_features) * self.confidence_damping_thresold
+        return confidence
 
     def process(self, statement, additional_response_selection_parameters=None):
         confidence = self.get_confidence(statement)
@@ -98,38 +185,47 @@ class BaseBayesAdapter(LogicAdapter):
         confidence = self.get_confidence(statement)
         can_process = confidence > self.confidence_threshold
 
-        logging.debug(
-            """{} (confidence {}):
-            The 10 most informative features are: {}
-            """.format(
-                self.__class__.__name__,
-                confidence,
-                ", ".join(
-                    pformat(item) for item in self.classifier.most_informative_features(n=10)
-                ),
+        # Listing the features requires the classifier of this adapter
+        if logging.level_is_logged("debug"):
+            logging.debug(
+                """{} (confidence {}):
+                The 10 most informative features are: {}
+                """.format(
+                    self.__class__.__name__,
+                    confidence,
+                    ", ".join(
+                        pformat(item) for item in self.classifier.most_informative_features(n=10)
+                    ),
+                )
             )
-        )
 
         return can_process
 
 
 class NLPAdapter(LogicAdapter):
+    """
+    Superclass for adapters using NLTK. The resources are read from a local data directory,
+    see `nltk_resources`, and may be configured on the chatbot settings::
+
+      "nltk": {
+        "data_dir": "/opt/nltk_data",
+        "download": false     # Download the missing resources
+      }
+    """
+
     def __init__(self, chatbot, **kwargs):
         super().__init__(chatbot, **kwargs)
-        self.download_and_log("maxent_ne_chunker")
-        self.download_and_log("words")
-        self.download_and_log("punkt")
-
-    def download_and_log(self, name):
-        logging.info(f"Downloading {name}")
-        nltk.download(name)
+        nltk_settings = kwargs.get("settings", {}).get("nltk", {})
+        nltk_resources.ensure_resources(
+            data_dir=nltk_settings.get("data_dir"), download=nltk_settings.get("download", False)
+        )
 
     def tokenize(self, statement):
-        return nltk.word_tokenize(statement.text)
+        return nltk_resources.word_tokenize(statement.text)
 
     def pos_tag(self, statement):
         tokens = self.tokenize(statement)
-        return nltk.pos_tag(tokens)
+        return nltk_resources.pos_tag(tokens)
 
 
 class WithStateAdapter(LogicAdapter):
@@ -179,6 +275,7 @@ class WithStateAdapter(LogicAdapter):
 class WithAssetAdapter(WithStateAdapter):
 
     query_timeout = 60
+    _curve_matcher = (None, None)
 
     def __init__(self, chatbot, **kwargs):
         super().__init__(chatbot, **kwargs)
@@ -212,37 +309,36 @@ class WithAssetAdapter(WithStateAdapter):
 
         return result
 
-    def list_mentioned_curves(self, statement):
-        selected_asset = self.get_selected_asset()
-        curves = self.get_asset_curves(selected_asset)
+    def get_curve_matcher(self, selected_asset):
+        """
+        The matcher for the curves of the asset, built once after the asset is selected
+        """
+        asset_config = selected_asset.get("asset_config", {})
+        matched_config, matcher = self._curve_matcher
+        if matcher is None or matched_config is not asset_config:
+            matcher = CurveMatcher(self.get_asset_curves(selected_asset))
+            self._curve_matcher = (asset_config, matcher)
+
+        return matcher
 
-        # First, try a more lenient search
-        mentions = dict(
-            (item, {"exact": False})
-            for item in curves
-            if self.curve_was_mentioned(item, statement, exact=False, match_case=False)
-        )
+    def list_mentioned_curves(self, statement, selected_asset=None):
+        # Lenient mentions ignore the case, exact mentions must match a whole word
+        if selected_asset is None:
+            selected_asset = self.get_selected_asset()
 
-        # Then try to find an exact mention of the curves
-        mentions.update(
-            dict(
-                (item, {"exact": True})
-                for item in curves
-                if self.curve_was_mentioned(item, statement, exact=True)
-            )
-        )
-        return mentions
+        return self.get_curve_matcher(selected_asset).match(statement.text)
 
-    def find_selected_curves(self, statement):
+    def find_selected_curves(self, statement, selected_asset=None):
+        """
+        Actions should pass the asset selected when their message was received,
+        as another one may have been selected before they run
+        """
         index_curve = getattr(self, "index_curve", None)
+        mentioned_curves = self.list_mentioned_curves(statement, selected_asset)
 
-        if index_curve is None:
-            mentioned_curves = self.list_mentioned_curves(statement)
-        else:
+        if index_curve is not None:
             mentioned_curves = dict(
-                (name, data)
-                for name, data in self.list_mentioned_curves(statement).items()
-                if name != index_curve
+                (name, data) for name, data in mentioned_curves.items() if name != index_curve
             )
 
         # Try to find an exact mention to a curve
@@ -8,7 +8,6 @@ from chatterbot.conversation import Statement  # NOQA
 from eliot import start_action
 
 from live_client.events import annotation
-from live_client.assets import list_assets, fetch_asset_settings
 from live_client.assets import run_analysis
 from live_client.assets.curves import only_enabled_curves
 from live_client.utils import logging
@@ -16,6 +15,8 @@ from live_client.utils.timestamp import get_timestamp
 from live_client.events.constants import UOM_KEY, VALUE_KEY, TIMESTAMP_KEY
 
 from live_agent.modules.chatbot.src.actions import CallbackAction, ShowTextAction
+from live_agent.modules.chatbot.src.assets import get_asset_catalog
+from live_agent.modules.chatbot.src.latest_values import get_latest_values
 from live_agent.modules.chatbot.logic_adapters.base import (
     BaseBayesAdapter,
     NLPAdapter,
@@ -53,7 +54,7 @@ class AssetListAdapter(BaseBayesAdapter, WithStateAdapter):
     def __init__(self, chatbot, **kwargs):
         super().__init__(chatbot, **kwargs)
 
-        available_assets = list_assets(kwargs["settings"])
+        available_assets = get_asset_catalog(kwargs["settings"]).list_assets()
 
         if not available_assets:
             logging.warn(f"No assets available. Check permissions for this user!")
@@ -107,7 +108,8 @@ class AssetSelectionAdapter(BaseBayesAdapter, WithStateAdapter):
 
         settings = kwargs["settings"]
 
-        self.asset_fetcher = partial(fetch_asset_settings, settings)
+        self.settings = settings
+        self.asset_fetcher = get_asset_catalog(settings).fetch_asset_settings
 
     def was_asset_mentioned(self, asset, statement):
         return asset.get("name", "INVALID ASSET NAME").lower() in statement.text.lower()
@@ -168,6 +170,11 @@ class AssetSelectionAdapter(BaseBayesAdapter, WithStateAdapter):
         }
         self.share_state()
 
+        # Start collecting the latest values of the asset
+        latest_values = get_latest_values(self.settings)
+        if latest_values is not None and "filter" in asset_config:
+            latest_values.watch(asset_config["filter"])
+
         event_type = asset_config.get("event_type", None)
         asset_curves = only_enabled_curves(asset_config.get("curves", {}))
 
@@ -240,7 +247,7 @@ class AutoAnalysisAdapter(BaseBayesAdapter, NLPAdapter, WithAssetAdapter):
         return response_text
 
     def process_analysis(self, statement, selected_asset, begin=None):
-        selected_curves = self.find_selected_curves(statement)
+        selected_curves = self.find_selected_curves(statement, selected_asset)
         num_selected_curves = len(selected_curves)
 
         if num_selected_curves == 1:
@@ -273,6 +280,7 @@ class AutoAnalysisAdapter(BaseBayesAdapter, NLPAdapter, WithAssetAdapter):
                 return CallbackAction(
                     self.execute_action,
                     confidence,
+                    concurrent=True,
                     statement=statement,
                     selected_asset=selected_asset,
                 )
@@ -334,11 +342,23 @@ class CurrentValueQueryAdapter(BaseBayesAdapter, NLPAdapter, WithAssetAdapter):
 
         return result
 
-    def run_query(self, target_curve):
-        selected_asset = self.get_selected_asset()
+    def __init__(self, chatbot, **kwargs):
+        super().__init__(chatbot, **kwargs)
+        self.latest_values = get_latest_values(self.settings)
+
+    def run_query(self, target_curve, selected_asset=None):
+        if selected_asset is None:
+            selected_asset = self.get_selected_asset()
+
         if selected_asset:
             asset_config = selected_asset.get("asset_config", {})
 
+            # Values received by the realtime query avoid a historical query
+            if self.latest_values is not None:
+                latest_value = self.latest_values.get(asset_config["filter"], target_curve)
+                if latest_value is not None:
+                    return self.format_response([latest_value], target_curve=target_curve)
+
             value_query = """
             {event_type} .flags:nocount .flags:reversed
             => @filter({{{target_curve}}} != null)
@@ -373,12 +393,13 @@ class CurrentValueQueryAdapter(BaseBayesAdapter, NLPAdapter, WithAssetAdapter):
                 return CallbackAction(
                     self.execute_action,
                     confidence,
+                    concurrent=True,
                     statement=statement,
                     selected_asset=selected_asset,
                 )
 
     def execute_action(self, statement, selected_asset):
-        selected_curves = self.find_selected_curves(statement)
+        selected_curves = self.find_selected_curves(statement, selected_asset)
         num_selected_curves = len(selected_curves)
 
         if num_selected_curves == 0:
@@ -388,7 +409,7 @@ class CurrentValueQueryAdapter(BaseBayesAdapter, NLPAdapter, WithAssetAdapter):
             selected_curve = selected_curves[0]
 
             with start_action(action_type=self.state_key, curve=selected_curve):
-                response_text = self.run_query(selected_curve)
+                response_text = self.run_query(selected_curve, selected_asset)
 
         else:
             response_text = "I'm sorry, which of the curves you meant?{}{}".format(
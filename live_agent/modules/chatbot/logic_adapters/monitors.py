@@ -1,10 +1,10 @@
 from eliot import start_action  # NOQA
-from multiprocessing import active_children
 from chatterbot.conversation import Statement
 
 from live_client.utils import logging
 
 from live_agent.services.processes import agent_function
+from live_agent.services.zygote import active_children
 from ..src.actions import CallbackAction
 from .base import BaseBayesAdapter, WithAssetAdapter
 
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
-from multiprocessing import Queue, active_children
+from collections import Counter, OrderedDict
+from copy import deepcopy
 from functools import partial
+import queue
+import signal
+import sys
 
 from eliot import start_action
 from setproctitle import setproctitle
-from chatterbot.trainers import ChatterBotCorpusTrainer
 
 from live_client import query
 from live_client.events import messenger
@@ -13,15 +16,27 @@ from live_client.types.message import Message
 from live_client.utils import logging
 
 from live_agent.services.processes import agent_function
+from live_agent.services.shared_queue import create_queue, release_queue
+from live_agent.services.state import StateManager
+from live_agent.services.zygote import active_children
 
 from live_agent.modules.chatbot.src.bot import ChatBot
 from live_agent.modules.chatbot.src.actions import ActionStatement
+from live_agent.modules.chatbot.src.executor import ActionExecutor
+from live_agent.modules.chatbot.src.pool import HashRing
+from live_agent.modules.chatbot.src.router import IntentRouter
+from live_agent.modules.chatbot.src.training import get_database_uri
 
 
 __all__ = ["start"]
 
 read_timeout = 120
 request_timeout = (3.05, 5)
+put_timeout = 1
+
+# Events dropped by the router, for each room or worker
+dropped_events = Counter()
+stuck_destinations = set()
 
 
 ##
@@ -45,6 +60,32 @@ def share_state(container, state_key=None, state_data=None):
     container["state"].update(**{state_key: state_data})
 
 
+def send_to_process(process_queue, item, destination):
+    """
+    Sends an item to the process of a bot or worker, without letting one which is stuck
+    stall the router for every room.
+
+    Waits up to `put_timeout` seconds for room on the queue, or not at all while the previous
+    item for the same process was dropped. Items which cannot be sent are dropped and logged.
+    """
+    try:
+        if destination in stuck_destinations:
+            process_queue.put(item, block=False)
+        else:
+            process_queue.put(item, timeout=put_timeout)
+    except queue.Full:
+        stuck_destinations.add(destination)
+        dropped_events[destination] += 1
+        logging.warn(
+            f"{destination} is not keeping up, {dropped_events[destination]} events dropped"
+        )
+    except ValueError as e:
+        dropped_events[destination] += 1
+        logging.error(f"Cannot send event to {destination}, {e}<{type(e)}>")
+    else:
+        stuck_destinations.discard(destination)
+
+
 ##
 # Chat message handling
 def maybe_extract_messages(event):
@@ -82,19 +123,20 @@ def process_messages(chatbot, messages):
                 logging.info('Bot response is "{}"'.format(response.serialize()))
                 if isinstance(response, ActionStatement):
                     response.chatbot = chatbot
-                    response_message = response.run()
+                    chatbot.executor.submit(
+                        response, partial(maybe_send_message, settings, room_id)
+                    )
                 else:
-                    response_message = response.text
-
-                maybe_send_message(settings, room_id, response_message)
+                    maybe_send_message(settings, room_id, response.text)
 
 
 def maybe_send_message(settings, room_id, response_message):
-    bot_settings = settings.copy()
-    bot_alias = bot_settings.get("alias", "Intelie")
-    bot_settings["output"]["room"] = {"id": room_id}
-    if "name" not in bot_settings["output"]["author"]:
-        bot_settings["output"]["author"]["name"] = bot_alias
+    # Actions reply from other threads, so the shared settings must not be changed
+    bot_alias = settings.get("alias", "Intelie")
+    output_settings = settings["output"]
+    author = dict(output_settings["author"])
+    author.setdefault("name", bot_alias)
+    bot_settings = dict(settings, output=dict(output_settings, room={"id": room_id}, author=author))
 
     messenger.send_message(
         response_message, settings=bot_settings, message_type=messenger.MESSAGE_TYPES.CHAT
@@ -103,18 +145,25 @@ def maybe_send_message(settings, room_id, response_message):
 
 ##
 # Room Bot initialization
-def train_bot(chatbot, language="english"):
-    trainer = ChatterBotCorpusTrainer(chatbot)
-    trainer.train(f"chatterbot.corpus.{language}.conversations")
-    trainer.train(f"chatterbot.corpus.{language}.greetings")
-    trainer.train(f"chatterbot.corpus.{language}.humor")
+def build_router(settings):
+    """
+    The intent router is enabled by default and may be configured on the chatbot settings::
 
+      "router": {
+        "enabled": true,
+        "max_candidates": 2   # Number of Bayes adapters evaluated for each message
+      }
+    """
+    router_settings = dict(settings.get("router", {}))
+    if not router_settings.pop("enabled", True):
+        return None
+
+    directory = settings.get("training", {}).get("directory")
+    return IntentRouter(directory=directory, **router_settings)
 
-def start_chatbot(settings, room_id, room_queue, **kwargs):
-    setproctitle("DDA: Chatbot for room {}".format(room_id))
 
+def build_chatbot(settings, room_id, state_manager):
     # Load the previous state
-    state_manager = kwargs.get("state_manager")
     state = state_manager.load()
 
     settings.update(state=state.get("bot_state", {}))
@@ -131,13 +180,23 @@ def start_chatbot(settings, room_id, room_queue, **kwargs):
     chatbot = ChatBot(
         bot_alias,
         read_only=True,
+        database_uri=get_database_uri(settings),
         prefer_agreement=False,
         logic_adapters=settings.get("logic_adapters", []),
         preprocessors=["chatterbot.preprocessors.clean_whitespace"],
         filters=[],
+        executor=ActionExecutor(**settings.get("actions", {})),
+        router=build_router(settings),
         **context,
     )
-    train_bot(chatbot)
+    return chatbot
+
+
+def start_chatbot(settings, room_id, room_queue, **kwargs):
+    setproctitle("DDA: Chatbot for room {}".format(room_id))
+
+    state_manager = kwargs.get("state_manager")
+    chatbot = build_chatbot(settings, room_id, state_manager)
 
     while True:
         event = room_queue.get()
@@ -162,9 +221,12 @@ def add_bot(settings, bots_registry, room_id):
             start_chatbot_with_log = agent_function(
                 start_chatbot, name=f"bot for room {room_id}", with_state=True
             )
+            if room_queue is not None:
+                release_queue(room_queue)
+
             with start_action(action_type="start_chatbot", room_id=room_id) as action:
                 task_id = action.serialize_task_id()
-                room_queue = Queue()
+                room_queue = create_queue()
                 room_bot = start_chatbot_with_log(settings, room_id, room_queue, task_id=task_id)
 
             room_bot.start()
@@ -173,6 +235,119 @@ def add_bot(settings, bots_registry, room_id):
     return bots_registry, new_bot
 
 
+##
+# Worker pool
+def room_state_manager(room_id):
+    # Same name used by `start_chatbot`, so both modes share the state of each room
+    return StateManager(f"bot for room {room_id}")
+
+
+def start_worker(settings, worker_id, worker_queue, max_rooms=100, **kwargs):
+    """
+    Serves the rooms routed to this worker, keeping the bots of at most `max_rooms` rooms.
+    The bot of the least recently used room is evicted and rebuilt from its state when needed.
+    """
+    setproctitle("DDA: Chatbot worker {}".format(worker_id))
+
+    # Unwind the stack on SIGTERM, so the pending state of each room is written
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    room_bots = OrderedDict()
+    try:
+        while True:
+            room_id, event = worker_queue.get()
+
+            if room_id in room_bots:
+                room_bots.move_to_end(room_id)
+                chatbot, room_settings, state_manager = room_bots[room_id]
+            else:
+                logging.info("Loading bot for room {} on worker {}".format(room_id, worker_id))
+                room_settings = deepcopy(settings)
+                state_manager = room_state_manager(room_id)
+                chatbot = build_chatbot(room_settings, room_id, state_manager)
+                room_bots[room_id] = (chatbot, room_settings, state_manager)
+
+                if len(room_bots) > max_rooms:
+                    evicted_room, (evicted_chatbot, _settings, evicted_state) = room_bots.popitem(
+                        last=False
+                    )
+                    logging.info("Evicting bot for room {}".format(evicted_room))
+                    evicted_chatbot.executor.shutdown()
+                    evicted_state.close()
+
+            messages = [
+                message
+                for message in maybe_extract_messages(event)
+                if message.get("room", {}).get("id") == room_id
+            ]
+            process_messages(chatbot, messages)
+            state_manager.save({"bot_state": room_settings.get("state", {})}, force=True)
+    finally:
+        for chatbot, _settings, state_manager in room_bots.values():
+            chatbot.executor.shutdown()
+            state_manager.close()
+
+
+def add_worker(settings, workers, worker_id, max_rooms):
+    worker, worker_queue = workers.get(worker_id, (None, None))
+
+    if worker and worker.is_alive():
+        return workers
+
+    logging.info("Starting chatbot worker {}".format(worker_id))
+    start_worker_with_log = agent_function(start_worker, name=f"chatbot worker {worker_id}")
+    if worker_queue is not None:
+        release_queue(worker_queue)
+
+    with start_action(action_type="start_chatbot_worker", worker_id=worker_id) as action:
+        task_id = action.serialize_task_id()
+        worker_queue = create_queue()
+        worker = start_worker_with_log(
+            settings, worker_id, worker_queue, max_rooms=max_rooms, task_id=task_id
+        )
+
+    worker.start()
+    workers[worker_id] = (worker, worker_queue)
+    return workers
+
+
+def route_to_worker(settings, bots_registry, workers, hash_ring, event):
+    """
+    Sends the event to the worker which serves each room mentioned on it.
+    Rooms are assigned to workers by consistent hashing, so each room is always served
+    by the same worker and its messages are handled in order.
+
+    The pool is enabled on the chatbot settings::
+
+      "pool": {
+        "workers": 4,       # Number of worker processes
+        "max_rooms": 100    # Bots kept in memory by each worker
+      }
+    """
+    logging.debug("Got an event: {}".format(event))
+    max_rooms = settings.get("pool", {}).get("max_rooms", 100)
+
+    room_ids = []
+    for message in maybe_extract_messages(event):
+        room_id = message.get("room", {}).get("id")
+        if room_id is None or room_id in room_ids:
+            continue
+
+        room_ids.append(room_id)
+        if room_id not in bots_registry:
+            logging.info("New room {}".format(room_id))
+            bots_registry[room_id] = (None, None)
+            messenger.add_to_room(settings, room_id, message.get("author", {}))
+
+    for room_id in room_ids:
+        worker_id = hash_ring.get_node(room_id)
+        workers = add_worker(settings, workers, worker_id, max_rooms)
+        worker, worker_queue = workers[worker_id]
+        send_to_process(worker_queue, (room_id, event), f"Chatbot worker {worker_id}")
+
+    return [item[0] for item in workers.values()]
+
+
 def route_message(settings, bots_registry, event):
     logging.debug("Got an event: {}".format(event))
 
@@ -187,7 +362,7 @@ def route_message(settings, bots_registry, event):
 
         # Send the message to the room's bot process
         room_bot, room_queue = bots_registry.get(room_id, (None, None))
-        room_queue.put(event)
+        send_to_process(room_queue, event, f"Bot for room {room_id}")
 
     return [item[0] for item in bots_registry.values()]
 
@@ -203,10 +378,22 @@ def start(settings, **kwargs):
     state = state_manager.load()
     bots_registry = state.get("bots_registry", {})
 
-    # Restart previously known bots
-    rooms_with_bots = bots_registry.keys()
-    for room_id in rooms_with_bots:
-        bots_registry, new_bot = add_bot(settings, bots_registry, room_id)
+    # Train the corpus before starting the room bots, which share the trained storage
+    get_database_uri(settings)
+
+    # With a worker pool, the bots are loaded when their rooms receive messages
+    num_workers = settings.get("pool", {}).get("workers", 0)
+    if num_workers:
+        hash_ring = HashRing(range(num_workers))
+    else:
+        hash_ring = None
+
+        # Restart previously known bots
+        rooms_with_bots = bots_registry.keys()
+        for room_id in rooms_with_bots:
+            bots_registry, new_bot = add_bot(settings, bots_registry, room_id)
+
+    workers = {}
 
     bot_alias = settings.get("alias", "Intelie").lower()
     bot_query = f"""
@@ -220,7 +407,10 @@ def start(settings, **kwargs):
     @query.on_event(bot_query, settings, timeout=read_timeout)
     def handle_events(event, *args, **kwargs):
         messenger.join_messenger(settings)
-        route_message(settings, bots_registry, event)
+        if hash_ring is not None:
+            route_to_worker(settings, bots_registry, workers, hash_ring, event)
+        else:
+            route_message(settings, bots_registry, event)
 
         # There is no use saving the processes, so we save a dict with no values
         state_manager.save(
@@ -239,4 +429,8 @@ def start(settings, **kwargs):
         bot.terminate()
         bot.join(5)
 
+    for _process, process_queue in list(bots_registry.values()) + list(workers.values()):
+        if process_queue is not None:
+            release_queue(process_queue)
+
     return
@@ -2,6 +2,10 @@ from chatterbot.conversation import Statement
 
 
 class ActionStatement(Statement):
+    # Concurrent actions run on the background, see `ActionExecutor`
+    concurrent = False
+    timeout = None
+
     def __init__(self, text, confidence=None, in_response_to=None, **kwargs):
         super().__init__(text, in_response_to, **kwargs)
         self.confidence = confidence
@@ -42,10 +46,20 @@ class NoTextAction(ActionStatement):
 
 
 class CallbackAction(ActionStatement):
-    def __init__(self, callback, confidence=None, in_response_to=None, **kwargs):
+    def __init__(
+        self,
+        callback,
+        confidence=None,
+        in_response_to=None,
+        concurrent=False,
+        timeout=None,
+        **kwargs,
+    ):
         super().__init__(self._instance_text(), confidence, in_response_to, **kwargs)
         self.params = kwargs
         self.callback = callback
+        self.concurrent = concurrent
+        self.timeout = timeout
 
     def run(self):
         return self.callback(**self.params)
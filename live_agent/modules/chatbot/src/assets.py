@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import threading
+import time
+from hashlib import md5
+
+import dill
+from live_client.assets import list_assets, fetch_asset_settings
+from live_client.utils import logging
+
+__all__ = ["AssetCatalog", "get_asset_catalog"]
+
+_catalogs = {}
+
+
+class AssetCatalog(object):
+    """
+    Caches the list of assets and their settings, shared by all the bots of a process.
+
+    Entries younger than `ttl` seconds are returned directly. Older entries, up to `ttl + max_stale`
+    seconds, are returned while a background thread fetches them again.
+    Other entries are fetched before returning, and when the request fails the empty result
+    (or `default`, if it raised an error) is returned without being cached.
+    The entries are also kept on a snapshot file, read by the other processes, so new bots
+    do not need to fetch them from Live.
+    """
+
+    def __init__(self, settings, ttl=300, max_stale=3600, directory=None, stats_interval=300):
+        self.settings = settings
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.stats_interval = stats_interval
+        self.filename = os.path.join(
+            directory or tempfile.gettempdir(), f"asset-catalog-{catalog_key(settings)}.dill"
+        )
+
+        self.entries = {}
+        self.snapshot_mtime = None
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "errors": 0}
+        self.last_report = time.monotonic()
+
+    def list_assets(self):
+        return self.get(("assets",), lambda: list_assets(self.settings), default=[])
+
+    def fetch_asset_settings(self, asset_id, asset_type="rig"):
+        return self.get(
+            ("asset", asset_type, asset_id),
+            lambda: fetch_asset_settings(self.settings, asset_id, asset_type=asset_type),
+        )
+
+    def get(self, key, loader, default=None):
+        self.maybe_read_snapshot()
+        with self.lock:
+            value, fetched_at = self.entries.get(key, (None, None))
+
+        age = None if fetched_at is None else time.time() - fetched_at
+        if age is not None and age < self.ttl:
+            self.count("hits")
+        elif age is not None and age < self.ttl + self.max_stale:
+            self.count("stale_hits")
+            self.refresh_later(key, loader)
+        else:
+            self.count("misses")
+            value = self.refresh(key, loader, default)
+
+        return value
+
+    def refresh(self, key, loader, default=None):
+        try:
+            value = loader()
+        except Exception as e:
+            logging.error(f"Asset catalog: error fetching {key}, {e}<{type(e)}>")
+            value = default
+
+        # Failed requests return empty results, which are not cached
+        if not value:
+            self.count("errors")
+            return value
+
+        with self.lock:
+            self.entries[key] = (value, time.time())
+
+        self.write_snapshot()
+        return value
+
+    def refresh_later(self, key, loader):
+        with self.lock:
+            if key in self.refreshing:
+                return
+
+            self.refreshing.add(key)
+
+        def refresh_in_background():
+            try:
+                self.refresh(key, loader)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh_in_background, daemon=True).start()
+
+    def maybe_read_snapshot(self):
+        try:
+            mtime = os.stat(self.filename).st_mtime_ns
+        except OSError:
+            return
+
+        if mtime == self.snapshot_mtime:
+            return
+
+        try:
+            with open(self.filename, "rb") as f:
+                entries = dill.load(f)
+        except Exception as e:
+            logging.warn(f"Error reading the asset catalog from {self.filename}, {e}<{type(e)}>")
+            entries = {}
+
+        with self.lock:
+            self.snapshot_mtime = mtime
+            for key, (value, fetched_at) in entries.items():
+                _value, known_fetched_at = self.entries.get(key, (None, 0))
+                if fetched_at > known_fetched_at:
+                    self.entries[key] = (value, fetched_at)
+
+    def write_snapshot(self):
+        temp_filename = f"{self.filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self.lock:
+            entries = dict(self.entries)
+
+        try:
+            with open(temp_filename, "wb") as f:
+                dill.dump(entries, f)
+
+            os.replace(temp_filename, self.filename)
+            self.snapshot_mtime = os.stat(self.filename).st_mtime_ns
+        except OSError as e:
+            logging.warn(f"Error writing the asset catalog to {self.filename}, {e}<{type(e)}>")
+
+    def count(self, name):
+        self.stats[name] += 1
+        if time.monotonic() - self.last_report >= self.stats_interval:
+            self.log_stats()
+
+    def log_stats(self):
+        self.last_report = time.monotonic()
+        logging.info(
+            f"Asset catalog: {self.stats['hits']} hits, {self.stats['stale_hits']} stale hits, "
+            f"{self.stats['misses']} misses, {self.stats['errors']} errors"
+        )
+
+
+def catalog_key(settings):
+    live_settings = settings.get("live", {})
+    source = f"{live_settings.get('url')}|{live_settings.get('username')}"
+    return md5(source.encode("utf-8")).hexdigest()[:16]
+
+
+def get_asset_catalog(settings):
+    """
+    Returns the catalog for the Live instance on `settings`, which may be configured with::
+
+      "asset_catalog": {
+        "ttl": 300,          # Seconds an entry is used without being fetched again
+        "max_stale": 3600,   # Seconds a stale entry is used while it is fetched again
+        "directory": "/tmp"  # Where the snapshot is stored
+      }
+    """
+    key = catalog_key(settings)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs[key] = AssetCatalog(settings, **settings.get("asset_catalog", {}))
+
+    return catalog
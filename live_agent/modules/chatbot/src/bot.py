@@ -1,5 +1,7 @@
 import chatterbot
 
+from .executor import ActionExecutor
+
 __all__ = ["ChatBot"]
 
 
@@ -9,6 +11,8 @@ class ChatBot(chatterbot.ChatBot):
         self.prefer_agreement = kwargs.pop("prefer_agreement", True)
         self.live_client = kwargs.pop("live_client", None)
         self.session = kwargs.pop("session", {})
+        self.executor = kwargs.pop("executor", None) or ActionExecutor()
+        self.router = kwargs.pop("router", None)
         self.context = kwargs
 
     def generate_response(self, input_statement, additional_response_selection_parameters=None):
@@ -21,7 +25,14 @@ class ChatBot(chatterbot.ChatBot):
         result = None
         max_confidence = -1
 
+        if self.router is not None:
+            self.router.refresh(self.logic_adapters)
+
         for adapter in self.logic_adapters:
+            if self.router is not None and not self.router.is_candidate(adapter, input_statement):
+                self.logger.info("{} is not a likely intent".format(adapter.class_name))
+                continue
+
             if adapter.can_process(input_statement):
 
                 output = adapter.process(input_statement, additional_response_selection_parameters)
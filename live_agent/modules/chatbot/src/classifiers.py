@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+from hashlib import sha1
+
+import dill
+from live_client.utils import logging
+
+__all__ = ["get_classifier"]
+
+_classifiers = {}
+
+
+def training_set_key(name, labeled_data):
+    digest = sha1(name.encode("utf-8"))
+    for text, label in sorted(labeled_data):
+        digest.update(f"{label}\t{text}\n".encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def read_classifier(filename):
+    try:
+        with open(filename, "rb") as f:
+            return dill.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warn(f"Error reading the classifier from {filename}, {e}<{type(e)}>")
+        return None
+
+
+def write_classifier(filename, classifier):
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(temp_filename, "wb") as f:
+            dill.dump(classifier, f)
+
+        os.replace(temp_filename, filename)
+    except OSError as e:
+        logging.warn(f"Error writing the classifier to {filename}, {e}<{type(e)}>")
+
+
+def get_classifier(name, labeled_data, train, directory=None):
+    """
+    Returns the classifier trained by `train(labeled_data)`.
+
+    Classifiers are cached in memory and on `directory`, keyed by a hash of `name` and of the
+    labeled data, so adapters with the same training set share one classifier, even after
+    a restart.
+    """
+    key = training_set_key(name, labeled_data)
+    classifier = _classifiers.get(key)
+    if classifier is not None:
+        return classifier
+
+    started_at = time.monotonic()
+    filename = os.path.join(directory or tempfile.gettempdir(), f"classifier-{key[:16]}.dill")
+    classifier = read_classifier(filename)
+    if classifier is None:
+        classifier = train(labeled_data)
+        write_classifier(filename, classifier)
+        source = "trained"
+    else:
+        source = "loaded"
+
+    elapsed = time.monotonic() - started_at
+    logging.info(f"Classifier for {name} {source} in {elapsed * 1000:.1f}ms ({filename})")
+
+    _classifiers[key] = classifier
+    return classifier
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+
+__all__ = ["CurveMatcher"]
+
+
+class CurveMatcher(object):
+    """
+    Finds which curves are mentioned on a text, in a single pass over it.
+
+    A curve is mentioned when its name is part of the text, ignoring the case, and the mention
+    is exact when the name is one of the words of the text.
+    Names are searched with an Aho-Corasick automaton and exact mentions with a set of names,
+    so the cost depends on the size of the text, not on the number of curves.
+    """
+
+    def __init__(self, curves):
+        self.positions = {}
+        for curve in curves:
+            self.positions.setdefault(curve, len(self.positions))
+
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for curve in self.positions:
+            self.add_pattern(curve.upper(), curve)
+
+        self.build_failures()
+
+    def add_pattern(self, pattern, curve):
+        state = 0
+        for char in pattern:
+            next_state = self.transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self.transitions)
+                self.transitions[state][char] = next_state
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+
+            state = next_state
+
+        self.outputs[state].append(curve)
+
+    def build_failures(self):
+        pending = deque(self.transitions[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self.transitions[state].items():
+                pending.append(next_state)
+
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+
+                self.fail[next_state] = self.transitions[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+
+                self.outputs[next_state] = (
+                    self.outputs[next_state] + self.outputs[self.fail[next_state]]
+                )
+
+    def match(self, text):
+        """
+        Returns the mentioned curves, as `{curve: {"exact": bool}}`, in the order of the curves
+        """
+        transitions = self.transitions
+        fail = self.fail
+        outputs = self.outputs
+
+        # Empty names are part of any text
+        mentions = dict((curve, False) for curve in outputs[0])
+
+        state = 0
+        for char in text.upper():
+            while state and char not in transitions[state]:
+                state = fail[state]
+
+            state = transitions[state].get(char, 0)
+            for curve in outputs[state]:
+                mentions[curve] = False
+
+        for word in text.split():
+            if word in self.positions:
+                mentions[word] = True
+
+        return dict(
+            (curve, {"exact": mentions[curve]})
+            for curve in sorted(mentions, key=self.positions.__getitem__)
+        )
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from eliot import start_action
+from live_client.utils import logging
+
+__all__ = ["ActionExecutor"]
+
+
+class ActionExecutor(object):
+    """
+    Runs the actions returned by the logic adapters of a bot.
+
+    Actions marked as `concurrent` (usually the ones waiting for Live queries) run on a pool
+    of threads, so the messages which arrive meanwhile are not stuck behind them.
+    The other actions run immediately, in the order their messages arrived.
+
+    When a concurrent action takes longer than its `timeout` (or `default_timeout`),
+    `timeout_message` is sent instead of its result. Actions cannot be interrupted, so an
+    action which already started keeps its thread until it finishes and its result is discarded.
+    Actions which did not start yet are not run.
+    """
+
+    def __init__(
+        self,
+        max_workers=4,
+        default_timeout=120,
+        timeout_message="Sorry, I could not finish this in time",
+    ):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="action")
+        self.default_timeout = default_timeout
+        self.timeout_message = timeout_message
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit(self, action, on_result):
+        """
+        Runs `action` and calls `on_result` with its result, unless it timed out
+        """
+        if not getattr(action, "concurrent", False):
+            on_result(action.run())
+            return
+
+        timeout = getattr(action, "timeout", None) or self.default_timeout
+        timer = threading.Timer(timeout, self.give_up, args=(action, on_result))
+        timer.daemon = True
+
+        def run_action():
+            with start_action(action_type="run_action", action=action.text):
+                try:
+                    result = action.run()
+                except Exception as e:
+                    logging.exception(f"Error running {action.text}: <{e}>")
+                    result = None
+                finally:
+                    timer.cancel()
+
+            if self.finish(action) and result is not None:
+                on_result(result)
+
+        with self.lock:
+            self.pending[id(action)] = action
+
+        action.future = self.pool.submit(run_action)
+        timer.start()
+
+    def finish(self, action):
+        """
+        Returns whether the action was still pending
+        """
+        with self.lock:
+            return self.pending.pop(id(action), None) is not None
+
+    def give_up(self, action, on_result=None):
+        """
+        Discards the result of the action, which is only prevented from running if it is queued
+        """
+        if not self.finish(action):
+            return
+
+        if action.future.cancel():
+            logging.warn(f"Action {action.text} not started")
+        else:
+            logging.warn(f"Action {action.text} is still running, its result will be discarded")
+
+        if on_result is not None:
+            on_result(self.timeout_message)
+
+    def shutdown(self):
+        with self.lock:
+            pending_actions = list(self.pending.values())
+
+        for action in pending_actions:
+            self.give_up(action)
+
+        self.pool.shutdown(wait=False)
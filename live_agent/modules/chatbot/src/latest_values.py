@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+from collections import OrderedDict
+
+from live_client.events.constants import EVENT_TYPE_DESTROY, EVENT_TYPE_EVENT, TIMESTAMP_KEY
+from live_client.events.constants import VALUE_KEY
+from live_client.utils import logging
+
+from live_agent.services.multiplexer import EventStream, get_event_type
+
+__all__ = ["LatestValues", "get_latest_values"]
+
+_latest_values = None
+
+
+class AssetWatcher(object):
+    """
+    Keeps the last value of each curve of an asset, from a realtime query
+    """
+
+    def __init__(self, event_filter, settings, poll_interval=1):
+        self.statement = f"{event_filter} .flags:nocount"
+        self.settings = settings
+        self.poll_interval = poll_interval
+        self.values = {}
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def watch(self):
+        try:
+            stream = EventStream(self.statement, self.settings)
+        except Exception as e:
+            logging.error(f"Error watching '{self.statement}', {e}<{type(e)}>")
+            return
+
+        try:
+            while not self.finished.is_set():
+                event = stream.get(timeout=self.poll_interval)
+                if event is None:
+                    continue
+
+                event_type = get_event_type(event)
+                if event_type == EVENT_TYPE_EVENT:
+                    self.update(event.get("data", {}).get("content", []))
+                elif event_type == EVENT_TYPE_DESTROY:
+                    break
+        except (OSError, EOFError) as e:
+            logging.warn(f"Query '{self.statement}' finished, {e}<{type(e)}>")
+        finally:
+            stream.close()
+
+    def update(self, items):
+        for item in items:
+            timestamp = item.get(TIMESTAMP_KEY)
+            for name, value in item.items():
+                if isinstance(value, dict) and VALUE_KEY in value:
+                    self.values[name] = (value, timestamp)
+
+    def get(self, curve):
+        """
+        The last value of the curve, in the format of the historical query, or None
+        """
+        latest_value = self.values.get(curve)
+        if latest_value is None:
+            return None
+
+        value, timestamp = latest_value
+        return {curve: json.dumps(value), TIMESTAMP_KEY: timestamp}
+
+    def stop(self):
+        self.finished.set()
+
+
+class LatestValues(object):
+    """
+    The last values of the curves of the `max_assets` most recently used assets.
+
+    Each asset is watched by one realtime query, started on the first request for its values
+    (or by `watch`). Values are only known after they are received, so the first requests
+    return None and must be answered by other means.
+    """
+
+    def __init__(self, settings, max_assets=8):
+        self.settings = settings
+        self.max_assets = max_assets
+        self.watchers = OrderedDict()
+        self.lock = threading.Lock()
+
+    def watch(self, event_filter):
+        with self.lock:
+            watcher = self.watchers.get(event_filter)
+            if watcher is not None and watcher.is_alive():
+                self.watchers.move_to_end(event_filter)
+                return watcher
+
+            logging.info(f"Watching the latest values of '{event_filter}'")
+            watcher = self.watchers[event_filter] = AssetWatcher(event_filter, self.settings)
+            self.watchers.move_to_end(event_filter)
+
+            while len(self.watchers) > self.max_assets:
+                _event_filter, evicted_watcher = self.watchers.popitem(last=False)
+                evicted_watcher.stop()
+
+        return watcher
+
+    def get(self, event_filter, curve):
+        return self.watch(event_filter).get(curve)
+
+    def stop(self):
+        with self.lock:
+            for watcher in self.watchers.values():
+                watcher.stop()
+
+            self.watchers.clear()
+
+
+def get_latest_values(settings):
+    """
+    Returns the latest values shared by the bots of this process, or None when disabled::
+
+      "latest_values": {
+        "enabled": true,
+        "max_assets": 8   # Assets watched at the same time
+      }
+    """
+    global _latest_values
+
+    latest_values_settings = dict(settings.get("latest_values", {}))
+    if not latest_values_settings.pop("enabled", True):
+        return None
+
+    if _latest_values is None:
+        _latest_values = LatestValues(settings, **latest_values_settings)
+
+    return _latest_values
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Provides the NLTK resources used by the logic adapters without downloading them at runtime.
+
+The resources are expected on a local data directory, versioned by the NLTK version,
+which is filled at build time (see `templates/tools/package_task.sh`)::
+
+  $ python -m live_agent.modules.chatbot.src.nltk_resources [--data-dir=<path>]
+"""
+import argparse
+import os
+import re
+import sys
+
+import nltk
+from nltk.tag import PerceptronTagger
+
+from live_client.utils import logging
+
+__all__ = ["ensure_resources", "word_tokenize", "pos_tag"]
+
+DEFAULT_DATA_DIR = os.path.join(sys.prefix, "share", "live-agent", "nltk_data", nltk.__version__)
+NLTK_VERSION = tuple(int(part) for part in re.findall(r"\d+", nltk.__version__)[:2])
+
+# NLTK 3.9 replaced the pickled models by the `_tab`/`_eng` resources.
+# `word_tokenize` and `pos_tag` cannot work without the required resources
+if NLTK_VERSION >= (3, 9):
+    REQUIRED_RESOURCES = {
+        "punkt_tab": "tokenizers/punkt_tab/english/",
+        "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng/",
+    }
+    OPTIONAL_RESOURCES = {
+        "maxent_ne_chunker_tab": "chunkers/maxent_ne_chunker_tab/english_ace_multiclass/",
+        "words": "corpora/words",
+    }
+else:
+    REQUIRED_RESOURCES = {
+        "punkt": "tokenizers/punkt/english.pickle",
+        "averaged_perceptron_tagger": (
+            "taggers/averaged_perceptron_tagger/averaged_perceptron_tagger.pickle"
+        ),
+    }
+    OPTIONAL_RESOURCES = {
+        "maxent_ne_chunker": "chunkers/maxent_ne_chunker",
+        "words": "corpora/words",
+    }
+
+DEFAULT_RESOURCES = dict(REQUIRED_RESOURCES, **OPTIONAL_RESOURCES)
+
+_checked_resources = set()
+_tagger = None
+
+
+def register_data_dir(data_dir=None):
+    data_dir = data_dir or DEFAULT_DATA_DIR
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+
+    return data_dir
+
+
+def is_available(resource_path):
+    try:
+        nltk.data.find(resource_path)
+    except LookupError:
+        return False
+
+    return True
+
+
+def ensure_resources(resources=None, data_dir=None, download=False, required=None):
+    """
+    Checks, once per process, that the resources are available.
+    Missing resources are only downloaded when `download` is set.
+
+    Raises `LookupError` when one of the `required` resources (by default, the ones
+    loaded by `word_tokenize` and `pos_tag`) is missing, the others are only logged
+    """
+    data_dir = register_data_dir(data_dir)
+    if required is None:
+        required = REQUIRED_RESOURCES
+
+    for name, resource_path in (resources or DEFAULT_RESOURCES).items():
+        if name in _checked_resources:
+            continue
+
+        if not is_available(resource_path) and download:
+            logging.info(f"Downloading {name} to {data_dir}")
+            nltk.download(name, download_dir=data_dir, quiet=True)
+
+        if not is_available(resource_path):
+            message = f"NLTK resource {name} ({resource_path}) not found on {nltk.data.path}"
+            if name in required:
+                raise LookupError(message)
+
+            logging.warn(message)
+
+        _checked_resources.add(name)
+
+
+def word_tokenize(text):
+    return nltk.word_tokenize(text)
+
+
+def get_tagger():
+    # `nltk.pos_tag` loads the tagger model on every call
+    global _tagger
+
+    if _tagger is None:
+        _tagger = PerceptronTagger()
+
+    return _tagger
+
+
+def pos_tag(tokens):
+    return get_tagger().tag(tokens)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Downloads the NLTK resources used by live-agent")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where to store the resources")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    os.makedirs(args.data_dir, exist_ok=True)
+    for name in DEFAULT_RESOURCES:
+        if not nltk.download(name, download_dir=args.data_dir, quiet=True):
+            sys.exit(f"Could not download {name}")
+
+    try:
+        ensure_resources(data_dir=args.data_dir)
+    except LookupError as e:
+        sys.exit(str(e))
+
+    print(f"NLTK resources stored on {args.data_dir}")
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import bisect
+from hashlib import md5
+
+__all__ = ["HashRing"]
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys over a set of nodes.
+
+    Each node is placed `replicas` times on the ring, so the keys are spread evenly and
+    changing the number of nodes moves only a fraction of them.
+    """
+
+    def __init__(self, nodes, replicas=128):
+        self.ring = sorted(
+            (self.hash(f"{node}:{replica}"), node) for node in nodes for replica in range(replicas)
+        )
+        self.positions = [position for position, _node in self.ring]
+
+    @staticmethod
+    def hash(key):
+        return int(md5(str(key).encode("utf-8")).hexdigest()[:16], 16)
+
+    def get_node(self, key):
+        index = bisect.bisect(self.positions, self.hash(key)) % len(self.ring)
+        return self.ring[index][1]
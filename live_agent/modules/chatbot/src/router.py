@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from nltk import NaiveBayesClassifier
+
+from .classifiers import get_classifier
+
+__all__ = ["IntentRouter"]
+
+
+class IntentRouter(object):
+    """
+    Classifies each statement once among all the Bayes based adapters of a bot.
+
+    A single multi-class classifier is trained with the `positive_examples` of every adapter,
+    labeled with the adapter's name. For each statement, the features are extracted once and
+    only the `max_candidates` most likely adapters are evaluated.
+    The router only prunes the candidates, each of them still computes its own confidence.
+    """
+
+    def __init__(self, max_candidates=2, directory=None):
+        self.max_candidates = max_candidates
+        self.directory = directory
+        self.signature = None
+        self.adapters = {}
+        self.classifier = None
+        self.last_text = None
+        self.last_scores = {}
+
+    @staticmethod
+    def is_routed(adapter):
+        return hasattr(adapter, "positive_examples") and hasattr(adapter, "analyze_features")
+
+    def refresh(self, logic_adapters):
+        """
+        Rebuilds the classifier when the adapters change (like after they are reloaded)
+        """
+        # The adapters themselves, as their ids may be reused after they are replaced
+        signature = tuple(logic_adapters)
+        if signature == self.signature:
+            return
+
+        self.signature = signature
+        self.adapters = dict(
+            (adapter.class_name, adapter) for adapter in logic_adapters if self.is_routed(adapter)
+        )
+        self.classifier = None
+        self.last_text = None
+
+        if self.adapters:
+            labeled_data = [
+                (text, name)
+                for name, adapter in self.adapters.items()
+                for text in adapter.positive_examples
+            ]
+            self.classifier = get_classifier(
+                "IntentRouter", labeled_data, self.train_classifier, directory=self.directory
+            )
+
+    def analyze_features(self, text):
+        # Every adapter extracts the same features, as they know the same examples
+        any_adapter = next(iter(self.adapters.values()))
+        return any_adapter.analyze_features(text)
+
+    def train_classifier(self, labeled_data):
+        train_set = [(self.analyze_features(text), name) for (text, name) in labeled_data]
+        return NaiveBayesClassifier.train(train_set)
+
+    def scores(self, statement):
+        """
+        The probabilities of the most likely adapters for the statement, by adapter name
+        """
+        text = statement.text.lower()
+        if text != self.last_text:
+            distribution = self.classifier.prob_classify(self.analyze_features(text))
+            ranking = sorted(
+                ((distribution.prob(name), name) for name in distribution.samples()), reverse=True
+            )
+            self.last_scores = dict(
+                (name, probability) for probability, name in ranking[: self.max_candidates]
+            )
+            self.last_text = text
+
+        return self.last_scores
+
+    def handles(self, adapter):
+        return self.classifier is not None and self.adapters.get(adapter.class_name) is adapter
+
+    def is_candidate(self, adapter, statement):
+        return not self.handles(adapter) or adapter.class_name in self.scores(statement)
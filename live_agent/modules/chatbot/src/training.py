@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import fcntl
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+import chatterbot
+from chatterbot.corpus import list_corpus_files
+from chatterbot.trainers import ChatterBotCorpusTrainer
+
+from live_client.utils import logging
+
+__all__ = ["get_database_uri"]
+
+DEFAULT_CORPORA = ("conversations", "greetings", "humor")
+
+
+def corpus_digest(corpus_paths):
+    """
+    Hash of the corpus files and of the chatterbot version used to train them
+    """
+    digest = hashlib.sha1(chatterbot.__version__.encode())
+    for dotted_path in corpus_paths:
+        digest.update(dotted_path.encode())
+        for file_path in sorted(list_corpus_files(dotted_path)):
+            with open(file_path, "rb") as corpus_file:
+                digest.update(corpus_file.read())
+
+    return digest.hexdigest()[:16]
+
+
+def train_database(database_path, corpus_paths):
+    """
+    Trains a new storage on a temporary file, which is only renamed to `database_path`
+    after the training is complete
+    """
+    started_at = time.monotonic()
+    temp_path = f"{database_path}.{os.getpid()}.tmp"
+
+    chatbot = chatterbot.ChatBot("trainer", database_uri=f"sqlite:///{temp_path}")
+    trainer = ChatterBotCorpusTrainer(chatbot)
+    trainer.train(*corpus_paths)
+    chatbot.storage.engine.dispose()
+
+    # Merge the write-ahead log into the database, so the file can be moved
+    with closing(sqlite3.connect(temp_path)) as connection:
+        connection.execute("PRAGMA journal_mode=DELETE")
+
+    os.replace(temp_path, database_path)
+    logging.info(f"Chatbot corpus trained in {time.monotonic() - started_at:.1f}s: {database_path}")
+
+
+def get_database_uri(settings):
+    """
+    Returns the uri of a storage trained with the chatterbot corpus.
+
+    The storage is trained once for each language, set of corpora and chatterbot version
+    and reused by every room bot::
+
+      "training": {
+        "language": "english",
+        "corpora": ["conversations", "greetings", "humor"],
+        "directory": "/tmp"
+      }
+    """
+    training_settings = settings.get("training", {})
+    language = training_settings.get("language", "english")
+    corpora = training_settings.get("corpora", DEFAULT_CORPORA)
+    directory = training_settings.get("directory", tempfile.gettempdir())
+
+    corpus_paths = [f"chatterbot.corpus.{language}.{name}" for name in corpora]
+    database_name = f"chatterbot-{language}-{corpus_digest(corpus_paths)}.sqlite3"
+    database_path = os.path.join(directory, database_name)
+
+    if not os.path.exists(database_path):
+        # Bots started at the same time wait for a single training
+        with open(f"{database_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(database_path):
+                train_database(database_path, corpus_paths)
+
+    return f"sqlite:///{database_path}"
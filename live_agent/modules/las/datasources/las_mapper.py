@@ -2,10 +2,10 @@
 import csv
 from setproctitle import setproctitle
 
-import lasio
-
 from live_client.utils import logging
 
+from ..utils.reader import LASReader
+
 __all__ = ["start"]
 
 
@@ -17,8 +17,7 @@ def open_files(settings, iterations):
 
     try:
         las_path, chat_path = path_list[path_index]
-        with open(las_path, "r") as las_file:
-            data = lasio.read(las_file)
+        data = LASReader(las_path)
 
         if chat_path:
             with open(chat_path, "r") as chat_file:
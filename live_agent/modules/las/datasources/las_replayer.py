@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 from enum import Enum
-import csv
 from setproctitle import setproctitle
 
-import lasio
-
-from live_client.events import raw, messenger
+from live_client.events import messenger
 from live_client.utils import timestamp, logging
 
-from ..utils import loop
+from live_agent.services.output import EventBuffer
+
+from ..utils import loop, frames
+from ..utils.chat import ChatLog
+from ..utils.reader import LASReader, DEFAULT_CHUNK_SIZE
 
 __all__ = ["start"]
 
@@ -20,15 +21,7 @@ def update_chat(chat, last_ts, next_ts, index_mnemonic, settings):
     if not chat:
         return
 
-    items_to_send = []
-    for item in chat:
-        item_index = int(item.get(index_mnemonic, -1))
-
-        if last_ts <= item_index < next_ts:
-            items_to_send.append(item)
-        elif item_index > next_ts:
-            break
-
+    items_to_send = chat.messages_between(last_ts, next_ts)
     logging.debug("{} messages between {} and {}".format(len(items_to_send), last_ts, next_ts))
 
     for item in items_to_send:
@@ -54,26 +47,6 @@ def delay_output(last_timestamp, next_timestamp):
     loop.await_next_cycle(sleep_time)
 
 
-def read_next_frame(values_iterator, curves, curves_data, index_mnemonic):
-    try:
-        index, values = next(values_iterator)
-        success = True
-    except Exception as e:
-        output_frame = {}
-        success = False
-        logging.debug("Error reading next value, {}<{}>".format(e, type(e)))
-
-    if success:
-        output_frame = {index_mnemonic: {"value": index, "uom": "s"}}
-
-        for index, channel in enumerate(curves):
-            uom = curves_data.get(channel)
-            channel_value = values[index]
-            output_frame[channel] = {"value": channel_value, "uom": uom}
-
-    return success, output_frame
-
-
 def open_files(settings, iterations, mode=READ_MODES.CONTINUOUS):
     path_list = settings["path_list"]
     index_mnemonic = settings["index_mnemonic"]
@@ -85,12 +58,10 @@ def open_files(settings, iterations, mode=READ_MODES.CONTINUOUS):
 
     try:
         las_path, chat_path = path_list[path_index]
-        with open(las_path, "r") as las_file:
-            data = lasio.read(las_file)
+        data = LASReader(las_path)
 
         if chat_path:
-            with open(chat_path, "r") as chat_file:
-                chat_data = list(csv.DictReader(chat_file))
+            chat_data = ChatLog(chat_path, index_mnemonic)
 
             logging.debug("Success opening files {} and {}>".format(las_path, chat_path))
         else:
@@ -107,27 +78,24 @@ def open_files(settings, iterations, mode=READ_MODES.CONTINUOUS):
     return success, data, chat_data, index_mnemonic
 
 
-def generate_events(event_type, las_data, chat_data, index_mnemonic, settings, state_manager):
+def generate_events(
+    event_type, las_data, chat_data, index_mnemonic, settings, state_manager, event_buffer
+):
     logging.info("{}: Event generation started".format(event_type))
 
     source_name = las_data.version.SOURCE.value
-    curves_data = dict((item.mnemonic, item.unit) for item in las_data.curves)
-    las_df = las_data.df()
-    values_iterator = las_df.iterrows()
-    curves = las_df.columns
+    curves = [(item.mnemonic, item.unit) for item in las_data.curves[1:]]
+    chunk_size = settings.get("chunk_size", DEFAULT_CHUNK_SIZE)
 
-    success = True
     state = state_manager.load()
     last_timestamp = state.get("last_timestamp", 0)
     if last_timestamp > 0:
         logging.info(f"Skipping to index {last_timestamp}")
 
-    while success:
-        success, statuses = read_next_frame(values_iterator, curves, curves_data, index_mnemonic)
-
-        if success:
-            next_timestamp = statuses.get(index_mnemonic, {}).get("value", 0)
-
+    blocks = las_data.blocks(chunk_size=chunk_size, start_after=last_timestamp or None)
+    for next_timestamp, statuses in frames.iter_frames(
+        blocks, curves, index_mnemonic, start_after=last_timestamp
+    ):
         if next_timestamp > last_timestamp:
             delay_output(last_timestamp, next_timestamp)
 
@@ -135,11 +103,11 @@ def generate_events(event_type, las_data, chat_data, index_mnemonic, settings, s
                 message = "Replay from '{}' started at TIME {}".format(source_name, next_timestamp)
                 send_message(message, timestamp.get_timestamp(), settings=settings)
 
-            raw.create(event_type, statuses, settings)
+            # The timestamp is saved by the buffer, once the event is sent
+            event_buffer.create(event_type, statuses, checkpoint=next_timestamp)
 
             update_chat(chat_data, last_timestamp, next_timestamp, index_mnemonic, settings)
             last_timestamp = next_timestamp
-            state_manager.save({"last_timestamp": last_timestamp})
 
 
 def start(settings, **kwargs):
@@ -162,6 +130,7 @@ def start(settings, **kwargs):
         "type": "las_replay",
         "enabled": true,  # Self explanatory
         "index_mnemonic": "TIME",  # Curve used as index for the LAS data
+        "chunk_size": 1000,  # Number of rows read at once from the LAS data
         "path_list": [
           # A list of filename pairs containing the data to be replayed
           [<path for a LAS file>, <path for a CSV file containing the chat logs>],
@@ -169,6 +138,14 @@ def start(settings, **kwargs):
         ]
         "output": {
           "event_type": "raw_wellX", The name of the event type which should be sent to Intelie Live
+          "buffer": {
+            # Optional, events are sent to Intelie Live in batches
+            "max_events": 500,  # Maximum number of events on each batch
+            "max_bytes": 1048576,  # Maximum size of each batch
+            "max_latency": 1,  # Maximum time (in seconds) an event waits before being sent
+            "max_pending_bytes": 33554432,  # Maximum size of the events waiting to be sent
+            "overflow": "block"  # What to do when full, "block" or "drop" the oldest events
+          },
           "author": {
             "id": <user id>  # User id of the author for the messages
             "name": "Linguistics monitor"  # User name of the author for the messages
@@ -202,6 +179,20 @@ def start(settings, **kwargs):
     state = state_manager.load()
     iterations = state.get("iterations", 0)
 
+    event_buffer = EventBuffer(
+        settings["live"],
+        on_sent=lambda last_timestamp: state_manager.save({"last_timestamp": last_timestamp}),
+        **settings["output"].get("buffer", {}),
+    )
+
+    try:
+        replay_forever(event_type, settings, state_manager, event_buffer, iterations, cooldown_time)
+    finally:
+        # Sends the pending events, atexit handlers are not run on the agent processes
+        event_buffer.close()
+
+
+def replay_forever(event_type, settings, state_manager, event_buffer, iterations, cooldown_time):
     while True:
         try:
             success, las_data, chat_data, index_mnemonic = open_files(
@@ -210,8 +201,15 @@ def start(settings, **kwargs):
 
             if success:
                 generate_events(
-                    event_type, las_data, chat_data, index_mnemonic, settings, state_manager
+                    event_type,
+                    las_data,
+                    chat_data,
+                    index_mnemonic,
+                    settings,
+                    state_manager,
+                    event_buffer,
                 )
+                event_buffer.flush()
                 logging.info("Iteration {} successful".format(iterations))
             else:
                 logging.warn("Could not open files")
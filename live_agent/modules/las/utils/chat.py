@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import csv
+
+import numpy as np
+from live_client.utils import logging
+
+__all__ = ["ChatLog"]
+
+MISSING_INDEX = -1
+
+
+def iter_rows(chat_file):
+    """
+    Yields the byte offset and the fields of each row from a CSV file opened in binary mode.
+
+    Rows may span multiple lines, when a quoted field contains line breaks.
+    """
+    position = chat_file.tell()
+
+    def iter_lines():
+        nonlocal position
+        for line in chat_file:
+            position += len(line)
+            yield line.decode("utf-8")
+
+    reader = csv.reader(iter_lines())
+    row_offset = position
+    for row in reader:
+        yield row_offset, row
+        row_offset = position
+
+
+def parse_index(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return MISSING_INDEX
+
+
+class ChatLog(object):
+    """
+    An index over the messages of a chat log CSV file.
+
+    Only the index value and the byte offset of each message are kept in memory, sorted by the
+    index. The messages themselves are read from the file when they are requested.
+    """
+
+    def __init__(self, path, index_mnemonic):
+        self.path = path
+        self.index_mnemonic = index_mnemonic
+
+        index_values = []
+        offsets = []
+        with open(path, "rb") as chat_file:
+            rows = iter_rows(chat_file)
+            _offset, self.fieldnames = next(rows, (0, []))
+            if index_mnemonic in self.fieldnames:
+                index_column = self.fieldnames.index(index_mnemonic)
+            else:
+                logging.warn(f"{path}: Column {index_mnemonic} not found, ignoring the messages")
+                rows = []
+
+            for row_offset, row in rows:
+                if not row:
+                    continue
+
+                index_value = row[index_column] if index_column < len(row) else None
+                index_values.append(parse_index(index_value))
+                offsets.append(row_offset)
+
+        order = np.argsort(index_values, kind="stable")
+        self.index_values = np.array(index_values, dtype=float)[order]
+        self.offsets = np.array(offsets, dtype=np.int64)[order]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read_message(self, chat_file, offset):
+        chat_file.seek(offset)
+        _offset, row = next(iter_rows(chat_file))
+        return dict(zip(self.fieldnames, row))
+
+    def messages_between(self, start, end):
+        """
+        Returns the messages whose index is greater than or equal to `start` and less than `end`
+        """
+        first = np.searchsorted(self.index_values, start, side="left")
+        last = np.searchsorted(self.index_values, end, side="left")
+        if first >= last:
+            return []
+
+        with open(self.path, "rb") as chat_file:
+            return [self.read_message(chat_file, offset) for offset in self.offsets[first:last]]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+__all__ = ["iter_frames"]
+
+INDEX_UOM = "s"
+
+
+def iter_frames(blocks, curves, index_mnemonic, start_after=None):
+    """
+    Builds the frames to be replayed from blocks of values.
+
+    :param blocks: An iterable of `(index, values)` blocks, like those from `LASReader.blocks`
+    :param curves: A list of `(mnemonic, unit)` for the columns of `values`
+    :param index_mnemonic: The mnemonic used for the index on the frames
+    :param start_after: Rows whose index is not greater than this value are skipped
+
+    Yields a tuple with the index and the frame for each row. Curves with no value (`NaN`)
+    on a row are not included on its frame.
+    """
+    mnemonics = [mnemonic for mnemonic, _unit in curves]
+    units = [unit for _mnemonic, unit in curves]
+
+    for index, values in blocks:
+        if start_after is not None:
+            selected_rows = index > start_after
+            if not selected_rows.any():
+                continue
+
+            index = index[selected_rows]
+            values = values[selected_rows]
+
+        for row_index, row_values in zip(index.tolist(), values.tolist()):
+            frame = {index_mnemonic: {"value": row_index, "uom": INDEX_UOM}}
+            frame.update(
+                {
+                    mnemonic: {"value": value, "uom": unit}
+                    for mnemonic, unit, value in zip(mnemonics, units, row_values)
+                    if value == value  # Skip NaN values
+                }
+            )
+
+            yield row_index, frame
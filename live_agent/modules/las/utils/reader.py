@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+import os
+from itertools import islice
+
+import lasio
+import numpy as np
+from live_client.utils import logging
+
+__all__ = ["LASReader"]
+
+DEFAULT_CHUNK_SIZE = 1000
+DATA_SECTION_PREFIX = b"~A"
+COMMENT_PREFIX = b"#"
+INDEX_SUFFIX = ".index.npz"
+INDEX_STEP = 1000
+
+
+class LASReader:
+    """
+    Reads a LAS file without loading its data section into memory.
+
+    The header is parsed once, using `lasio`. The data section is read on demand,
+    in blocks of a fixed number of rows, so the memory used does not depend on the file size.
+    Only unwrapped, space delimited, data sections are supported.
+
+    To resume a replay without reading the rows already sent, the index value and the byte offset
+    of every `index_step` rows are stored on a sidecar file (`<path>.index.npz`), created
+    on the first seek and rebuilt whenever the LAS file changes.
+    """
+
+    def __init__(self, path, index_step=INDEX_STEP):
+        self.path = path
+        self.index_path = f"{path}{INDEX_SUFFIX}"
+        self.index_step = index_step
+        self.row_index = None
+
+        header_lines = []
+        with open(path, "rb") as las_file:
+            for line in las_file:
+                header_lines.append(line)
+                if line.lstrip().upper().startswith(DATA_SECTION_PREFIX):
+                    break
+
+            self.data_offset = las_file.tell()
+
+        header_text = b"".join(header_lines).decode("utf-8", errors="replace")
+        self.header = lasio.read(header_text, ignore_data=True)
+
+        wrap = self.header.version.get("WRAP")
+        if wrap is not None and str(wrap.value).strip().upper() == "YES":
+            raise ValueError(f"{path}: wrapped LAS files are not supported")
+
+        null_value = self.header.well.get("NULL")
+        self.null_value = None if null_value is None else null_value.value
+
+    @property
+    def version(self):
+        return self.header.version
+
+    @property
+    def well(self):
+        return self.header.well
+
+    @property
+    def curves(self):
+        return self.header.curves
+
+    def iter_lines(self, offset=None):
+        """
+        Yields the byte offset and the contents of each row from the data section
+        """
+        with open(self.path, "rb") as las_file:
+            las_file.seek(self.data_offset if offset is None else offset)
+
+            line_offset = las_file.tell()
+            for line in iter(las_file.readline, b""):
+                if line.strip() and not line.lstrip().startswith(COMMENT_PREFIX):
+                    yield line_offset, line
+
+                line_offset += len(line)
+
+    def file_signature(self):
+        file_stat = os.stat(self.path)
+        return np.array([file_stat.st_size, file_stat.st_mtime_ns, self.data_offset])
+
+    def build_index(self):
+        """
+        Reads the index values of the whole data section, keeping one entry every `index_step` rows
+        """
+        index_values = []
+        offsets = []
+        for row_number, (line_offset, line) in enumerate(self.iter_lines()):
+            if row_number % self.index_step == 0:
+                index_values.append(float(line.split(None, 1)[0]))
+                offsets.append(line_offset)
+
+        return np.array(index_values, dtype=float), np.array(offsets, dtype=np.int64)
+
+    def read_index(self):
+        try:
+            with np.load(self.index_path) as index_data:
+                if np.array_equal(index_data["signature"], self.file_signature()):
+                    return index_data["index_values"], index_data["offsets"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warn(f"Error reading the index from {self.index_path}, {e}<{type(e)}>")
+
+        return None
+
+    def write_index(self, index_values, offsets):
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as index_file:
+                np.savez(
+                    index_file,
+                    signature=self.file_signature(),
+                    index_values=index_values,
+                    offsets=offsets,
+                )
+
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logging.warn(f"Error writing the index to {self.index_path}, {e}<{type(e)}>")
+
+    def load_index(self):
+        """
+        Returns the index values and the byte offsets from the sidecar file, creating it if needed
+        """
+        if self.row_index is None:
+            self.row_index = self.read_index()
+
+        if self.row_index is None:
+            logging.info(f"Building the index for {self.path}")
+            self.row_index = self.build_index()
+            self.write_index(*self.row_index)
+
+        return self.row_index
+
+    def find_offset(self, start_after):
+        """
+        Finds the byte offset of the first row whose index is greater than `start_after`.
+
+        Uses a binary search on the sidecar index and reads at most `index_step` rows.
+        The index values must be increasing, as on any LAS file.
+        """
+        index_values, offsets = self.load_index()
+        if len(offsets) == 0:
+            return None
+
+        position = max(np.searchsorted(index_values, start_after, side="right") - 1, 0)
+        for line_offset, line in self.iter_lines(int(offsets[position])):
+            if float(line.split(None, 1)[0]) > start_after:
+                return line_offset
+
+        return None
+
+    def blocks(self, chunk_size=DEFAULT_CHUNK_SIZE, start_after=None):
+        """
+        Reads the data section in blocks of `chunk_size` rows.
+
+        Yields a tuple with the index values and a 2d array with the values of the other curves.
+        Rows whose index is not greater than `start_after` are skipped.
+        """
+        if start_after is None:
+            offset = self.data_offset
+        else:
+            offset = self.find_offset(start_after)
+            if offset is None:
+                return
+
+        num_columns = len(self.curves)
+        lines = (line for _offset, line in self.iter_lines(offset))
+
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                break
+
+            data = np.array(b" ".join(chunk).split(), dtype=float).reshape(-1, num_columns)
+            if self.null_value is not None:
+                data[data == self.null_value] = np.nan
+
+            yield data[:, 0], data[:, 1:]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import socket
+import struct
+from multiprocessing.connection import Connection, answer_challenge, deliver_challenge
+from typing import Any, Optional
+
+__all__ = ["connect", "set_timeout"]
+
+
+def connect(address: str, authkey: bytes, timeout: Optional[float] = None) -> Connection:
+    """
+    Like `multiprocessing.connection.Client` for an `AF_UNIX` address, but every read or write,
+    including the authentication handshake, fails after `timeout` seconds.
+
+    Otherwise a client of a listener which stopped accepting connections blocks forever.
+    """
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.connect(address)
+        connection = Connection(sock.detach())
+    except OSError:
+        sock.close()
+        raise
+
+    try:
+        set_timeout(connection, timeout)
+        answer_challenge(connection, authkey)
+        deliver_challenge(connection, authkey)
+    except Exception:
+        connection.close()
+        raise
+
+    return connection
+
+
+def set_timeout(connection: Any, timeout: Optional[float]) -> None:
+    """
+    Limits the time blocked on each read or write of the connection. None removes the limit
+    """
+    seconds = timeout or 0
+    value = struct.pack("ll", int(seconds), int((seconds % 1) * 1e6))
+
+    sock = socket.socket(fileno=connection.fileno())
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, value)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, value)
+    finally:
+        # The descriptor belongs to the connection
+        sock.detach()
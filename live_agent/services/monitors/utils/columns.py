@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from .query import Window
+from .stats import to_float
+
+__all__ = ["ColumnsWindow"]
+
+DEFAULT_CAPACITY = 1024
+
+
+class ColumnsWindow(Window):
+    """
+    A window which keeps one numpy array for the index and for each mnemonic.
+
+    The values live on a buffer which is compacted (or grown) only when its end is reached,
+    so appending and expiring events are amortised O(1) and each column is a contiguous view
+    of the buffer, without copies. Values which are not numbers become `NaN`.
+
+    The views are only valid until the window changes and must not be modified.
+    """
+
+    def __init__(
+        self,
+        index_mnemonic,
+        window_duration,
+        mnemonics,
+        events=(),
+        capacity=None,
+        statistics=None,
+    ):
+        super().__init__(index_mnemonic, window_duration, statistics=statistics)
+        self.mnemonics = list(mnemonics)
+        self.positions = {mnemonic: position for position, mnemonic in enumerate(self.mnemonics)}
+
+        capacity = capacity or DEFAULT_CAPACITY
+        self.index_buffer = np.empty(capacity)
+        self.values_buffer = np.empty((len(self.mnemonics), capacity))
+        self.head = 0
+        self.tail = 0
+
+        if events:
+            self.add(events)
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def __getitem__(self, mnemonic):
+        return self.column(mnemonic)
+
+    def __contains__(self, mnemonic):
+        return mnemonic in self.positions
+
+    def first_index(self):
+        return self.index_buffer[self.head]
+
+    def last_index(self):
+        return self.index_buffer[self.tail - 1]
+
+    def first_value(self, mnemonic):
+        return self.values_buffer[self.positions[mnemonic], self.head]
+
+    def append(self, item, index):
+        if self.tail == len(self.index_buffer):
+            self.make_room()
+
+        self.index_buffer[self.tail] = index
+        self.values_buffer[:, self.tail] = [to_float(item.get(name)) for name in self.mnemonics]
+        self.tail += 1
+
+    def popleft(self):
+        self.head += 1
+
+    def clear(self):
+        self.head = 0
+        self.tail = 0
+
+    def make_room(self):
+        size = len(self)
+        capacity = len(self.index_buffer)
+
+        if size > capacity // 2:
+            capacity *= 2
+            index_buffer = np.empty(capacity)
+            values_buffer = np.empty((len(self.mnemonics), capacity))
+        else:
+            index_buffer = self.index_buffer
+            values_buffer = self.values_buffer
+
+        index_buffer[:size] = self.index_buffer[self.head : self.tail]
+        values_buffer[:, :size] = self.values_buffer[:, self.head : self.tail]
+        self.index_buffer = index_buffer
+        self.values_buffer = values_buffer
+        self.head = 0
+        self.tail = size
+
+    @property
+    def index(self):
+        return self.index_buffer[self.head : self.tail]
+
+    @property
+    def values(self):
+        """A 2d view with one column for each mnemonic"""
+        return self.values_buffer[:, self.head : self.tail].T
+
+    def column(self, mnemonic):
+        return self.values_buffer[self.positions[mnemonic], self.head : self.tail]
+
+    def last(self, mnemonic):
+        return self.values_buffer[self.positions[mnemonic], self.tail - 1]
+
+    def mean(self, mnemonic):
+        return np.nanmean(self.column(mnemonic))
+
+    def min(self, mnemonic):
+        return np.nanmin(self.column(mnemonic))
+
+    def max(self, mnemonic):
+        return np.nanmax(self.column(mnemonic))
+
+    def slope(self, mnemonic):
+        """
+        The slope of the least squares line of the values of `mnemonic` over the index
+        """
+        values = self.column(mnemonic)
+        valid = ~np.isnan(values)
+        if valid.sum() < 2:
+            return np.nan
+
+        index = self.index[valid]
+        values = values[valid]
+        index_deviation = index - index.mean()
+        variance = (index_deviation**2).sum()
+        if variance == 0:
+            return np.nan
+
+        return (index_deviation * (values - values.mean())).sum() / variance
+
+    def rolling(self, mnemonic, size, func=None):
+        """
+        Applies `func` (by default, the mean) over each group of `size` consecutive values.
+
+        Returns an array with `len(window) - size + 1` items.
+        """
+        values = self.column(mnemonic)
+        if len(values) < size:
+            return np.empty(0)
+
+        if func is None:
+            cumulative_sum = np.concatenate([[0], np.cumsum(values)])
+            return (cumulative_sum[size:] - cumulative_sum[:-size]) / size
+
+        windows = np.lib.stride_tricks.as_strided(
+            values,
+            shape=(len(values) - size + 1, size),
+            strides=(values.strides[0], values.strides[0]),
+            writeable=False,
+        )
+        return np.array([func(item) for item in windows])
@@ -1,8 +1,22 @@
 # -*- coding: utf-8 -*-
+from collections import deque
+from collections.abc import Sequence
+from itertools import islice
 
 from live_client.utils import logging
 
-__all__ = ["prepare_query", "handle_events"]
+from .stats import build_statistics, to_float
+
+__all__ = [
+    "prepare_query",
+    "prepare_subscription_key",
+    "handle_events",
+    "compile_spec",
+    "build_window",
+    "MonitorSpec",
+    "Window",
+    "EventsWindow",
+]
 
 
 def prepare_query(settings):
@@ -32,21 +46,82 @@ def prepare_query(settings):
     return query
 
 
+class MonitorSpec(object):
+    """
+    The monitor settings used by `handle_events`, read once when the monitor starts
+    """
+
+    def __init__(self, settings):
+        monitor_settings = settings.get("monitor", {})
+
+        self.settings = settings
+        self.window_duration = monitor_settings.get("window_duration", 60)
+        self.window_mode = monitor_settings.get("window_mode", "events")
+        self.mnemonics = dict(monitor_settings.get("mnemonics", {}))
+        self.index_mnemonic = self.mnemonics.get("index", "timestamp")
+        self.statistics_settings = monitor_settings.get("statistics")
+        self.expected_curves = frozenset(self.mnemonics.values())
+
+    def validate(self, event_content):
+        """
+        Returns the items which have all the expected curves and,
+        when there are none, the curves missing from all items
+        """
+        expected_curves = self.expected_curves
+        valid_events = [item for item in event_content if item.keys() >= expected_curves]
+
+        if valid_events or not event_content:
+            missing_curves = []
+        else:
+            missing_curves = [
+                curve
+                for curve in self.expected_curves
+                if not any(curve in item for item in event_content)
+            ]
+
+        return valid_events, missing_curves
+
+
+def compile_spec(settings):
+    if isinstance(settings, MonitorSpec):
+        return settings
+
+    return MonitorSpec(settings)
+
+
+def prepare_subscription_key(settings):
+    """
+    Monitors over the same event type and mnemonics can share the query built by `prepare_query`.
+    See `live_agent.services.multiplexer.on_shared_event`
+    """
+    event_type = settings.get("event_type")
+    mnemonics_settings = settings.get("monitor", {}).get("mnemonics", {})
+    return ("monitor", event_type, frozenset(mnemonics_settings.values()))
+
+
 def handle_events(event, callback, settings, accumulator=None):
-    monitor_settings = settings.get("monitor", {})
-    window_duration = monitor_settings.get("window_duration", 60)
-    mnemonics = monitor_settings.get("mnemonics", {})
-    index_mnemonic = mnemonics.get("index", "timestamp")
+    """
+    Adds the valid items from `event` to the window of events and calls `callback` with it.
+
+    Returns the window, which should be passed as `accumulator` on the next call.
+    `settings` may be the process settings or a `MonitorSpec` compiled from them.
 
-    if accumulator is None:
-        accumulator = []
+    A list may also be used as `accumulator`, as on previous versions. It is updated in place
+    with the events on the window, which is rebuilt from the list on every call.
+    """
+    spec = getattr(accumulator, "spec", None) or compile_spec(settings)
+    if isinstance(accumulator, list):
+        return handle_events_on_list(event, callback, spec, accumulator)
+
+    if not isinstance(accumulator, Window):
+        accumulator = build_window(spec, events=accumulator or [])
 
     try:
-        latest_data, missing_curves = validate_event(event, settings)
+        latest_data, missing_curves = spec.validate(event.get("data", {}).get("content", []))
 
         if latest_data:
             accumulator, start, end = refresh_accumulator(
-                latest_data, accumulator, index_mnemonic, window_duration
+                latest_data, accumulator, spec.index_mnemonic, spec.window_duration
             )
 
             if accumulator:
@@ -58,65 +133,225 @@ def handle_events(event, callback, settings, accumulator=None):
 
     except Exception as e:
         logging.exception(f"Error during query: <{e}>")
-        handle_events(event, callback, settings)
-        return
+        return handle_events(event, callback, spec)
+
+    return accumulator
+
+
+def handle_events_on_list(event, callback, spec, events):
+    window = handle_events(event, callback, spec, build_window(spec, events=events))
+
+    if isinstance(window, EventsWindow):
+        events[:] = window.events
+    else:
+        # The columns do not keep the events, so they are tracked on another window
+        events_window = EventsWindow(spec.index_mnemonic, spec.window_duration, events=events)
+        latest_data, _missing_curves = validate_event(event, spec)
+        if latest_data:
+            events_window.add(latest_data)
+
+        events[:] = events_window.events
+
+    return window
 
 
 def validate_event(event, settings):
-    valid_events = []
-    mnemonics_settings = settings.get("monitor", {}).get("mnemonics", {})
-    expected_curves = set(mnemonics_settings.values())
+    spec = compile_spec(settings)
+    return spec.validate(event.get("data", {}).get("content", []))
+
 
-    event_content = event.get("data", {}).get("content", [])
-    if event_content:
-        missing_curves = expected_curves
-        for item in event_content:
-            item_curves = set(item.keys())
+def build_window(settings, events=()):
+    """
+    Creates the window used by `handle_events`, based on the monitor settings::
 
-            # Which curves are missing from all items in this event?
-            missing_curves = missing_curves - item_curves
+      "monitor": {
+        "window_duration": 60,  # Duration of the window, in the same unit as the index
+        "window_mode": "events",  # "events" (a sequence of dicts) or "columns" (numpy arrays)
+        "mnemonics": {
+          "index": "timestamp",  # The mnemonic used as index
+          ...
+        },
+        "statistics": {
+          # Optional, statistics updated as the events enter and leave the window
+          # See `live_agent.services.monitors.utils.stats.build_statistics`
+          "rop_mean": {"type": "mean", "mnemonic": "ROP"},
+          ...
+        }
+      }
+    """
+    spec = compile_spec(settings)
+    statistics = build_statistics(spec.statistics_settings)
 
-            # Does this item has all curves?
-            is_valid = len(expected_curves - item_curves) == 0
-            if is_valid:
-                valid_events.append(item)
+    if spec.window_mode == "columns":
+        from .columns import ColumnsWindow
+
+        value_mnemonics = [item for name, item in spec.mnemonics.items() if name != "index"]
+        for aggregator in statistics.values():
+            if aggregator.mnemonic not in value_mnemonics:
+                value_mnemonics.append(aggregator.mnemonic)
+
+        window = ColumnsWindow(
+            spec.index_mnemonic,
+            spec.window_duration,
+            value_mnemonics,
+            events=events,
+            statistics=statistics,
+        )
+    elif spec.window_mode == "events":
+        window = EventsWindow(
+            spec.index_mnemonic, spec.window_duration, events=events, statistics=statistics
+        )
     else:
-        missing_curves = []
+        raise ValueError(f"Invalid window mode {spec.window_mode}. Use 'events' or 'columns'")
+
+    window.spec = spec
+    return window
+
+
+class Window(object):
+    """
+    Base class for the windows of events kept by `handle_events`.
+
+    Holds the events received over the last `window_duration`, ordered by `index_mnemonic`.
+    New events are appended to the right and expired events are removed from the left.
+    An event whose index is lower than the index of the previous one resets the window.
 
-    return valid_events, missing_curves
+    The aggregators on `statistics` are updated as the events enter and leave the window.
+    """
+
+    def __init__(self, index_mnemonic, window_duration, statistics=None):
+        self.index_mnemonic = index_mnemonic
+        self.window_duration = window_duration
+        self.statistics = statistics or {}
+        self.spec = None
+        self.start = None
+        self.end = None
+
+    def __len__(self):
+        raise NotImplementedError("Windows must define a __len__ method")
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.start}-{self.end}, {len(self)} events>"
+
+    def first_index(self):
+        raise NotImplementedError("Windows must define a first_index method")
+
+    def last_index(self):
+        raise NotImplementedError("Windows must define a last_index method")
+
+    def first_value(self, mnemonic):
+        raise NotImplementedError("Windows must define a first_value method")
+
+    def append(self, item, index):
+        raise NotImplementedError("Windows must define an append method")
+
+    def popleft(self):
+        raise NotImplementedError("Windows must define a popleft method")
+
+    def clear(self):
+        raise NotImplementedError("Windows must define a clear method")
+
+    def get_index(self, event):
+        return event.get(self.index_mnemonic, 0)
+
+    def add(self, latest_events):
+        latest_event = latest_events[-1]
+        if self.index_mnemonic not in latest_event:
+            mnemonics_list = latest_event.keys()
+            logging.error(
+                f"Mnemonic '{self.index_mnemonic}' not found. "
+                f"Available mnemonics are: '{mnemonics_list}'"
+            )
+
+        self.end = self.get_index(latest_event)
+        self.start = self.end - self.window_duration
+
+        for item in latest_events:
+            index = self.get_index(item)
+            if index == 0 and self.index_mnemonic not in item:
+                logging.error(f"{self.index_mnemonic} not found, ignoring event")
+            elif len(self) and index < self.last_index():
+                # Reset the window
+                self.reset()
+                self.push(item, index)
+            elif self.start <= index <= self.end:
+                self.push(item, index)
+
+        self.purge()
+
+    def push(self, item, index):
+        self.append(item, index)
+        for aggregator in self.statistics.values():
+            aggregator.add(index, to_float(item.get(aggregator.mnemonic)))
+
+    def purge(self):
+        while len(self) and self.first_index() < self.start:
+            index = self.first_index()
+            for aggregator in self.statistics.values():
+                aggregator.remove(index, to_float(self.first_value(aggregator.mnemonic)))
+
+            self.popleft()
+
+    def reset(self):
+        self.clear()
+        for aggregator in self.statistics.values():
+            aggregator.reset()
+
+
+class EventsWindow(Window, Sequence):
+    """
+    A window which keeps the events as they were received
+    """
+
+    def __init__(self, index_mnemonic, window_duration, events=(), statistics=None):
+        super().__init__(index_mnemonic, window_duration, statistics=statistics)
+        self.events = deque()
+
+        if events:
+            self.add(events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(islice(self.events, *position.indices(len(self.events))))
+
+        return self.events[position]
+
+    def first_index(self):
+        return self.get_index(self.events[0])
+
+    def last_index(self):
+        return self.get_index(self.events[-1])
+
+    def first_value(self, mnemonic):
+        return self.events[0].get(mnemonic)
+
+    def append(self, item, index):
+        self.events.append(item)
+
+    def popleft(self):
+        self.events.popleft()
+
+    def clear(self):
+        self.events.clear()
 
 
 def refresh_accumulator(latest_events, accumulator, index_mnemonic, window_duration):
-    # Purge old events and add the new ones
-    latest_event = latest_events[-1]
-    window_end = latest_event.get(index_mnemonic, 0)
-    window_start = window_end - window_duration
-    last_index = window_start
-
-    if index_mnemonic not in latest_event:
-        mnemonics_list = latest_event.keys()
-        logging.error(
-            f"Mnemonic '{index_mnemonic}' not found. Available mnemonics are: '{mnemonics_list}'"
-        )
+    if not isinstance(accumulator, Window):
+        accumulator = EventsWindow(index_mnemonic, window_duration, events=accumulator)
 
-    accumulator.extend(latest_events)
-    purged_accumulator = []
-    for item in accumulator:
-        index = item.get(index_mnemonic, 0)
-        if (window_start <= index <= window_end) and (index >= last_index):
-            purged_accumulator.append(item)
-            last_index = index
-        elif index < last_index:
-            # Reset the accumulator
-            purged_accumulator = [item]
-            last_index = index
-        elif index == 0:
-            logging.error(f"{index_mnemonic} not found, ignoring event")
+    received_events = len(accumulator) + len(latest_events)
+    accumulator.add(latest_events)
 
     logging.debug(
         "{} of {} events between {} and {}".format(
-            len(purged_accumulator), len(accumulator), window_start, window_end
+            len(accumulator), received_events, accumulator.start, accumulator.end
         )
     )
 
-    return purged_accumulator, window_start, window_end
+    return accumulator, accumulator.start, accumulator.end
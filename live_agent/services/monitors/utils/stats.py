@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import math
+from collections import deque
+
+__all__ = [
+    "Aggregator",
+    "Sum",
+    "Mean",
+    "Variance",
+    "Min",
+    "Max",
+    "LinearRegression",
+    "EWMA",
+    "build_statistics",
+]
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Aggregator(object):
+    """
+    Base class for statistics updated incrementally, as events enter and leave a window.
+
+    Events leave the window in the same order they entered it.
+    Values which are not numbers are ignored.
+    """
+
+    def __init__(self, mnemonic):
+        self.mnemonic = mnemonic
+        self.reset()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.mnemonic}={self.value}>"
+
+    def reset(self):
+        self.count = 0
+
+    def add(self, index, value):
+        if not math.isnan(value):
+            self.count += 1
+            self.on_add(index, value)
+
+    def remove(self, index, value):
+        if not math.isnan(value):
+            self.count -= 1
+            if self.count == 0:
+                self.reset()
+            else:
+                self.on_remove(index, value)
+
+    def on_add(self, index, value):
+        raise NotImplementedError("Aggregators must define an on_add method")
+
+    def on_remove(self, index, value):
+        raise NotImplementedError("Aggregators must define an on_remove method")
+
+    @property
+    def value(self):
+        raise NotImplementedError("Aggregators must define a value property")
+
+
+class Sum(Aggregator):
+    def reset(self):
+        super().reset()
+        self.total = 0.0
+
+    def on_add(self, index, value):
+        self.total += value
+
+    def on_remove(self, index, value):
+        self.total -= value
+
+    @property
+    def value(self):
+        return self.total
+
+
+class Mean(Sum):
+    @property
+    def value(self):
+        return self.total / self.count if self.count else math.nan
+
+
+class Variance(Aggregator):
+    """
+    Welford's algorithm, reverted when a value leaves the window
+    """
+
+    def __init__(self, mnemonic, ddof=0):
+        self.ddof = ddof
+        super().__init__(mnemonic)
+
+    def reset(self):
+        super().reset()
+        self.mean = 0.0
+        self.squared_deviations = 0.0
+
+    def on_add(self, index, value):
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squared_deviations += delta * (value - self.mean)
+
+    def on_remove(self, index, value):
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.squared_deviations -= delta * (value - self.mean)
+
+    @property
+    def value(self):
+        if self.count <= self.ddof:
+            return math.nan
+
+        return max(self.squared_deviations, 0.0) / (self.count - self.ddof)
+
+
+class Max(Aggregator):
+    """
+    Keeps a monotonic deque with the values which can still become the maximum
+    """
+
+    def reset(self):
+        super().reset()
+        self.candidates = deque()
+        self.added = 0
+        self.removed = 0
+
+    def dominates(self, value, other):
+        return value >= other
+
+    def on_add(self, index, value):
+        while self.candidates and self.dominates(value, self.candidates[-1][1]):
+            self.candidates.pop()
+
+        self.candidates.append((self.added, value))
+        self.added += 1
+
+    def on_remove(self, index, value):
+        if self.candidates[0][0] == self.removed:
+            self.candidates.popleft()
+
+        self.removed += 1
+
+    @property
+    def value(self):
+        return self.candidates[0][1] if self.candidates else math.nan
+
+
+class Min(Max):
+    def dominates(self, value, other):
+        return value <= other
+
+
+class LinearRegression(Aggregator):
+    """
+    Least squares line of the values over the index. `value` is the slope
+    """
+
+    def reset(self):
+        super().reset()
+        self.reference = None
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+
+    def on_add(self, index, value):
+        if self.reference is None:
+            # Indexes are usually timestamps, using offsets avoids losing precision
+            self.reference = index
+
+        x = index - self.reference
+        self.sum_x += x
+        self.sum_y += value
+        self.sum_xx += x * x
+        self.sum_xy += x * value
+
+    def on_remove(self, index, value):
+        x = index - self.reference
+        self.sum_x -= x
+        self.sum_y -= value
+        self.sum_xx -= x * x
+        self.sum_xy -= x * value
+
+    @property
+    def slope(self):
+        denominator = self.count * self.sum_xx - self.sum_x**2
+        if self.count < 2 or denominator == 0:
+            return math.nan
+
+        return (self.count * self.sum_xy - self.sum_x * self.sum_y) / denominator
+
+    @property
+    def intercept(self):
+        if self.count < 2:
+            return math.nan
+
+        mean_x = self.sum_x / self.count
+        return self.sum_y / self.count - self.slope * (mean_x + self.reference)
+
+    @property
+    def value(self):
+        return self.slope
+
+
+class EWMA(Aggregator):
+    """
+    Exponentially weighted moving average. Values leaving the window do not change it
+    """
+
+    def __init__(self, mnemonic, alpha=None, span=None):
+        if alpha is None:
+            alpha = 2 / (span + 1) if span else 0.5
+
+        self.alpha = alpha
+        super().__init__(mnemonic)
+
+    def reset(self):
+        super().reset()
+        self.average = math.nan
+
+    def on_add(self, index, value):
+        if self.count == 1:
+            self.average = value
+        else:
+            self.average += self.alpha * (value - self.average)
+
+    def remove(self, index, value):
+        pass
+
+    @property
+    def value(self):
+        return self.average
+
+
+AGGREGATORS = {
+    "sum": Sum,
+    "mean": Mean,
+    "variance": Variance,
+    "min": Min,
+    "max": Max,
+    "linear_regression": LinearRegression,
+    "ewma": EWMA,
+}
+
+
+def build_statistics(statistics_settings):
+    """
+    Creates the aggregators declared on the monitor settings::
+
+      "statistics": {
+        "rop_mean": {"type": "mean", "mnemonic": "ROP"},
+        "rop_trend": {"type": "linear_regression", "mnemonic": "ROP"},
+        "rop_smooth": {"type": "ewma", "mnemonic": "ROP", "alpha": 0.1}
+      }
+    """
+    statistics = {}
+    for name, aggregator_settings in (statistics_settings or {}).items():
+        aggregator_settings = dict(aggregator_settings)
+        aggregator_type = aggregator_settings.pop("type")
+        if aggregator_type not in AGGREGATORS:
+            raise ValueError(
+                f"Invalid statistic type {aggregator_type}. Use one of {list(AGGREGATORS.keys())}"
+            )
+
+        statistics[name] = AGGREGATORS[aggregator_type](**aggregator_settings)
+
+    return statistics
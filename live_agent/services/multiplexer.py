@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+import os
+import queue
+import signal
+import socket
+import threading
+from multiprocessing import get_context as get_mp_context, current_process
+from multiprocessing.connection import Listener, arbitrary_address
+from typing import Any, Callable, Hashable, Mapping, Optional
+
+from setproctitle import setproctitle
+from live_client.events.constants import EVENT_TYPE_DESTROY, EVENT_TYPE_EVENT, EVENT_TYPE_SPAN
+from live_client.utils import logging
+
+from .connections import connect, set_timeout
+from .shared_queue import release_queue
+from .query import on_event, run as run_query, stop as stop_query
+
+__all__ = ["start_multiplexer", "get_multiplexer", "on_shared_event", "EventStream"]
+
+_multiplexer = None
+
+
+def subscription_key(statement: str, query_args: Mapping) -> Hashable:
+    """
+    Queries which differ only by whitespace (or by their timeouts) share the same subscription
+    """
+    shared_args = sorted((name, value) for name, value in query_args.items() if name != "timeout")
+    return (" ".join(statement.split()), tuple(shared_args))
+
+
+def get_event_type(event: Mapping) -> Optional[str]:
+    return event.get("data", {}).get("type")
+
+
+class Subscriber:
+    """
+    A process receiving the events of a subscription.
+
+    Events are sent from a queue by a dedicated thread, so a slow subscriber does not delay
+    the others. When the queue is full the oldest events are dropped.
+    Once closed, the pending events are sent and the connection is shut down, so the subscriber
+    sees the end of the stream even if the query finished without a DESTROY event.
+    """
+
+    def __init__(self, connection: Any, max_pending_events: int = 1000):
+        self.connection = connection
+        self.events = queue.Queue(max_pending_events)
+        self.dropped_events = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.send_forever, daemon=True)
+        self.thread.start()
+
+    def put(self, event: Mapping) -> None:
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped_events += 1
+                except queue.Empty:
+                    pass
+
+    def send_forever(self) -> None:
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+
+            try:
+                self.connection.send(event)
+            except (OSError, EOFError):
+                break
+
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        # Unlike closing the connection, this also wakes up the thread waiting on it
+        try:
+            with socket.socket(fileno=os.dup(self.connection.fileno())) as sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        self.closed = True
+        self.put(None)
+        if self.dropped_events:
+            logging.warn(f"{self.dropped_events} events dropped for a slow subscriber")
+
+
+class Subscription:
+    """
+    One upstream query, whose events are sent to all its subscribers
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.process = None
+        self.events_queue = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.closed = False
+
+    def start(self, process: Any, events_queue: Any) -> None:
+        with self.lock:
+            self.process = process
+            self.events_queue = events_queue
+            closed = self.closed
+
+        if closed:
+            # Every subscriber left while the query was starting
+            self.terminate_process()
+            self.release_events_queue()
+        else:
+            threading.Thread(target=self.forward_events, daemon=True).start()
+
+    def add(self, subscriber: Subscriber) -> None:
+        with self.lock:
+            self.subscribers.append(subscriber)
+
+    def remove(self, subscriber: Subscriber) -> bool:
+        """
+        Removes a subscriber. Returns whether there are subscribers left
+        """
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+            return bool(self.subscribers)
+
+    def forward_events(self, poll_interval: float = 1) -> None:
+        while not self.finished.is_set():
+            try:
+                event = self.events_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            except (OSError, EOFError, ValueError):
+                break
+
+            with self.lock:
+                subscribers = list(self.subscribers)
+
+            for subscriber in subscribers:
+                subscriber.put(event)
+
+            if get_event_type(event) == EVENT_TYPE_DESTROY:
+                break
+
+        self.close()
+
+        # Only after the loop, as this thread is the one reading the queue
+        self.release_events_queue()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+
+            self.closed = True
+            subscribers, self.subscribers = self.subscribers, []
+
+        self.finished.set()
+
+        for subscriber in subscribers:
+            subscriber.close()
+
+        self.terminate_process()
+
+    def terminate_process(self) -> None:
+        if hasattr(self.process, "terminate"):
+            self.process.terminate()
+            self.process.join()
+
+    def release_events_queue(self) -> None:
+        if hasattr(self.events_queue, "close"):
+            release_queue(self.events_queue)
+
+
+class Multiplexer:
+    """
+    Shares Live queries between processes.
+
+    Each process connects to the multiplexer and sends the statement it wants to run.
+    Identical queries are run only once, their events are sent to every process subscribed
+    to them and the query is stopped after the last subscriber disconnects.
+
+    The listening socket exists only inside the multiplexer process, so connections fail right
+    away once it dies, and connections not accepted in `connect_timeout` seconds fail as well.
+    A new multiplexer started by `start` listens on the same address.
+
+    `event_source` has the same interface as `live_agent.services.query.run`, returning
+    a process and a queue with the events, and may be replaced by a fake source.
+    """
+
+    def __init__(
+        self,
+        settings: Mapping,
+        event_source: Optional[Callable] = None,
+        max_pending_events: int = 1000,
+        connect_timeout: float = 10,
+    ):
+        self.settings = settings
+        self.event_source = event_source or run_query
+        self.max_pending_events = max_pending_events
+        self.connect_timeout = connect_timeout
+        self.authkey = current_process().authkey
+        self.address = arbitrary_address("AF_UNIX")
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+        self.process = None
+
+    def start(self) -> None:
+        mp = get_mp_context("fork")
+        ready_r, ready_w = mp.Pipe(duplex=False)
+        self.process = mp.Process(target=self.serve, args=(ready_w,), name="query multiplexer")
+        self.process.start()
+        ready_w.close()
+
+        with ready_r:
+            if not ready_r.poll(self.connect_timeout):
+                self.process.terminate()
+                raise OSError(f"Query multiplexer (pid={self.process.pid}) did not start")
+
+            ready_r.recv()
+
+        logging.info(f"Query multiplexer (pid={self.process.pid}) listening on {self.address}")
+
+    def connect(self) -> Any:
+        connection = connect(self.address, self.authkey, timeout=self.connect_timeout)
+
+        # Subscribers wait for events using `poll`, with their own timeouts
+        set_timeout(connection, None)
+        return connection
+
+    def serve(self, ready_w: Any) -> None:
+        setproctitle("DDA: Query multiplexer")
+        signal.signal(signal.SIGTERM, lambda *args: self.terminate_queries())
+
+        # Left behind by a previous multiplexer which was killed
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+        with Listener(self.address, family="AF_UNIX", authkey=self.authkey) as listener:
+            ready_w.send(True)
+            ready_w.close()
+
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    logging.error(f"Multiplexer: error accepting a connection, {e}<{type(e)}>")
+                    continue
+
+                threading.Thread(target=self.handle_client, args=(connection,), daemon=True).start()
+
+    def terminate_queries(self) -> None:
+        for subscription in list(self.subscriptions.values()):
+            subscription.close()
+
+        os._exit(0)
+
+    def handle_client(self, connection: Any) -> None:
+        with connection:
+            subscriber = Subscriber(connection, self.max_pending_events)
+            try:
+                statement, query_args, key = connection.recv()
+                subscription = self.subscribe(statement, query_args, key, subscriber)
+            except Exception as e:
+                logging.exception(f"Multiplexer: error handling a subscription, {e}<{type(e)}>")
+                subscriber.close()
+            else:
+                # The subscriber never sends anything else, this returns when it disconnects
+                # or when the subscription is closed
+                try:
+                    connection.recv()
+                except (OSError, EOFError):
+                    pass
+
+                self.unsubscribe(subscription, subscriber)
+
+            # The connection must stay open while the subscriber thread uses it
+            subscriber.thread.join()
+
+    def subscribe(
+        self, statement: str, query_args: Mapping, key: Hashable, subscriber: Subscriber
+    ) -> Subscription:
+        if key is None:
+            key = subscription_key(statement, query_args)
+
+        with self.lock:
+            subscription = self.subscriptions.get(key)
+            is_new = subscription is None or subscription.finished.is_set()
+            if is_new:
+                subscription = self.subscriptions[key] = Subscription(key)
+            else:
+                logging.debug(f"Multiplexer: sharing query '{statement}'")
+
+            subscription.add(subscriber)
+
+        if is_new:
+            # Starting the query may take a while, other subscriptions must not wait for it
+            logging.info(f"Multiplexer: starting query '{statement}'")
+            try:
+                process, events_queue = self.event_source(statement, self.settings, **query_args)
+            except Exception:
+                with self.lock:
+                    if self.subscriptions.get(key) is subscription:
+                        del self.subscriptions[key]
+
+                subscription.close()
+                raise
+
+            subscription.start(process, events_queue)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription, subscriber: Subscriber) -> None:
+        subscriber.close()
+        with self.lock:
+            if not subscription.remove(subscriber):
+                logging.info(f"Multiplexer: stopping query {subscription.key}")
+                if self.subscriptions.get(subscription.key) is subscription:
+                    del self.subscriptions[subscription.key]
+
+                subscription.close()
+
+
+def start_multiplexer(settings: Mapping, **kwargs) -> Optional[Multiplexer]:
+    global _multiplexer
+
+    _multiplexer = Multiplexer(settings, **kwargs)
+    try:
+        _multiplexer.start()
+    except (OSError, EOFError) as e:
+        logging.error(f"Error starting the query multiplexer, queries will not be shared. <{e}>")
+        _multiplexer = None
+
+    return _multiplexer
+
+
+def get_multiplexer() -> Optional[Multiplexer]:
+    return _multiplexer
+
+
+def connect_subscriber(
+    statement: str, query_args: Mapping, key: Optional[Hashable]
+) -> Optional[Any]:
+    """
+    Returns a connection receiving the events of the query, or None if the multiplexer
+    is not available
+    """
+    multiplexer = get_multiplexer()
+    if multiplexer is None:
+        return None
+
+    try:
+        connection = multiplexer.connect()
+    except (OSError, EOFError) as e:
+        logging.warn(f"Query multiplexer unavailable, running '{statement}' directly. <{e}>")
+        return None
+
+    try:
+        connection.send((statement, query_args, key))
+    except (OSError, EOFError) as e:
+        logging.warn(f"Query multiplexer unavailable, running '{statement}' directly. <{e}>")
+        connection.close()
+        return None
+
+    return connection
+
+
+def on_shared_event(
+    statement: str,
+    settings: Mapping,
+    realtime: bool = True,
+    timeout: Optional[float] = None,
+    key: Optional[Hashable] = None,
+    **query_args,
+) -> Callable:
+    """
+    Like `live_agent.services.query.on_event`, but shares realtime queries through the multiplexer.
+
+    Queries with the same `key` share the same subscription. By default, the key is built
+    from the statement and the query arguments.
+    Queries with a `span` are not shared, since a late subscriber would not receive the events
+    preloaded from the span. These, non-realtime queries and queries started when the multiplexer
+    is not available are run by `on_event`. So are the queries whose shared stream ends without
+    a DESTROY event, like when the upstream query fails or the multiplexer dies.
+    """
+    if get_multiplexer() is None or not realtime or query_args.get("span") is not None:
+        return on_event(statement, settings, realtime=realtime, timeout=timeout, **query_args)
+
+    shared_query_args = dict(query_args, realtime=realtime, timeout=timeout)
+
+    def handler_decorator(f):
+        def run_directly(*args, **kwargs):
+            handler = on_event(
+                statement, settings, realtime=realtime, timeout=timeout, **query_args
+            )
+            return handler(f)(*args, **kwargs)
+
+        def wrapper(*args, **kwargs):
+            last_result = None
+
+            connection = connect_subscriber(statement, shared_query_args, key)
+            if connection is None:
+                return run_directly(*args, **kwargs)
+
+            with connection:
+                while True:
+                    if not connection.poll(timeout):
+                        logging.exception(f"No results after {timeout} seconds")
+                        break
+
+                    try:
+                        event = connection.recv()
+                    except (OSError, EOFError) as e:
+                        logging.warn(f"Shared query lost, running '{statement}' directly. <{e}>")
+                        return run_directly(*args, **kwargs)
+
+                    event_type = get_event_type(event)
+                    if event_type == EVENT_TYPE_EVENT:
+                        last_result = f(event, *args, **kwargs)
+                    elif event_type == EVENT_TYPE_DESTROY:
+                        break
+                    elif event_type != EVENT_TYPE_SPAN:
+                        logging.info(f"Got event with type={event_type}")
+
+            return last_result
+
+        return wrapper
+
+    return handler_decorator
+
+
+class EventStream(object):
+    """
+    The events of a realtime query, shared through the multiplexer when it is running.
+    Unlike `on_shared_event`, the events are read with `get` and the query lasts until `close`.
+    """
+
+    def __init__(self, statement: str, settings: Mapping, **query_args):
+        self.connection = None
+        self.process = None
+        self.events_queue = None
+
+        if query_args.get("span") is None:
+            # The same arguments used by `on_shared_event`, so both share the subscription
+            shared_query_args = dict(query_args, realtime=True, timeout=None)
+            self.connection = connect_subscriber(statement, shared_query_args, None)
+
+        if self.connection is None:
+            self.process, self.events_queue = run_query(
+                statement, settings, realtime=True, **query_args
+            )
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Mapping]:
+        """
+        Returns the next event, or None when there are no events after `timeout` seconds.
+        Raises `EOFError` when a shared query finished without a DESTROY event
+        """
+        if self.connection is not None:
+            if not self.connection.poll(timeout):
+                return None
+
+            return self.connection.recv()
+
+        try:
+            return self.events_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+        else:
+            stop_query(self.process, self.events_queue)
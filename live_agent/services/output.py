@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+from live_client.connection import autodetect
+from live_client.events import raw
+from live_client.utils import logging
+from live_client.utils.timestamp import get_timestamp
+
+__all__ = ["EventBuffer"]
+
+number = Union[int, float]
+
+OVERFLOW_MODES = ("block", "drop")
+
+
+class EventBuffer(object):
+    """
+    Batches the events sent to Live.
+
+    Events are kept in memory and sent by a background thread as a single request,
+    once `max_events` events or `max_bytes` bytes are pending or when the oldest pending event
+    has waited for `max_latency` seconds.
+
+    At most `max_pending_bytes` are kept in memory. When this limit is reached `create` either
+    waits until the pending events are sent (`overflow="block"`) or drops the oldest pending
+    events (`overflow="drop"`).
+
+    Each event may carry a `checkpoint`, passed to `on_sent` once the batch with it was sent,
+    so the progress of a datasource is only saved for events which reached Live.
+
+    Call `close` before exiting to send the pending events. It is also registered with `atexit`,
+    but processes started by `multiprocessing` exit without running these handlers.
+    """
+
+    def __init__(
+        self,
+        live_settings: Mapping[str, Any],
+        max_events: int = 500,
+        max_bytes: int = 2**20,
+        max_latency: number = 1,
+        max_pending_bytes: int = 32 * 2**20,
+        overflow: str = "block",
+        stats_interval: number = 60,
+        sender: Optional[Callable[[List[Dict]], None]] = None,
+        on_sent: Optional[Callable[[Any], None]] = None,
+    ):
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError(f"Invalid overflow mode {overflow}. Use one of {OVERFLOW_MODES}")
+
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.max_pending_bytes = max_pending_bytes
+        self.overflow = overflow
+        self.stats_interval = stats_interval
+        self.sender = sender or autodetect.build_sender_function(live_settings)
+        self.on_sent = on_sent
+
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.sending = False
+        self.flush_requested = False
+        self.closed = False
+        self.condition = threading.Condition()
+        self.send_thread = None
+
+        self.started_at = time.monotonic()
+        self.stats = {
+            "events_received": 0,
+            "events_sent": 0,
+            "events_dropped": 0,
+            "batches_sent": 0,
+            "bytes_sent": 0,
+            "send_errors": 0,
+        }
+
+    def create(self, event_type: str, event_data: Dict[str, Any], checkpoint: Any = None) -> None:
+        """
+        Formats and enqueues an event, like `live_client.events.raw.create`
+        """
+        timestamp = event_data.pop("timestamp", get_timestamp())
+        self.put(raw.format_event(event_data, event_type, timestamp), checkpoint=checkpoint)
+
+    def put(self, event: Dict[str, Any], checkpoint: Any = None) -> None:
+        size = len(json.dumps(event))
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Cannot add events to a closed buffer")
+
+            self.maybe_start()
+            while self.pending and (self.pending_bytes + size > self.max_pending_bytes):
+                if self.overflow == "drop":
+                    _event, dropped_size, _added_at, _checkpoint = self.pending.popleft()
+                    self.pending_bytes -= dropped_size
+                    self.stats["events_dropped"] += 1
+                else:
+                    self.condition.wait()
+
+            self.pending.append((event, size, time.monotonic(), checkpoint))
+            self.pending_bytes += size
+            self.stats["events_received"] += 1
+
+            if len(self.pending) >= self.max_events or self.pending_bytes >= self.max_bytes:
+                self.condition.notify_all()
+
+    def maybe_start(self) -> None:
+        if self.send_thread is None:
+            self.send_thread = threading.Thread(target=self.send_forever, daemon=True)
+            self.send_thread.start()
+            atexit.register(self.close)
+
+    def flush(self, timeout: Optional[number] = None) -> bool:
+        """
+        Waits until all the pending events are sent. Returns `False` on timeout
+        """
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+            return self.condition.wait_for(
+                lambda: not (self.pending or self.sending), timeout=timeout
+            )
+
+    def close(self, timeout: Optional[number] = None) -> None:
+        """
+        Sends the pending events and stops the background thread
+        """
+        with self.condition:
+            if self.closed:
+                return
+
+            self.closed = True
+            self.condition.notify_all()
+
+        if self.send_thread is not None:
+            self.send_thread.join(timeout)
+
+        self.log_stats()
+
+    def next_batch(self) -> Optional[Tuple[List[Dict[str, Any]], int, Any]]:
+        with self.condition:
+            while True:
+                if self.pending:
+                    age = time.monotonic() - self.pending[0][2]
+                    is_full = (len(self.pending) >= self.max_events) or (
+                        self.pending_bytes >= self.max_bytes
+                    )
+                    if is_full or self.flush_requested or self.closed or age >= self.max_latency:
+                        return self.take_batch()
+
+                    timeout = self.max_latency - age
+                elif self.closed:
+                    return None
+                else:
+                    self.flush_requested = False
+                    timeout = None
+
+                self.condition.wait(timeout)
+
+    def take_batch(self) -> Tuple[List[Dict[str, Any]], int, Any]:
+        batch = []
+        batch_bytes = 0
+        batch_checkpoint = None
+        while self.pending and len(batch) < self.max_events:
+            event, size, _added_at, checkpoint = self.pending[0]
+            if batch and (batch_bytes + size > self.max_bytes):
+                break
+
+            self.pending.popleft()
+            batch.append(event)
+            batch_bytes += size
+            if checkpoint is not None:
+                batch_checkpoint = checkpoint
+
+        self.pending_bytes -= batch_bytes
+        self.sending = True
+        self.condition.notify_all()
+        return batch, batch_bytes, batch_checkpoint
+
+    def send_forever(self) -> None:
+        last_report = time.monotonic()
+
+        while True:
+            next_batch = self.next_batch()
+            if next_batch is None:
+                break
+
+            batch, batch_bytes, checkpoint = next_batch
+            try:
+                self.sender(batch)
+                self.stats["events_sent"] += len(batch)
+                self.stats["batches_sent"] += 1
+                self.stats["bytes_sent"] += batch_bytes
+            except Exception as e:
+                logging.error(f"Error sending {len(batch)} events, {e}<{type(e)}>")
+                self.stats["send_errors"] += 1
+                self.stats["events_dropped"] += len(batch)
+            else:
+                if checkpoint is not None and self.on_sent is not None:
+                    try:
+                        self.on_sent(checkpoint)
+                    except Exception as e:
+                        logging.error(f"Error saving checkpoint {checkpoint}, {e}<{type(e)}>")
+
+            with self.condition:
+                self.sending = False
+                self.condition.notify_all()
+
+            if time.monotonic() - last_report >= self.stats_interval:
+                self.log_stats()
+                last_report = time.monotonic()
+
+    def log_stats(self) -> None:
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        events_rate = self.stats["events_sent"] / elapsed
+        bytes_rate = self.stats["bytes_sent"] / elapsed / 1024
+
+        logging.info(
+            f"{self.stats['events_sent']} events sent in {self.stats['batches_sent']} batches "
+            f"({events_rate:.1f} events/s, {bytes_rate:.1f}KB/s), "
+            f"{self.stats['events_dropped']} dropped, {len(self.pending)} pending"
+        )
@@ -1,23 +1,34 @@
 # -*- coding: utf-8 -*-
 from typing import Mapping, Iterable, Callable, Optional, Any
 from multiprocessing import get_context as get_mp_context
+from multiprocessing.connection import wait
 from dataclasses import dataclass
-from time import sleep
+from functools import partial
+import signal
+import sys
+import time
 
 from eliot import Action, start_action
 from live_client.utils import logging
 
 from .importer import load_process_handlers
-from .state import StateManager
+from .state import StateManager, configure as configure_state
+from .zygote import start_zygote, get_zygote
+from .multiplexer import start_multiplexer
 
 __all__ = ["start", "agent_function"]
 
+RUNNING = float("inf")
+
 
 @dataclass
 class ProcessSpec:
     function: Callable
     settings: Mapping
     process: Any
+    started_at: float = 0
+    next_start: float = 0
+    failures: int = 0
 
 
 def filter_dict(source_dict: Mapping, filter_func: Callable) -> Mapping:
@@ -68,6 +79,23 @@ def start(global_settings: Mapping) -> Iterable:
         "Starting {} processes: {}".format(num_processes, ", ".join(processes_to_run.keys()))
     )
 
+    configure_state(**global_settings.get("state", {}))
+
+    # Started before the zygote, so every process knows its address
+    multiplexer_settings = dict(global_settings.get("multiplexer", {}))
+    if multiplexer_settings.pop("enabled", False):
+        multiplexer = start_multiplexer(
+            {"live": global_settings.get("live", {})}, **multiplexer_settings
+        )
+    else:
+        multiplexer = None
+
+    zygote_settings = dict(global_settings.get("zygote", {}))
+    if zygote_settings.pop("enabled", False):
+        zygote = start_zygote(**zygote_settings)
+    else:
+        zygote = None
+
     process_map = {}
     for name, settings in processes_to_run.items():
         process_func = settings.pop("process_func")
@@ -78,37 +106,157 @@ def start(global_settings: Mapping) -> Iterable:
             process=None,
         )
 
-    return monitor_processes(process_map)
-
-
-def monitor_processes(process_map: Mapping, heartbeat_interval: int = 60) -> Iterable:
-
-    while True:
-        for name, process_data in process_map.items():
-            process = process_data.process
-
-            if process and process.is_alive():
-                logging.info(f'Process for "{name}" (pid={process.pid}) is alive')
-
-            else:
-                if process:
-                    logging.info(f'Process for "{name}" (pid={process.pid}) has died. Restarting')
-                else:
-                    logging.info(f'Starting "{name}" using {process_data.function}')
-
-                process = process_data.function(process_data.settings)
-                try:
-                    process.start()
-                    logging.info(f'Process for "{name}" (pid={process.pid}) started')
-                except OSError as e:
-                    logging.exception(f"Error starting process {name} ({e})")
+    # The multiplexer is restarted when it dies, its address does not change
+    services = [multiplexer] if multiplexer is not None else []
+    running_processes = monitor_processes(
+        process_map, services=services, **global_settings.get("supervisor", {})
+    )
+    if zygote is not None:
+        running_processes.append(zygote.process)
+    if multiplexer is not None:
+        running_processes.append(multiplexer.process)
 
-            process_data.process = process
+    return running_processes
 
-        sleep(heartbeat_interval)
 
-    running_processes = [item["process"] for item in process_map.values()]
-    return running_processes
+def monitor_processes(
+    process_map: Mapping,
+    services: Iterable = (),
+    heartbeat_interval: int = 60,
+    min_backoff: float = 1,
+    max_backoff: float = 300,
+    max_failures: int = 10,
+    stable_interval: float = 600,
+) -> Iterable:
+    """
+    Keeps the processes from `process_map` running.
+
+    Instead of polling, the supervisor blocks on the sentinels of the running processes,
+    so a dead process is noticed (and restarted) as soon as it exits.
+    A process which dies is restarted right away. If it dies again before running for
+    `stable_interval` seconds it is restarted with an exponential backoff (starting at
+    `min_backoff`) and is abandoned after `max_failures` consecutive failures.
+
+    The processes of `services` (objects with a `process` and a `start` method) are restarted
+    right away when they die.
+    """
+    restart_policy = dict(
+        min_backoff=min_backoff,
+        max_backoff=max_backoff,
+        max_failures=max_failures,
+        stable_interval=stable_interval,
+    )
+    next_heartbeat = time.monotonic() + heartbeat_interval
+    services = list(services)
+
+    while process_map:
+        now = time.monotonic()
+        for name, process_data in list(process_map.items()):
+            if now >= process_data.next_start:
+                start_process(name, process_map, **restart_policy)
+
+        sentinels = dict(
+            (process_data.process.sentinel, name)
+            for name, process_data in process_map.items()
+            if process_data.next_start == RUNNING
+        )
+        service_sentinels = dict((service.process.sentinel, service) for service in services)
+        next_wakeup = min([next_heartbeat] + [item.next_start for item in process_map.values()])
+        timeout = max(next_wakeup - time.monotonic(), 0)
+
+        ready_sentinels = wait(list(sentinels.keys()) + list(service_sentinels.keys()), timeout)
+        for sentinel in ready_sentinels:
+            if sentinel in service_sentinels:
+                restart_service(service_sentinels[sentinel], services)
+                continue
+
+            name = sentinels[sentinel]
+            process = process_map[name].process
+            process.join()
+            logging.info(
+                f'Process for "{name}" (pid={process.pid}) has died (exitcode={process.exitcode})'
+            )
+            schedule_restart(name, process_map, **restart_policy)
+
+        if time.monotonic() >= next_heartbeat:
+            for name, process_data in process_map.items():
+                process = process_data.process
+                if process and process.is_alive():
+                    logging.info(f'Process for "{name}" (pid={process.pid}) is alive')
+
+            next_heartbeat = time.monotonic() + heartbeat_interval
+
+    logging.error("No processes left to monitor")
+    return []
+
+
+def restart_service(service: Any, services: Iterable) -> None:
+    process = service.process
+    process.join()
+    logging.warn(f'"{process.name}" (pid={process.pid}) has died (exitcode={process.exitcode})')
+
+    try:
+        service.start()
+    except (OSError, EOFError) as e:
+        logging.error(f'Error restarting "{process.name}", {e}<{type(e)}>')
+        services.remove(service)
+
+
+def start_process(name: str, process_map: Mapping, **restart_policy) -> None:
+    process_data = process_map[name]
+    if process_data.process:
+        logging.info(f'Restarting "{name}"')
+    else:
+        logging.info(f'Starting "{name}" using {process_data.function}')
+
+    process_data.started_at = time.monotonic()
+    process = process_data.function(process_data.settings)
+    if process is None:
+        # `agent_function` already logged why the process could not be created
+        logging.error(f'Cannot create the process for "{name}"')
+        schedule_restart(name, process_map, **restart_policy)
+        return
+
+    try:
+        process.start()
+        logging.info(f'Process for "{name}" (pid={process.pid}) started')
+    except OSError as e:
+        logging.exception(f"Error starting process {name} ({e})")
+        schedule_restart(name, process_map, **restart_policy)
+    else:
+        process_data.process = process
+        process_data.next_start = RUNNING
+
+
+def schedule_restart(
+    name: str,
+    process_map: Mapping,
+    min_backoff: float,
+    max_backoff: float,
+    max_failures: int,
+    stable_interval: float,
+) -> None:
+    process_data = process_map[name]
+    now = time.monotonic()
+    uptime = now - process_data.started_at
+
+    if uptime >= stable_interval:
+        process_data.failures = 0
+    else:
+        process_data.failures += 1
+
+    # The first failure is restarted right away, only consecutive failures back off
+    if process_data.failures <= 1:
+        backoff = 0
+    else:
+        backoff = min(min_backoff * 2 ** (process_data.failures - 2), max_backoff)
+
+    if process_data.failures > max_failures:
+        logging.error(f'"{name}" failed {process_data.failures} times in a row. Giving up')
+        process_map.pop(name)
+    else:
+        logging.info(f'"{name}" ran for {uptime:.1f}s. Restarting in {backoff:.1f}s')
+        process_data.next_start = now + backoff
 
 
 def agent_function(f: Callable, name: Optional[str] = None, with_state: bool = False) -> Callable:
@@ -117,35 +265,55 @@ def agent_function(f: Callable, name: Optional[str] = None, with_state: bool = F
     def wrapped(*args, **kwargs):
         try:
             f_in_action = inside_action(f, name=name, with_state=with_state)
-            return mp.Process(target=f_in_action, args=args, kwargs=kwargs)
+            return new_process(mp, f_in_action, args, kwargs)
         except Exception as e:
             logging.exception(f"Error during the execution of {f}: <{e}>")
 
     return wrapped
 
 
+def new_process(mp: Any, target: Callable, args: Iterable, kwargs: Mapping) -> Any:
+    zygote = get_zygote()
+    if zygote is not None:
+        try:
+            return zygote.Process(target=target, args=args, kwargs=kwargs)
+        except Exception as e:
+            logging.debug(f"Cannot start {target} using the zygote, forking instead. <{e}>")
+
+    return mp.Process(target=target, args=args, kwargs=kwargs)
+
+
 def inside_action(f: Callable, name: Optional[str] = None, with_state: bool = False) -> Callable:
     if name is None:
         name = f"{f.__module__}.{f.__name__}"
 
-    def wrapped(*args, **kwargs):
-        task_id = kwargs.get("task_id")
-        if task_id:
-            action = Action.continue_task(task_id=task_id)
-        else:
-            action = start_action(action_type=name)
-
-        with action.context():
-            task_id = action.serialize_task_id()
-            kwargs["task_id"] = task_id
-            if with_state:
-                kwargs["state_manager"] = StateManager(name)
+    # A partial can be sent to the zygote, unlike a closure
+    return partial(run_inside_action, f, name, with_state)
 
-            try:
-                return f(*args, **kwargs)
-            except Exception as e:
-                logging.exception(f"Error during the execution of {f}: <{e}>")
 
-        action.finish()
+def run_inside_action(f: Callable, name: str, with_state: bool, *args, **kwargs) -> Any:
+    task_id = kwargs.get("task_id")
+    if task_id:
+        action = Action.continue_task(task_id=task_id)
+    else:
+        action = start_action(action_type=name)
 
-    return wrapped
+    with action.context():
+        task_id = action.serialize_task_id()
+        kwargs["task_id"] = task_id
+        if with_state:
+            state_manager = StateManager(name)
+            kwargs["state_manager"] = state_manager
+
+            # Unwind the stack on SIGTERM, so the pending state is written
+            signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+        try:
+            return f(*args, **kwargs)
+        except Exception as e:
+            logging.exception(f"Error during the execution of {f}: <{e}>")
+        finally:
+            if with_state:
+                state_manager.flush()
+
+    action.finish()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import queue
+from multiprocessing import get_context as get_mp_context
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from eliot import start_action
+from live_client import query
+from live_client.events.constants import EVENT_TYPE_DESTROY, EVENT_TYPE_EVENT, EVENT_TYPE_SPAN
+from live_client.utils import logging
+
+from .shared_queue import create_queue, release_queue, shared_memory
+from .zygote import get_zygote
+
+__all__ = ["run", "on_event"]
+
+# The memory is only allocated as it is used, this limits the size of each message
+QUEUE_CAPACITY = 64 * 2**20
+
+
+def run(
+    statement: str, settings: Mapping, timeout: Optional[float] = None, **kwargs
+) -> Tuple[Any, Any]:
+    """
+    Like `live_client.query.run`, but may be called from any thread.
+
+    `live_client` forks the process which reads the results of the query. A process forked
+    while other threads are running may deadlock on a lock held by one of them (like the locks
+    used for logging), so the results are read by a process created by the zygote or,
+    when it is not available, by a new interpreter (`spawn`).
+    The results are sent on a `SharedMemoryQueue`, which both can receive by name.
+    """
+    if shared_memory is None:
+        return query.run(statement, settings, timeout=timeout, **kwargs)
+
+    with start_action(action_type="query.run", statement=statement):
+        channels = query.start(statement, settings, timeout=timeout, **kwargs)
+        logging.debug(f"Results channel is {channels}")
+
+        # The session is not shared with the other process
+        live_settings = dict(
+            (name, value) for name, value in settings["live"].items() if name != "session"
+        )
+        results_url = f"{live_settings['url']}/cometd"
+        events_queue = create_queue(capacity=QUEUE_CAPACITY)
+        args = (results_url, channels, events_queue, {"live": live_settings})
+
+        zygote = get_zygote()
+        if zygote is not None:
+            process = zygote.Process(target=watch, args=args, fallback_method="spawn")
+        else:
+            process = get_mp_context("spawn").Process(target=watch, args=args)
+
+        try:
+            process.start()
+        except Exception:
+            release_queue(events_queue)
+            raise
+
+    return process, events_queue
+
+
+def watch(url: str, channels: Any, events_queue: Any, settings: Mapping) -> None:
+    try:
+        query.watch(url, channels, events_queue, settings)
+    finally:
+        events_queue.close()
+
+
+def stop(process: Any, events_queue: Any) -> None:
+    """
+    Releases the resources of a query started by `run`
+    """
+    process.terminate()
+    process.join()
+    release_queue(events_queue)
+
+
+def on_event(
+    statement: str,
+    settings: Mapping,
+    realtime: bool = True,
+    timeout: Optional[float] = None,
+    **query_args,
+) -> Callable:
+    """
+    Like `live_client.query.on_event`, using `run`
+    """
+
+    def handler_decorator(f):
+        def wrapper(*args, **kwargs):
+            results_process, results_queue = run(
+                statement, settings, realtime=realtime, timeout=timeout, **query_args
+            )
+            last_result = None
+
+            try:
+                while True:
+                    try:
+                        event = results_queue.get(timeout=timeout)
+                    except queue.Empty:
+                        logging.exception(f"No results after {timeout} seconds")
+                        break
+                    except EOFError as e:
+                        logging.exception(f"Connection lost: {e}")
+                        break
+
+                    event_type = event.get("data", {}).get("type")
+                    if event_type == EVENT_TYPE_EVENT:
+                        last_result = f(event, *args, **kwargs)
+                    elif event_type == EVENT_TYPE_DESTROY:
+                        break
+                    elif event_type != EVENT_TYPE_SPAN:
+                        logging.info(f"Got event with type={event_type}")
+            finally:
+                # Release resources after the query ends
+                stop(results_process, results_queue)
+
+            return last_result
+
+        return wrapper
+
+    return handler_decorator
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import os
+import errno
+import queue
+import pickle
+import select
+import struct
+import tempfile
+import time
+from multiprocessing import get_context as get_mp_context
+from typing import Any, Mapping, Optional
+
+from live_client.utils import logging
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+__all__ = ["SharedMemoryQueue", "create_queue", "release_queue"]
+
+HEADER_FIELDS = 5  # head, tail, put_count, get_count, dropped_count
+HEADER_SIZE = 64
+LENGTH_FORMAT = "I"
+LENGTH_SIZE = struct.calcsize(LENGTH_FORMAT)
+WRAP_MARKER = 2**32 - 1
+DEFAULT_CAPACITY = 2**20
+MAX_BACKOFF = 0.01
+
+
+class SharedMemoryQueue:
+    """
+    A queue with a single producer and a single consumer, on a shared memory ring buffer.
+
+    Each item is pickled once, straight into the buffer, as a length-prefixed frame
+    and is unpickled by the consumer directly from the shared memory.
+    The consumer is woken up through a named pipe, so the queue can be passed to other processes
+    by name (including those created by the zygote), unlike a `multiprocessing.Queue`.
+
+    When the buffer is full `put` waits for the consumer (`overflow="block"`) or drops the item
+    (`overflow="drop"`). `stats` reports the items sent, received, dropped and pending.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, overflow: str = "block"):
+        if overflow not in ("block", "drop"):
+            raise ValueError(f"Invalid overflow mode {overflow}. Use 'block' or 'drop'")
+
+        self.capacity = capacity
+        self.overflow = overflow
+        self.memory = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity)
+        self.memory.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        self.doorbell_path = os.path.join(tempfile.gettempdir(), f"{self.memory.name}.doorbell")
+        os.mkfifo(self.doorbell_path)
+        self.owner_pid = os.getpid()
+        self.open_handles()
+
+    def __getstate__(self) -> Mapping:
+        return {
+            "name": self.memory.name,
+            "capacity": self.capacity,
+            "overflow": self.overflow,
+            "doorbell_path": self.doorbell_path,
+            "owner_pid": self.owner_pid,
+        }
+
+    def __setstate__(self, state: Mapping) -> None:
+        self.capacity = state["capacity"]
+        self.overflow = state["overflow"]
+        self.doorbell_path = state["doorbell_path"]
+        self.owner_pid = state["owner_pid"]
+        # Processes forked from the agent share its resource tracker, so attaching to the
+        # memory does not make it be removed when this process exits
+        self.memory = shared_memory.SharedMemory(name=state["name"])
+        self.open_handles()
+
+    def __del__(self) -> None:
+        # The memory is closed when it is collected, which fails while `counters` uses it.
+        # Happens to the copies which are only unpickled to be handed to another process
+        counters = getattr(self, "counters", None)
+        if counters is not None:
+            counters.release()
+
+    def open_handles(self) -> None:
+        # `struct.pack_into` zero-fills its target before packing, so the other process could
+        # read a counter as 0. Items assigned to a memoryview are stored with a single write
+        self.counters = self.memory.buf[:HEADER_SIZE].cast("Q")
+        self.reader_fd = None
+        self.writer_fd = None
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def read_header(self):
+        return self.counters.tolist()[:HEADER_FIELDS]
+
+    def write_counter(self, position: int, value: int) -> None:
+        self.counters[position] = value
+
+    @property
+    def stats(self) -> Mapping[str, int]:
+        head, tail, put_count, get_count, dropped_count = self.read_header()
+        return {
+            "sent": put_count,
+            "received": get_count,
+            "dropped": dropped_count,
+            "pending": put_count - get_count,
+            "pending_bytes": head - tail,
+        }
+
+    def qsize(self) -> int:
+        return self.stats["pending"]
+
+    def empty(self) -> bool:
+        head, tail, *_counters = self.read_header()
+        return head == tail
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None) -> None:
+        payload = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        frame_size = LENGTH_SIZE + len(payload)
+        if frame_size > self.capacity // 2:
+            # Larger frames might never fit, depending on where the buffer wraps
+            raise ValueError(f"Item too large ({frame_size} bytes) for the queue")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = 0.0001
+        while True:
+            head, tail, put_count, _get_count, dropped_count = self.read_header()
+            offset = head % self.capacity
+            padding = self.capacity - offset if offset + frame_size > self.capacity else 0
+            if self.capacity - (head - tail) >= padding + frame_size:
+                break
+
+            if self.overflow == "drop":
+                self.write_counter(4, dropped_count + 1)
+                return
+
+            if not block or (deadline is not None and time.monotonic() >= deadline):
+                raise queue.Full
+
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+        buffer = self.memory.buf
+        if padding:
+            if padding >= LENGTH_SIZE:
+                struct.pack_into(LENGTH_FORMAT, buffer, HEADER_SIZE + offset, WRAP_MARKER)
+            offset = 0
+
+        start = HEADER_SIZE + offset
+        struct.pack_into(LENGTH_FORMAT, buffer, start, len(payload))
+        buffer[start + LENGTH_SIZE : start + frame_size] = payload
+
+        # The frame must be complete before the consumer can see it
+        self.write_counter(0, head + padding + frame_size)
+        self.write_counter(2, put_count + 1)
+        self.ring_doorbell()
+
+    def put_nowait(self, item: Any) -> None:
+        return self.put(item, block=False)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            item_found, item = self.read_frame()
+            if item_found:
+                return item
+
+            if not block:
+                raise queue.Empty
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+
+            self.wait_doorbell(remaining)
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def read_frame(self):
+        buffer = self.memory.buf
+        head, tail, _put_count, get_count, _dropped_count = self.read_header()
+
+        while head != tail:
+            offset = tail % self.capacity
+            remaining = self.capacity - offset
+            if remaining < LENGTH_SIZE:
+                tail += remaining
+                continue
+
+            (length,) = struct.unpack_from(LENGTH_FORMAT, buffer, HEADER_SIZE + offset)
+            if length == WRAP_MARKER:
+                tail += remaining
+                continue
+
+            start = HEADER_SIZE + offset + LENGTH_SIZE
+            item = pickle.loads(buffer[start : start + length])
+
+            self.write_counter(1, tail + LENGTH_SIZE + length)
+            self.write_counter(3, get_count + 1)
+            return True, item
+
+        self.write_counter(1, tail)
+        return False, None
+
+    def ring_doorbell(self) -> None:
+        if self.writer_fd is None:
+            try:
+                self.writer_fd = os.open(self.doorbell_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno in (errno.ENXIO, errno.ENOENT):
+                    # Nobody is waiting yet
+                    return
+                raise
+
+        try:
+            os.write(self.writer_fd, b"\0")
+        except BlockingIOError:
+            # The consumer was already woken up
+            pass
+        except BrokenPipeError:
+            os.close(self.writer_fd)
+            self.writer_fd = None
+
+    def wait_doorbell(self, timeout: Optional[float]) -> None:
+        if self.reader_fd is None:
+            self.reader_fd = os.open(self.doorbell_path, os.O_RDWR | os.O_NONBLOCK)
+            # Items sent before the pipe was opened did not ring
+            return
+
+        readable, _, _ = select.select([self.reader_fd], [], [], timeout)
+        if readable:
+            try:
+                os.read(self.reader_fd, 4096)
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        for fd in (self.reader_fd, self.writer_fd):
+            if fd is not None:
+                os.close(fd)
+
+        self.counters.release()
+        self.reader_fd = None
+        self.writer_fd = None
+        self.memory.close()
+
+    def unlink(self) -> None:
+        """
+        Removes the queue. Should be called once, by the process which created it
+        """
+        stats = self.stats
+        if stats["dropped"]:
+            logging.warn(f"Queue {self.name}: {stats['dropped']} items dropped")
+
+        self.close()
+        if os.getpid() == self.owner_pid:
+            self.memory.unlink()
+            try:
+                os.remove(self.doorbell_path)
+            except FileNotFoundError:
+                pass
+
+
+def create_queue(**kwargs) -> Any:
+    """
+    Creates a `SharedMemoryQueue`, or a `multiprocessing.Queue` when shared memory is not available
+    """
+    if shared_memory is None:
+        return get_mp_context("fork").Queue()
+
+    return SharedMemoryQueue(**kwargs)
+
+
+def release_queue(events_queue: Any) -> None:
+    """
+    Releases a queue created by `create_queue`
+    """
+    if isinstance(events_queue, SharedMemoryQueue):
+        events_queue.unlink()
+    else:
+        events_queue.close()
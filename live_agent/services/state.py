@@ -1,45 +1,256 @@
 # -*- coding: utf-8 -*-
+import os
 import time
+import atexit
+import sqlite3
+import threading
 from hashlib import md5
-from typing import Mapping, Dict, Union, AnyStr, Any
+from typing import Mapping, Dict, Union, AnyStr, Any, Optional
 
 import dill
 from live_client.utils import logging
 
-__all__ = ["StateManager"]
+__all__ = ["StateManager", "configure"]
 
 number = Union[int, float]
 
 TIMESTAMP_KEY = "__timestamp"
+DEFAULT_BACKEND = "dill"
+DEFAULT_DIRECTORY = "/tmp"
+
+backend_settings = {"backend": DEFAULT_BACKEND, "directory": DEFAULT_DIRECTORY}
+manager_settings = {"write_behind": True, "max_pending_updates": 100}
+
+
+class StateBackend(object):
+    """Base class for the storages used by `StateManager`"""
+
+    extension = "live_agent"
+
+    def __init__(self, identifier: str, name: str, directory: str = DEFAULT_DIRECTORY, **kwargs):
+        self.identifier = identifier
+        self.filename = f"{directory}/{identifier}.{name}.{self.extension}"
+
+    def load(self) -> Dict[str, Any]:
+        raise NotImplementedError("State backends must define a load method")
+
+    def save(self, state: Mapping[str, Any]) -> None:
+        raise NotImplementedError("State backends must define a save method")
+
+    def close(self) -> None:
+        pass
+
+
+class DillFileBackend(StateBackend):
+    """
+    Stores the whole state as a single `dill` file.
+
+    The file is replaced atomically, so a crash during a write keeps the previous state intact.
+    """
+
+    def load(self) -> Dict[str, Any]:
+        try:
+            with open(self.filename, r"r+b") as f:
+                state = dill.load(f)
+        except FileNotFoundError:
+            state = {}
+        except Exception as e:
+            logging.error(f"Error reading the state from {self.filename}, {e}<{type(e)}>")
+            state = {}
+
+        return state
+
+    def save(self, state: Mapping[str, Any]) -> None:
+        temp_filename = f"{self.filename}.{os.getpid()}.tmp"
+
+        with open(temp_filename, r"w+b") as f:
+            dill.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_filename, self.filename)
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Stores each key of the state as a row of a SQLite database in WAL mode.
+
+    Only the keys whose values changed since the last write are updated and each write is a
+    single transaction. The WAL file is checkpointed by a background thread.
+    """
+
+    extension = "live_agent.sqlite3"
+
+    def __init__(self, identifier: str, name: str, compaction_interval: number = 300, **kwargs):
+        super().__init__(identifier, name, **kwargs)
+        self.legacy_backend = DillFileBackend(identifier, name, **kwargs)
+        self.compaction_interval = compaction_interval
+        self.compaction_thread = None
+        self.closed = threading.Event()
+        self.digests = {}
+
+        self.connection = self.connect()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+        )
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def load(self) -> Dict[str, Any]:
+        state = {}
+        self.digests = {}
+
+        for key, value in self.connection.execute("SELECT key, value FROM state"):
+            try:
+                state[key] = dill.loads(value)
+                self.digests[key] = md5(value).hexdigest()
+            except Exception as e:
+                logging.error(f"Error reading key {key} from {self.filename}, {e}<{type(e)}>")
+
+        if not state and os.path.exists(self.legacy_backend.filename):
+            logging.info(f"Importing the state from {self.legacy_backend.filename}")
+            state = self.legacy_backend.load()
+
+        return state
+
+    def save(self, state: Mapping[str, Any]) -> None:
+        changed_items = []
+        digests = {}
+        for key, value in state.items():
+            data = dill.dumps(value)
+            digests[key] = md5(data).hexdigest()
+            if digests[key] != self.digests.get(key):
+                changed_items.append((key, data))
+
+        removed_keys = [(key,) for key in self.digests if key not in digests]
+
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", changed_items
+            )
+            self.connection.executemany("DELETE FROM state WHERE key = ?", removed_keys)
+
+        self.digests = digests
+        self.maybe_start_compaction()
+
+    def maybe_start_compaction(self) -> None:
+        if self.compaction_thread is None:
+            self.compaction_thread = threading.Thread(target=self.compact_forever, daemon=True)
+            self.compaction_thread.start()
+
+    def compact_forever(self) -> None:
+        connection = self.connect()
+        while not self.closed.wait(timeout=self.compaction_interval):
+            try:
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logging.warn(f"Error compacting {self.filename}, {e}<{type(e)}>")
+
+        connection.close()
+
+    def close(self) -> None:
+        self.closed.set()
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+
+        self.connection.close()
+
+
+BACKENDS = {"dill": DillFileBackend, "sqlite": SQLiteBackend}
+
+
+def configure(
+    backend: str = DEFAULT_BACKEND,
+    directory: str = DEFAULT_DIRECTORY,
+    write_behind: bool = True,
+    max_pending_updates: int = 100,
+    **kwargs,
+) -> None:
+    """
+    Defines the settings used by the `StateManager`s created from now on.
+
+    Should be called before the processes are started, so they inherit these settings.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid state backend {backend}. Use one of {list(BACKENDS.keys())}")
+
+    backend_settings.clear()
+    backend_settings.update(backend=backend, directory=directory, **kwargs)
+    manager_settings.update(write_behind=write_behind, max_pending_updates=max_pending_updates)
 
 
 class StateManager(object):
-    def __init__(self, name: AnyStr, delay_between_updates: number = 60):
+    """
+    Loads and saves the state for a process.
+
+    On write-behind mode `save` only keeps the latest state in memory. A background thread
+    writes it to the backend every `delay_between_updates` seconds, or sooner when
+    `max_pending_updates` saves were coalesced. The pending state is also written on `flush`,
+    which is called at exit. A process killed with `SIGKILL` loses the updates saved since
+    the last write, up to `delay_between_updates` seconds of progress.
+
+    The state is not copied on `save`, so values changed in place afterwards are written with
+    their latest contents. A write which fails because a value changed while it was being
+    serialized is retried on the next flush.
+
+    Managers which are discarded before the process exits must be closed, stopping the
+    background thread and releasing the backend.
+    """
+
+    def __init__(
+        self,
+        name: AnyStr,
+        delay_between_updates: number = 60,
+        backend: Optional[str] = None,
+        write_behind: Optional[bool] = None,
+        max_pending_updates: Optional[int] = None,
+    ):
         self.name = name
         self.delay_between_updates = delay_between_updates
         self.updated_at = 0
 
+        if write_behind is None:
+            write_behind = manager_settings["write_behind"]
+        if max_pending_updates is None:
+            max_pending_updates = manager_settings["max_pending_updates"]
+
+        self.write_behind = write_behind
+        self.max_pending_updates = max_pending_updates
+        self.pending_state = None
+        self.pending_updates = 0
+        self.pending_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_requested = threading.Event()
+        self.flush_thread = None
+        self.closed = threading.Event()
+
         if isinstance(name, str):
             name = bytes(name, "utf-8")
 
         self.identifier = md5(name).hexdigest()
-        self.filename = f"/tmp/{self.identifier}.{name.decode('utf-8')}.live_agent"
 
-    def load(self) -> Dict[str, Any]:
-        state_filename = self.filename
-
-        try:
-            with open(state_filename, r"r+b") as f:
-                state = dill.load(f)
-        except Exception:
-            state = {}
+        backend_options = backend_settings.copy()
+        default_backend = backend_options.pop("backend")
+        backend_class = BACKENDS[backend or default_backend]
+        self.backend = backend_class(self.identifier, name.decode("utf-8"), **backend_options)
+        self.filename = self.backend.filename
 
+    def load(self) -> Dict[str, Any]:
+        state = self.backend.load()
         self.updated_at = state.get(TIMESTAMP_KEY, self.updated_at)
 
         logging.info(f"State for {self.identifier} ({len(state)} keys) loaded")
         return state
 
     def save(self, state: Mapping[str, Any], force: bool = False) -> None:
+        if self.write_behind:
+            return self.save_later(state)
+
         now = time.time()
         next_possible_update = self.updated_at + self.delay_between_updates
         time_until_update = next_possible_update - now
@@ -51,12 +262,73 @@ class StateManager(object):
 
         return
 
-    def do_save(self, state: Mapping[str, Any], timestamp: number) -> None:
-        state_filename = self.filename
-        state.update(TIMESTAMP_KEY=timestamp)
+    def save_later(self, state: Mapping[str, Any]) -> None:
+        # A shallow snapshot, the values are serialized only when the state is written
+        state = dict(state)
 
-        with open(state_filename, r"w+b") as f:
-            dill.dump(state, f)
+        with self.pending_lock:
+            self.pending_state = state
+            self.pending_updates += 1
+            pending_updates = self.pending_updates
+
+        if self.flush_thread is None:
+            self.flush_thread = threading.Thread(target=self.flush_periodically, daemon=True)
+            self.flush_thread.start()
+            atexit.register(self.flush)
+
+        if pending_updates >= self.max_pending_updates:
+            self.flush_requested.set()
+
+    def flush_periodically(self) -> None:
+        while not self.closed.is_set():
+            self.flush_requested.wait(timeout=self.delay_between_updates)
+            self.flush_requested.clear()
+            self.flush()
+
+    def close(self) -> None:
+        """
+        Writes the pending state and releases the resources used by this manager
+        """
+        self.closed.set()
+        if self.flush_thread is not None:
+            self.flush_requested.set()
+            self.flush_thread.join()
+            atexit.unregister(self.flush)
+
+        self.flush()
+        self.backend.close()
+
+    def flush(self) -> None:
+        """
+        Writes the pending state, if any. On failure the state is kept pending
+        """
+        with self.flush_lock:
+            with self.pending_lock:
+                state = self.pending_state
+                pending_updates = self.pending_updates
+                self.pending_state = None
+                self.pending_updates = 0
+
+            if state is None:
+                return
+
+            try:
+                self.do_save(state, timestamp=time.time())
+                logging.debug(f"{pending_updates} updates for {self.identifier} coalesced")
+            except Exception as e:
+                logging.error(f"Error saving state for {self.identifier}, {e}<{type(e)}>")
+
+                # Kept for the next flush, unless a newer state was saved in the meantime
+                with self.pending_lock:
+                    if self.pending_state is None:
+                        self.pending_state = state
+
+                    self.pending_updates += pending_updates
+
+    def do_save(self, state: Mapping[str, Any], timestamp: number) -> None:
+        state = dict(state)
+        state[TIMESTAMP_KEY] = timestamp
+        self.backend.save(state)
 
         self.updated_at = timestamp
         logging.debug(f"State for {self.identifier} saved")
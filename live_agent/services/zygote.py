@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+import struct
+from multiprocessing import get_context as get_mp_context, current_process, reduction
+from multiprocessing.connection import Listener, wait
+from typing import Iterable, Mapping, Callable, Optional, Any
+
+from setproctitle import setproctitle
+from live_client.utils import logging
+
+from .connections import connect
+from .importer import log_and_import
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError:  # Python < 3.8
+    resource_tracker = None
+
+__all__ = ["start_zygote", "get_zygote", "active_children"]
+
+STATUS_FORMAT = "i"
+STATUS_SIZE = struct.calcsize(STATUS_FORMAT)
+
+_zygote = None
+_zygote_children = {}
+
+
+class Zygote:
+    """
+    A preforked process which creates new processes on request.
+
+    The zygote is forked from the main process after all the process handlers were imported,
+    so the processes it creates start with every module already loaded and share its memory
+    pages through copy-on-write.
+
+    The listening socket exists only inside the zygote, so requests fail right away once it dies.
+    Requests which are not answered in `timeout` seconds fail as well. When the zygote died,
+    the process which started it starts a new one on the next request.
+    """
+
+    def __init__(self, preload: Iterable[str] = (), timeout: float = 30):
+        self.preload = list(preload)
+        self.timeout = timeout
+        self.authkey = current_process().authkey
+        self.address = None
+        self.process = None
+        self.owner_pid = None
+
+    def start(self) -> None:
+        if resource_tracker is not None:
+            # The processes created by the zygote must share the resource tracker of the agent,
+            # otherwise shared memory they attach to is removed when they exit
+            resource_tracker.ensure_running()
+
+        mp = get_mp_context("fork")
+        address_r, address_w = mp.Pipe(duplex=False)
+        self.process = mp.Process(target=serve, args=(self, address_w), name="zygote")
+        self.process.start()
+        self.owner_pid = os.getpid()
+        address_w.close()
+
+        with address_r:
+            if not address_r.poll(self.timeout):
+                self.process.terminate()
+                raise OSError(f"Zygote (pid={self.process.pid}) did not start")
+
+            self.address = address_r.recv()
+
+        logging.info(f"Zygote (pid={self.process.pid}) listening on {self.address}")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def spawn(self, payload: bytes):
+        if os.getpid() == self.owner_pid and not self.is_alive():
+            logging.warn(f"Zygote (pid={self.process.pid}) died, starting a new one")
+            self.start()
+
+        with connect(self.address, self.authkey, timeout=self.timeout) as connection:
+            connection.send_bytes(payload)
+            pid, error = connection.recv()
+            if error is not None:
+                raise OSError(f"Zygote could not start the process: {error}")
+
+            sentinel = reduction.recv_handle(connection)
+
+        return pid, sentinel
+
+    def Process(
+        self,
+        target: Callable,
+        args: Iterable = (),
+        kwargs: Optional[Mapping] = None,
+        fallback_method: str = "fork",
+    ):
+        return ZygoteProcess(
+            self, target, args=args, kwargs=kwargs, fallback_method=fallback_method
+        )
+
+
+class ZygoteProcess:
+    """
+    Handle for a process created by the zygote.
+
+    Mimics the subset of `multiprocessing.Process` used by `live-agent`.
+    The `sentinel` becomes readable once the process exits, or when the zygote dies.
+    In the latter case the exit status is lost, so the process is killed and reported as such.
+    When the zygote is unavailable, the process is started by `multiprocessing` instead,
+    using `fallback_method`.
+    """
+
+    def __init__(
+        self,
+        zygote: Zygote,
+        target: Callable,
+        args: Iterable = (),
+        kwargs=None,
+        fallback_method: str = "fork",
+    ):
+        self.zygote = zygote
+        self.target = target
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.fallback_method = fallback_method
+        self.name = None
+        self.pid = None
+        self.sentinel = None
+        self.exitcode = None
+        self.fallback = None
+
+        # Fails early when the arguments can only be shared through inheritance
+        self.payload = reduction.ForkingPickler.dumps((target, self.args, self.kwargs))
+
+    def start(self) -> None:
+        try:
+            self.pid, self.sentinel = self.zygote.spawn(self.payload)
+        except (OSError, EOFError) as e:
+            logging.warn(
+                f"Cannot start {self.target} using the zygote, "
+                f"using {self.fallback_method} instead. <{e}>"
+            )
+            mp = get_mp_context(self.fallback_method)
+            self.fallback = mp.Process(target=self.target, args=self.args, kwargs=self.kwargs)
+            self.fallback.start()
+            self.pid, self.sentinel = self.fallback.pid, self.fallback.sentinel
+        else:
+            _zygote_children[self.pid] = self
+
+    def is_alive(self) -> bool:
+        if self.pid is None:
+            return False
+
+        self._poll(timeout=0)
+        return self.exitcode is None
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self.pid is not None:
+            self._poll(timeout=timeout)
+
+    def terminate(self) -> None:
+        if self.is_alive():
+            os.kill(self.pid, signal.SIGTERM)
+
+    def _poll(self, timeout: Optional[float] = None) -> None:
+        if self.exitcode is not None:
+            return
+
+        if self.fallback is not None:
+            self.fallback.join(timeout)
+            self.exitcode = self.fallback.exitcode
+            return
+
+        if wait([self.sentinel], timeout=timeout):
+            data = os.read(self.sentinel, STATUS_SIZE)
+            if len(data) == STATUS_SIZE:
+                (self.exitcode,) = struct.unpack(STATUS_FORMAT, data)
+            else:
+                # Reporting the process as dead while it runs would start a second copy of it
+                logging.error(f"Zygote died, the status of pid {self.pid} is unknown. Killing it")
+                kill_orphan(self.pid)
+                self.exitcode = -signal.SIGKILL
+
+            os.close(self.sentinel)
+            _zygote_children.pop(self.pid, None)
+
+
+def kill_orphan(pid: int) -> None:
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def serve(zygote: Zygote, address_w: Any) -> None:
+    setproctitle("DDA: Zygote")
+    mp = get_mp_context("fork")
+
+    for name in zygote.preload:
+        log_and_import(name)
+
+    children = {}
+    reap = lambda *args: reap_children(children)  # NOQA
+    signal.signal(signal.SIGCHLD, reap)
+    signal.signal(signal.SIGTERM, lambda *args: terminate_children(children))
+
+    with Listener(family="AF_UNIX", authkey=zygote.authkey) as listener:
+        address_w.send(listener.address)
+        address_w.close()
+
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                logging.error(f"Zygote: error accepting a connection, {e}<{type(e)}>")
+                continue
+
+            with connection:
+                signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGCHLD])
+                try:
+                    fork_child(mp, listener, connection, children)
+                    reap_children(children)
+                except Exception as e:
+                    logging.exception(f"Zygote: error starting a process, {e}<{type(e)}>")
+                finally:
+                    signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+
+
+def fork_child(mp: Any, listener: Any, connection: Any, children: Mapping) -> None:
+    try:
+        target, args, kwargs = reduction.ForkingPickler.loads(connection.recv_bytes())
+    except Exception as e:
+        connection.send((None, str(e)))
+        raise
+
+    status_r, status_w = os.pipe()
+    inherited_fds = [status_r, status_w] + [fd for (_process, fd) in children.values()]
+    process = mp.Process(
+        target=run_child, args=(target, args, kwargs, inherited_fds, [listener, connection])
+    )
+    process.start()
+
+    children[process.pid] = (process, status_w)
+    connection.send((process.pid, None))
+    reduction.send_handle(connection, status_r, None)
+    os.close(status_r)
+
+
+def run_child(
+    target: Callable,
+    args: Iterable,
+    kwargs: Mapping,
+    inherited_fds: Iterable,
+    inherited_connections: Iterable,
+) -> Any:
+    # The child is forked while the zygote blocks SIGCHLD, and inherits its mask and handlers
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, [signal.SIGCHLD])
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for fd in inherited_fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+    # Otherwise the zygote socket would accept connections after the zygote dies.
+    # Closing the listener here does not remove its address, which belongs to the zygote
+    for connection in inherited_connections:
+        connection.close()
+
+    return target(*args, **kwargs)
+
+
+def reap_children(children: Mapping) -> None:
+    for pid, (process, status_w) in list(children.items()):
+        if not process.is_alive():
+            try:
+                os.write(status_w, struct.pack(STATUS_FORMAT, process.exitcode))
+            finally:
+                os.close(status_w)
+                children.pop(pid)
+
+
+def terminate_children(children: Mapping) -> None:
+    for process, _status_w in list(children.values()):
+        process.terminate()
+
+    os._exit(0)
+
+
+def start_zygote(preload: Iterable[str] = (), **kwargs) -> Optional[Zygote]:
+    global _zygote
+
+    _zygote = Zygote(preload, **kwargs)
+    try:
+        _zygote.start()
+    except (OSError, EOFError) as e:
+        logging.error(f"Error starting the zygote, processes will be forked instead. <{e}>")
+        _zygote = None
+
+    return _zygote
+
+
+def get_zygote() -> Optional[Zygote]:
+    return _zygote
+
+
+def active_children() -> Iterable:
+    """
+    List the running processes started by this process, including those created by the zygote
+    """
+    mp = get_mp_context("fork")
+    zygote_process = _zygote and _zygote.process
+    children = [item for item in mp.active_children() if item is not zygote_process]
+    children.extend(item for item in list(_zygote_children.values()) if item.is_alive())
+    return children
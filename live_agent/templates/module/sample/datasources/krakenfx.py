@@ -3,14 +3,16 @@ from setproctitle import setproctitle
 import asyncio
 import queue
 import json
-from multiprocessing import Process, Queue
+from multiprocessing import Process
 
 import websockets
 from eliot import start_action
 
-from live_client.events import raw
 from live_client.utils import logging
 
+from live_agent.services.output import EventBuffer
+from live_agent.services.shared_queue import create_queue, release_queue
+
 __all__ = ["start"]
 
 
@@ -39,7 +41,7 @@ def get_trades(url, pairs):
     We use a new process to consume the kraken api
     The goal is to isolate the `asyncio` code from the rest of the program
     """
-    results_queue = Queue()
+    results_queue = create_queue()
     process = Process(target=watch, args=(url, pairs, results_queue))
     process.start()
     return process, results_queue
@@ -61,6 +63,7 @@ def start(settings, **kwargs):
     # Output settings
     event_type = settings.get("output", {}).get("event_type", "dda_crypto_trades")
     skipstorage = settings.get("output", {}).get("skipstorage", True)
+    buffer_settings = settings.get("output", {}).get("buffer", {})
 
     state_manager = kwargs.get("state_manager")
     state = state_manager.load()
@@ -69,54 +72,60 @@ def start(settings, **kwargs):
     # A separate process is used to fetch data from kraken
     kraken_process, results_queue = get_trades(krakenfx_url, pairs)
 
-    # Handle the events received from kraken
-    while True:
-        try:
-            trade_data = json.loads(results_queue.get(timeout=timeout))
-        except queue.Empty:
-            logging.exception(f"No results after {timeout} seconds")
-            break
-
-        # We are only interested in trade events
-        is_trade = isinstance(trade_data, list) and len(trade_data) == 4
-        if is_trade:
-            # Prepare an event
-            channel_id, operation_data, operation_type, pair = trade_data
-            operations = [
-                {
-                    "price": item[0],
-                    "volume": item[1],
-                    "time": item[2],
-                    "side": item[3],
-                    "orderType": item[4],
-                    "misc": item[5],
+    # The events are sent to live in batches
+    event_buffer = EventBuffer(settings["live"], **buffer_settings)
+
+    try:
+        # Handle the events received from kraken
+        while True:
+            try:
+                trade_data = json.loads(results_queue.get(timeout=timeout))
+            except queue.Empty:
+                logging.exception(f"No results after {timeout} seconds")
+                break
+
+            # We are only interested in trade events
+            is_trade = isinstance(trade_data, list) and len(trade_data) == 4
+            if is_trade:
+                # Prepare an event
+                channel_id, operation_data, operation_type, pair = trade_data
+                operations = [
+                    {
+                        "price": item[0],
+                        "volume": item[1],
+                        "time": item[2],
+                        "side": item[3],
+                        "orderType": item[4],
+                        "misc": item[5],
+                    }
+                    for item in operation_data
+                ]
+
+                trade_event = {
+                    "channel_id": channel_id,
+                    "operations": operations,
+                    "operation_type": operation_type,
+                    "pair": pair,
+                    "__skipstorage": skipstorage,
                 }
-                for item in operation_data
-            ]
-
-            trade_event = {
-                "channel_id": channel_id,
-                "operations": operations,
-                "operation_type": operation_type,
-                "pair": pair,
-                "__skipstorage": skipstorage,
-            }
-
-            # And send to live
-            raw.create(event_type, trade_event, settings)
-
-            # Update this datasource's state with the last trade for each pair
-            # This might be useful if you needed to restore this state
-            # when the datasource is restarted
-            last_trades.update(pair=trade_event)
-            state_manager.save({"last_trades": last_trades})
-
-        else:
-            logging.debug(f"Ignoring event {trade_data}")
-            continue
-
-    # Release resources on exit
-    results_queue.close()
-    kraken_process.terminate()
-    kraken_process.join()
+
+                # And send to live
+                event_buffer.create(event_type, trade_event)
+
+                # Update this datasource's state with the last trade for each pair
+                # This might be useful if you needed to restore this state
+                # when the datasource is restarted
+                last_trades.update(pair=trade_event)
+                state_manager.save({"last_trades": last_trades})
+
+            else:
+                logging.debug(f"Ignoring event {trade_data}")
+                continue
+    finally:
+        # Release resources on exit. `atexit` handlers are not run on the agent processes
+        event_buffer.close()
+        kraken_process.terminate()
+        kraken_process.join()
+        release_queue(results_queue)
+
     return
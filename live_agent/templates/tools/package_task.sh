@@ -55,6 +55,13 @@ assert_ok $?
 ${VIRTUALENV_PATH}/bin/pip install -r ${PROJECT_ROOT}/requirements.txt -c ${PROJECT_ROOT}/constraints.txt
 assert_ok $?
 
+# Bundle the NLTK resources used by the chatbot, so they are not downloaded at runtime
+if ${VIRTUALENV_PATH}/bin/python -c "import nltk" 2>/dev/null
+then
+    ${VIRTUALENV_PATH}/bin/python -m live_agent.modules.chatbot.src.nltk_resources
+    assert_ok $?
+fi
+
 ##########
 echo "[STEP 2] COPY RESOURCES TO RELEASE"
 
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+# Loaded from its file, importing the chatbot package requires chatterbot
+ASSETS_PATH = os.path.join(
+    os.path.dirname(__file__), os.pardir, "live_agent", "modules", "chatbot", "src", "assets.py"
+)
+spec = importlib.util.spec_from_file_location("assets", ASSETS_PATH)
+assets = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(assets)
+
+SETTINGS = {"live": {"url": "http://live.test", "username": "tester"}}
+
+
+class AssetCatalogFirstLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.catalog = assets.AssetCatalog(SETTINGS, directory=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_empty_first_load_returns_an_empty_list(self):
+        with mock.patch.object(assets, "list_assets", return_value=[]):
+            self.assertEqual(self.catalog.list_assets(), [])
+
+    def test_failed_first_load_returns_an_empty_list(self):
+        with mock.patch.object(assets, "list_assets", side_effect=OSError("unreachable")):
+            self.assertEqual(self.catalog.list_assets(), [])
+
+    def test_empty_results_are_not_cached(self):
+        with mock.patch.object(assets, "list_assets", return_value=[]):
+            self.catalog.list_assets()
+
+        asset_list = [{"id": 1, "name": "rig"}]
+        with mock.patch.object(assets, "list_assets", return_value=asset_list):
+            self.assertEqual(self.catalog.list_assets(), asset_list)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import random
+import unittest
+
+# Loaded from its file, importing the chatbot package requires chatterbot
+CURVES_PATH = os.path.join(
+    os.path.dirname(__file__), os.pardir, "live_agent", "modules", "chatbot", "src", "curves.py"
+)
+spec = importlib.util.spec_from_file_location("curves", CURVES_PATH)
+curves = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(curves)
+
+CurveMatcher = curves.CurveMatcher
+
+
+def brute_force_match(curve_names, text):
+    """The scan over every curve which `CurveMatcher` replaced"""
+    words = text.split()
+    mentions = {}
+    for curve in curve_names:
+        if curve.upper() in text.upper():
+            mentions[curve] = {"exact": curve in words}
+
+    return mentions
+
+
+class CurveMatcherTest(unittest.TestCase):
+    curve_names = ["ROP", "ROPA", "WOB", "SPP", "Hook Load", "TORQUE", "PP"]
+
+    def setUp(self):
+        self.matcher = CurveMatcher(self.curve_names)
+
+    def test_exact_mentions_are_whole_words(self):
+        mentions = self.matcher.match("what is the ROP now?")
+        self.assertEqual(mentions, {"ROP": {"exact": True}})
+
+    def test_lenient_mentions_ignore_the_case(self):
+        mentions = self.matcher.match("show me the rop")
+        self.assertEqual(mentions, {"ROP": {"exact": False}})
+
+    def test_overlapping_names_are_all_found(self):
+        # "SPP" contains "PP" and "ROPA" contains "ROP"
+        mentions = self.matcher.match("ROPA and SPP")
+        self.assertEqual(
+            mentions,
+            {
+                "ROP": {"exact": False},
+                "ROPA": {"exact": True},
+                "SPP": {"exact": True},
+                "PP": {"exact": False},
+            },
+        )
+
+    def test_mentions_follow_the_order_of_the_curves(self):
+        mentions = self.matcher.match("torque, wob and rop")
+        self.assertEqual(list(mentions), ["ROP", "WOB", "TORQUE"])
+
+    def test_names_with_spaces_are_found(self):
+        mentions = self.matcher.match("what is the hook load?")
+        self.assertEqual(mentions, {"Hook Load": {"exact": False}})
+
+    def test_no_curves(self):
+        self.assertEqual(CurveMatcher([]).match("what is the rop?"), {})
+        self.assertEqual(self.matcher.match(""), {})
+
+    def test_matches_the_brute_force_search(self):
+        random_generator = random.Random(42)
+        alphabet = "ABOPR "
+        curve_names = sorted(
+            set(
+                "".join(random_generator.choice(alphabet[:-1]) for _index in range(size))
+                for size in random_generator.choices(range(1, 5), k=40)
+            )
+        )
+        matcher = CurveMatcher(curve_names)
+
+        for _index in range(500):
+            size = random_generator.randrange(30)
+            text = "".join(
+                random_generator.choice(alphabet + alphabet.lower()) for _ in range(size)
+            )
+            self.assertEqual(matcher.match(text), brute_force_match(curve_names, text), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from live_client.events import raw
+from live_client.utils.timestamp import get_timestamp
+
+from live_agent.services.output import EventBuffer
+
+
+class RestInputStub(BaseHTTPRequestHandler):
+    """Records the batches posted to the REST input"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        server.gate.wait()
+
+        with server.lock:
+            failed = server.failures > 0
+            if failed:
+                server.failures -= 1
+            else:
+                server.batches.append(body)
+
+        self.send_response(500 if failed else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def build_event(index):
+    return {"TIME": {"value": index, "uom": "s"}}
+
+
+def event_size():
+    return len(json.dumps(raw.format_event(build_event(0), "test", get_timestamp())))
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+
+    return True
+
+
+class EventBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RestInputStub)
+        self.server.daemon_threads = True
+        self.server.batches = []
+        self.server.failures = 0
+        self.server.lock = threading.Lock()
+        self.server.gate = threading.Event()
+        self.server.gate.set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.live_settings = {
+            "url": f"http://127.0.0.1:{self.server.server_port}",
+            "rest_input": "/services/plugin-restinput/test/",
+            "username": "test",
+            "password": "test",
+        }
+        self.buffers = []
+
+    def tearDown(self):
+        self.server.gate.set()
+        for event_buffer in self.buffers:
+            event_buffer.close(timeout=5)
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def build_buffer(self, **kwargs):
+        kwargs.setdefault("max_latency", 60)
+        event_buffer = EventBuffer(self.live_settings, **kwargs)
+        self.buffers.append(event_buffer)
+        return event_buffer
+
+    def sent_events(self):
+        with self.server.lock:
+            return [event["TIME"]["value"] for batch in self.server.batches for event in batch]
+
+    def test_full_batch_is_sent_without_waiting(self):
+        event_buffer = self.build_buffer(max_events=3)
+        for index in range(7):
+            event_buffer.create("test", build_event(index))
+
+        self.assertTrue(wait_until(lambda: len(self.sent_events()) == 6))
+        self.assertEqual([len(batch) for batch in self.server.batches], [3, 3])
+
+        event_buffer.flush(timeout=5)
+        self.assertEqual(self.sent_events(), list(range(7)))
+
+    def test_batch_is_sent_once_it_reaches_max_bytes(self):
+        event_buffer = self.build_buffer(max_bytes=event_size() * 2)
+        for index in range(5):
+            event_buffer.create("test", build_event(index))
+
+        self.assertTrue(wait_until(lambda: len(self.sent_events()) == 4))
+        self.assertEqual([len(batch) for batch in self.server.batches], [2, 2])
+
+    def test_batch_is_sent_after_max_latency(self):
+        event_buffer = self.build_buffer(max_latency=0.3)
+        started_at = time.monotonic()
+        event_buffer.create("test", build_event(0))
+
+        self.assertTrue(wait_until(lambda: self.sent_events() == [0]))
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.3)
+
+    def test_drop_overflow_discards_the_oldest_events(self):
+        self.server.gate.clear()
+        event_buffer = self.build_buffer(
+            max_events=1, max_pending_bytes=event_size() * 3, overflow="drop"
+        )
+
+        # The first event is sent right away and holds the sender thread
+        event_buffer.create("test", build_event(0))
+        self.assertTrue(wait_until(lambda: event_buffer.sending))
+        for index in range(1, 10):
+            event_buffer.create("test", build_event(index))
+
+        self.server.gate.set()
+        event_buffer.flush(timeout=5)
+
+        sent_events = self.sent_events()
+        self.assertEqual(sent_events[0], 0)
+        self.assertEqual(sent_events[-1], 9)
+        self.assertLess(len(sent_events), 10)
+        self.assertEqual(event_buffer.stats["events_dropped"], 10 - len(sent_events))
+
+    def test_block_overflow_waits_for_the_pending_events(self):
+        self.server.gate.clear()
+        event_buffer = self.build_buffer(max_events=1, max_pending_bytes=event_size() * 3)
+
+        event_buffer.create("test", build_event(0))
+        self.assertTrue(wait_until(lambda: event_buffer.sending))
+
+        producer = threading.Thread(
+            target=lambda: [event_buffer.create("test", build_event(i)) for i in range(1, 10)]
+        )
+        producer.start()
+        producer.join(0.5)
+        self.assertTrue(producer.is_alive())
+
+        self.server.gate.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+
+        event_buffer.flush(timeout=5)
+        self.assertEqual(self.sent_events(), list(range(10)))
+        self.assertEqual(event_buffer.stats["events_dropped"], 0)
+
+    def test_checkpoints_of_failed_batches_are_not_saved(self):
+        checkpoints = []
+        self.server.failures = 1
+        event_buffer = self.build_buffer(on_sent=checkpoints.append)
+
+        for index in range(4):
+            event_buffer.create("test", build_event(index), checkpoint=index)
+            if index % 2:
+                event_buffer.flush(timeout=5)
+
+        self.assertEqual(self.sent_events(), [2, 3])
+        self.assertEqual(checkpoints, [3])
+        self.assertEqual(event_buffer.stats["send_errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from live_agent.modules.las.utils.reader import LASReader
+
+NULL_VALUE = -999.25
+NUM_ROWS = 250
+
+HEADER = """~Version Information
+ VERS.                  2.0 : CWLS LOG ASCII STANDARD - VERSION 2.0
+ WRAP.                   NO : One line per depth step
+~Well Information
+ STRT.M              1000.0 : Start depth
+ STOP.M              1249.0 : Stop depth
+ STEP.M                 1.0 : Step
+ NULL.              -999.25 : Null value
+ WELL.               TEST-1 : Well name
+~Curve Information
+ DEPT.M                     : Depth
+ ROP .m/h                   : Rate of penetration
+ WOB .klbf                  : Weight on bit
+~ASCII Log Data
+"""
+
+
+def build_rows(num_rows=NUM_ROWS):
+    rows = []
+    for row_number in range(num_rows):
+        rop = NULL_VALUE if row_number % 17 == 0 else row_number * 0.5
+        rows.append((1000.0 + row_number, rop, row_number % 11))
+
+    return rows
+
+
+def write_las(path, rows, with_comments=True):
+    with open(path, "w") as las_file:
+        las_file.write(HEADER)
+        for row_number, row in enumerate(rows):
+            if with_comments and row_number % 50 == 25:
+                las_file.write("# a comment inside the data section\n\n")
+
+            las_file.write(" ".join(f"{value:>10}" for value in row) + "\n")
+
+
+class LASReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "well.las")
+        self.rows = build_rows()
+        write_las(self.path, self.rows)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_rows(self, reader, **kwargs):
+        rows = []
+        for index_values, values in reader.blocks(**kwargs):
+            self.assertEqual(len(index_values), len(values))
+            rows.extend(
+                (index_value, *row) for index_value, row in zip(index_values, values.tolist())
+            )
+
+        return rows
+
+    def expected_rows(self, start_after=None):
+        expected = []
+        for depth, rop, wob in self.rows:
+            if start_after is None or depth > start_after:
+                expected.append((depth, np.nan if rop == NULL_VALUE else rop, wob))
+
+        return expected
+
+    def assertRowsEqual(self, rows, expected):
+        np.testing.assert_array_equal(np.array(rows), np.array(expected))
+
+    def test_header_is_parsed(self):
+        reader = LASReader(self.path)
+        self.assertEqual([curve.mnemonic for curve in reader.curves], ["DEPT", "ROP", "WOB"])
+        self.assertEqual(reader.well["WELL"].value, "TEST-1")
+        self.assertEqual(reader.null_value, NULL_VALUE)
+
+    def test_blocks_read_every_row(self):
+        reader = LASReader(self.path)
+        blocks = list(reader.blocks(chunk_size=100))
+
+        self.assertEqual([len(index_values) for index_values, _values in blocks], [100, 100, 50])
+        self.assertRowsEqual(self.read_rows(reader, chunk_size=100), self.expected_rows())
+
+    def test_resume_skips_the_rows_already_read(self):
+        reader = LASReader(self.path, index_step=20)
+        for start_after in [999.0, 1000.0, 1019.0, 1020.0, 1020.5, 1137.0, 1248.0]:
+            self.assertRowsEqual(
+                self.read_rows(reader, chunk_size=64, start_after=start_after),
+                self.expected_rows(start_after),
+            )
+
+        self.assertEqual(list(reader.blocks(start_after=1249.0)), [])
+
+    def test_index_is_stored_on_a_sidecar_file(self):
+        LASReader(self.path, index_step=20).find_offset(1100.0)
+        self.assertTrue(os.path.exists(f"{self.path}.index.npz"))
+
+        # A new reader uses the stored index, without reading the whole file
+        reader = LASReader(self.path, index_step=20)
+        with mock.patch.object(reader, "build_index", side_effect=AssertionError) as build_index:
+            rows = self.read_rows(reader, start_after=1100.0)
+
+        build_index.assert_not_called()
+        self.assertRowsEqual(rows, self.expected_rows(1100.0))
+
+    def test_index_is_rebuilt_when_the_file_changes(self):
+        LASReader(self.path, index_step=20).find_offset(1100.0)
+
+        self.rows = build_rows(num_rows=NUM_ROWS + 100)
+        write_las(self.path, self.rows, with_comments=False)
+
+        reader = LASReader(self.path, index_step=20)
+        with mock.patch.object(reader, "build_index", wraps=reader.build_index) as build_index:
+            rows = self.read_rows(reader, start_after=1300.0)
+
+        build_index.assert_called_once()
+        self.assertRowsEqual(rows, self.expected_rows(1300.0))
+
+    def test_corrupted_index_is_rebuilt(self):
+        with open(f"{self.path}.index.npz", "wb") as index_file:
+            index_file.write(b"not an index")
+
+        reader = LASReader(self.path, index_step=20)
+        self.assertRowsEqual(self.read_rows(reader, start_after=1200.0), self.expected_rows(1200.0))
+
+    def test_wrapped_files_are_rejected(self):
+        with open(self.path) as las_file:
+            contents = las_file.read().replace("WRAP.                   NO", "WRAP.  YES")
+
+        with open(self.path, "w") as las_file:
+            las_file.write(contents)
+
+        with self.assertRaises(ValueError):
+            LASReader(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
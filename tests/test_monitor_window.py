@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+import unittest
+
+import numpy as np
+
+from live_agent.services.monitors.utils.columns import ColumnsWindow
+from live_agent.services.monitors.utils.query import EventsWindow, build_window, handle_events
+from live_agent.services.monitors.utils.stats import build_statistics
+
+WINDOW_DURATION = 10
+STATISTICS = {
+    "rop_sum": {"type": "sum", "mnemonic": "ROP"},
+    "rop_mean": {"type": "mean", "mnemonic": "ROP"},
+    "rop_variance": {"type": "variance", "mnemonic": "ROP", "ddof": 1},
+    "rop_min": {"type": "min", "mnemonic": "ROP"},
+    "rop_max": {"type": "max", "mnemonic": "ROP"},
+    "rop_trend": {"type": "linear_regression", "mnemonic": "ROP"},
+}
+SETTINGS = {
+    "monitor": {
+        "window_duration": WINDOW_DURATION,
+        "mnemonics": {"index": "timestamp", "rop": "ROP", "wob": "WOB"},
+        "statistics": STATISTICS,
+    }
+}
+
+
+def generate_batches(seed, num_batches=300):
+    """
+    Batches of events with increasing timestamps, some values missing
+    and a few jumps back in time, which reset the window
+    """
+    random_generator = random.Random(seed)
+    timestamp = 0.0
+    batches = []
+    for _index in range(num_batches):
+        batch = []
+        for _item in range(random_generator.randint(1, 4)):
+            if random_generator.random() < 0.01:
+                timestamp -= 50
+
+            timestamp += random_generator.choice([0.5, 1, 2, 3])
+            rop = random_generator.uniform(0, 100) if random_generator.random() > 0.1 else None
+            batch.append({"timestamp": timestamp, "ROP": rop, "WOB": random_generator.random()})
+
+        batches.append(batch)
+
+    return batches
+
+
+def brute_force_window(events):
+    """The events kept by a window, computed from every event received"""
+    window = []
+    for item in events:
+        if window and item["timestamp"] < window[-1]["timestamp"]:
+            window = []
+
+        window.append(item)
+
+    end = window[-1]["timestamp"]
+    return [item for item in window if item["timestamp"] >= end - WINDOW_DURATION]
+
+
+def brute_force_statistics(window):
+    points = [(item["timestamp"], item["ROP"]) for item in window if item["ROP"] is not None]
+    values = [value for _index, value in points]
+    if not values:
+        return {name: math.nan for name in STATISTICS if name != "rop_sum"}
+
+    results = {
+        "rop_sum": sum(values),
+        "rop_mean": float(np.mean(values)),
+        "rop_variance": float(np.var(values, ddof=1)) if len(values) > 1 else math.nan,
+        "rop_min": min(values),
+        "rop_max": max(values),
+        "rop_trend": math.nan,
+    }
+
+    index = np.array([index for index, _value in points])
+    if len(points) > 1 and index.var() > 0:
+        results["rop_trend"] = float(np.polyfit(index, values, 1)[0])
+
+    return results
+
+
+class WindowTestMixin(object):
+    window_mode = None
+
+    def build_window(self):
+        settings = {"monitor": dict(SETTINGS["monitor"], window_mode=self.window_mode)}
+        return build_window(settings)
+
+    def window_indexes(self, window):
+        raise NotImplementedError
+
+    def assertStatistics(self, window, expected, message):
+        for name, value in expected.items():
+            actual = window.statistics[name].value
+            if math.isnan(value):
+                self.assertTrue(math.isnan(actual), f"{name} on {message}")
+            else:
+                self.assertAlmostEqual(actual, value, places=6, msg=f"{name} on {message}")
+
+    def test_window_matches_the_brute_force_computation(self):
+        for seed in range(5):
+            window = self.build_window()
+            received = []
+
+            for batch_number, batch in enumerate(generate_batches(seed)):
+                received.extend(batch)
+                window.add(batch)
+                expected_window = brute_force_window(received)
+
+                message = f"batch {batch_number} of seed {seed}"
+                self.assertEqual(
+                    self.window_indexes(window),
+                    [item["timestamp"] for item in expected_window],
+                    message,
+                )
+                self.assertStatistics(window, brute_force_statistics(expected_window), message)
+
+    def test_handle_events_calls_back_with_the_window(self):
+        windows = []
+        accumulator = self.build_window()
+        for batch in generate_batches(seed=1, num_batches=20):
+            event = {"data": {"content": batch}}
+            accumulator = handle_events(event, windows.append, SETTINGS, accumulator=accumulator)
+
+        self.assertEqual(len(windows), 20)
+        self.assertIs(windows[-1], accumulator)
+
+    def test_events_missing_curves_are_ignored(self):
+        window = self.build_window()
+        calls = []
+        event = {"data": {"content": [{"timestamp": 1, "ROP": 10}]}}
+        window = handle_events(event, calls.append, SETTINGS, accumulator=window)
+
+        self.assertEqual(calls, [])
+        self.assertEqual(len(window), 0)
+
+
+class EventsWindowTest(WindowTestMixin, unittest.TestCase):
+    window_mode = "events"
+
+    def window_indexes(self, window):
+        self.assertIsInstance(window, EventsWindow)
+        return [item["timestamp"] for item in window]
+
+    def test_list_accumulators_are_updated_in_place(self):
+        events = []
+        received = []
+        for batch in generate_batches(seed=2, num_batches=50):
+            received.extend(batch)
+            handle_events({"data": {"content": batch}}, lambda window: None, SETTINGS, events)
+
+        self.assertEqual(events, brute_force_window(received))
+
+
+class ColumnsWindowTest(WindowTestMixin, unittest.TestCase):
+    window_mode = "columns"
+
+    def window_indexes(self, window):
+        self.assertIsInstance(window, ColumnsWindow)
+        return window.index.tolist()
+
+    def test_columns_match_the_events(self):
+        received = []
+        # A small buffer, so it is compacted and grown while the events are added
+        window = ColumnsWindow(
+            "timestamp",
+            WINDOW_DURATION,
+            ["ROP", "WOB"],
+            capacity=4,
+            statistics=build_statistics(STATISTICS),
+        )
+
+        for batch in generate_batches(seed=3):
+            received.extend(batch)
+            window.add(batch)
+
+            expected_window = brute_force_window(received)
+            expected_rop = [
+                np.nan if item["ROP"] is None else item["ROP"] for item in expected_window
+            ]
+            np.testing.assert_array_equal(window["ROP"], expected_rop)
+            np.testing.assert_array_equal(window["WOB"], [item["WOB"] for item in expected_window])
+
+            expected = brute_force_statistics(expected_window)
+            for name, method in [("rop_mean", "mean"), ("rop_min", "min"), ("rop_max", "max")]:
+                if not math.isnan(expected[name]):
+                    self.assertAlmostEqual(getattr(window, method)("ROP"), expected[name])
+
+            if not math.isnan(expected["rop_trend"]):
+                self.assertAlmostEqual(window.slope("ROP"), expected["rop_trend"])
+
+    def test_rolling_matches_the_brute_force_computation(self):
+        window = ColumnsWindow("timestamp", 100, ["WOB"], capacity=4)
+        values = [float(index % 7) for index in range(20)]
+        window.add([{"timestamp": index, "WOB": value} for index, value in enumerate(values)])
+
+        expected = [np.mean(values[start : start + 3]) for start in range(len(values) - 2)]
+        np.testing.assert_allclose(window.rolling("WOB", 3), expected)
+        np.testing.assert_allclose(window.rolling("WOB", 3, func=np.mean), expected)
+        self.assertEqual(len(window.rolling("WOB", 30)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import os
+import queue
+import unittest
+from multiprocessing import get_context as get_mp_context
+
+from live_client.events.constants import EVENT_TYPE_DESTROY, EVENT_TYPE_EVENT
+
+from live_agent.services import multiplexer
+from live_agent.services.multiplexer import EventStream, start_multiplexer
+
+FAILURE = "fail"
+
+
+class FailingQueue(object):
+    """Raises like a broken query queue once it receives `FAILURE`"""
+
+    def __init__(self, events_queue):
+        self.events_queue = events_queue
+
+    def get(self, timeout=None):
+        event = self.events_queue.get(timeout=timeout)
+        if event == FAILURE:
+            raise OSError("Upstream query failed")
+
+        return event
+
+
+class FakeEventSource(object):
+    """
+    Replaces `live_client.query.run` inside the multiplexer process.
+
+    The queues are created before the multiplexer is forked, so the tests can feed them
+    """
+
+    def __init__(self, statements):
+        mp = get_mp_context("fork")
+        self.started = mp.Queue()
+        self.queues = dict((statement, mp.Queue()) for statement in statements)
+
+    def __call__(self, statement, settings, **query_args):
+        self.started.put(statement)
+        if statement not in self.queues:
+            raise OSError(f"Cannot run '{statement}'")
+
+        return None, FailingQueue(self.queues[statement])
+
+    def put(self, statement, event):
+        self.queues[statement].put(event)
+
+    def count_started(self, timeout=5):
+        started = []
+        while True:
+            try:
+                started.append(self.started.get(timeout=timeout))
+            except queue.Empty:
+                return len(started)
+
+            timeout = 0.2
+
+
+def build_event(value, event_type=EVENT_TYPE_EVENT):
+    return {"data": {"type": event_type, "content": [{"value": value}]}}
+
+
+def read_values(stream, timeout=5):
+    event = stream.get(timeout=timeout)
+    if event is None:
+        return None
+
+    return [item["value"] for item in event["data"]["content"]]
+
+
+class MultiplexerTest(unittest.TestCase):
+    statements = ["rig1 mnemonic:ROP", "rig2 mnemonic:ROP"]
+
+    def setUp(self):
+        self.event_source = FakeEventSource(self.statements)
+        self.multiplexer = start_multiplexer({}, event_source=self.event_source)
+        self.assertIsNotNone(self.multiplexer)
+        self.streams = []
+
+    def tearDown(self):
+        for stream in self.streams:
+            stream.close()
+
+        self.multiplexer.process.terminate()
+        self.multiplexer.process.join()
+        if os.path.exists(self.multiplexer.address):
+            os.unlink(self.multiplexer.address)
+
+        multiplexer._multiplexer = None
+
+    def open_stream(self, statement):
+        stream = EventStream(statement, {})
+        self.assertIsNotNone(stream.connection)
+        self.streams.append(stream)
+        return stream
+
+    def assertStreamEnds(self, stream):
+        with self.assertRaises(EOFError):
+            # Only the markers sent before the failure may be left
+            for _index in range(50):
+                if stream.get(timeout=5) is None:
+                    break
+
+    def join(self, statement, stream):
+        """Sends markers until the stream receives one, so it is surely subscribed"""
+        for index in range(50):
+            self.event_source.put(statement, build_event(f"marker-{index}"))
+            if read_values(stream, timeout=0.1) is not None:
+                break
+        else:
+            self.fail(f"The stream never subscribed to '{statement}'")
+
+        # Drops the other markers already sent
+        while read_values(stream, timeout=0.2) is not None:
+            pass
+
+    def test_events_are_sent_to_every_subscriber(self):
+        statement = self.statements[0]
+        streams = [self.open_stream(statement) for _index in range(3)]
+        for stream in streams:
+            self.join(statement, stream)
+
+        # Drops the markers sent while the other streams joined
+        for stream in streams:
+            while read_values(stream, timeout=0.2) is not None:
+                pass
+
+        self.event_source.put(statement, build_event(1))
+        for stream in streams:
+            self.assertEqual(read_values(stream), [1])
+
+        self.assertEqual(self.event_source.count_started(), 1)
+
+    def test_identical_queries_differing_by_whitespace_are_shared(self):
+        statement = self.statements[0]
+        first_stream = self.open_stream(statement)
+        self.join(statement, first_stream)
+
+        second_stream = self.open_stream(f"  {statement.replace(' ', '   ')}\n")
+        self.join(statement, second_stream)
+
+        self.assertEqual(self.event_source.count_started(), 1)
+
+    def test_late_subscribers_only_receive_new_events(self):
+        statement = self.statements[0]
+        first_stream = self.open_stream(statement)
+        self.join(statement, first_stream)
+
+        self.event_source.put(statement, build_event(1))
+        self.assertEqual(read_values(first_stream), [1])
+
+        second_stream = self.open_stream(statement)
+        self.join(statement, second_stream)
+        while read_values(first_stream, timeout=0.2) is not None:
+            pass
+
+        self.event_source.put(statement, build_event(2))
+        self.assertEqual(read_values(first_stream), [2])
+        self.assertEqual(read_values(second_stream), [2])
+        self.assertEqual(self.event_source.count_started(), 1)
+
+    def test_different_queries_are_not_shared(self):
+        streams = [self.open_stream(statement) for statement in self.statements]
+        for statement, stream in zip(self.statements, streams):
+            self.join(statement, stream)
+
+        self.event_source.put(self.statements[1], build_event(2))
+        self.assertEqual(read_values(streams[1]), [2])
+        self.assertIsNone(read_values(streams[0], timeout=0.5))
+        self.assertEqual(self.event_source.count_started(), 2)
+
+    def test_subscribers_are_disconnected_when_the_upstream_query_fails(self):
+        statement = self.statements[0]
+        streams = [self.open_stream(statement) for _index in range(2)]
+        for stream in streams:
+            self.join(statement, stream)
+
+        self.event_source.put(statement, FAILURE)
+        for stream in streams:
+            self.assertStreamEnds(stream)
+
+    def test_subscribers_are_disconnected_when_the_query_cannot_start(self):
+        stream = self.open_stream("missing mnemonic:ROP")
+        self.assertStreamEnds(stream)
+
+    def test_destroy_event_finishes_the_query(self):
+        statement = self.statements[0]
+        stream = self.open_stream(statement)
+        self.join(statement, stream)
+
+        self.event_source.put(statement, build_event(None, event_type=EVENT_TYPE_DESTROY))
+        event = stream.get(timeout=5)
+        self.assertEqual(event["data"]["type"], EVENT_TYPE_DESTROY)
+
+        # A new subscriber starts a new query
+        new_stream = self.open_stream(statement)
+        self.join(statement, new_stream)
+        self.assertEqual(self.event_source.count_started(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import pickle
+import queue
+import threading
+import time
+import unittest
+from multiprocessing import get_context as get_mp_context
+
+from live_agent.services.shared_queue import SharedMemoryQueue
+
+CAPACITY = 4096
+
+
+def produce(events_queue, num_items):
+    # Attached by name, like the processes created by the zygote
+    events_queue = pickle.loads(events_queue)
+    for index in range(num_items):
+        events_queue.put({"index": index, "message": "x" * (index % 300)})
+
+    events_queue.close()
+
+
+class SharedMemoryQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queues = []
+
+    def tearDown(self):
+        for events_queue in self.queues:
+            events_queue.unlink()
+
+    def build_queue(self, **kwargs):
+        events_queue = SharedMemoryQueue(**kwargs)
+        self.queues.append(events_queue)
+        return events_queue
+
+    def test_items_keep_their_order_when_the_buffer_wraps(self):
+        events_queue = self.build_queue(capacity=CAPACITY)
+
+        expected = []
+        received = []
+        for index in range(500):
+            item = {"index": index, "message": "x" * (index * 7 % 500)}
+            events_queue.put(item, timeout=1)
+            expected.append(item)
+
+            # Keeps a few items pending, so frames end at every position of the buffer
+            while events_queue.qsize() > 3:
+                received.append(events_queue.get(timeout=1))
+
+        while not events_queue.empty():
+            received.append(events_queue.get(timeout=1))
+
+        self.assertEqual(received, expected)
+        self.assertGreater(events_queue.read_header()[0], 10 * CAPACITY)
+        self.assertEqual(events_queue.stats["pending"], 0)
+        self.assertEqual(events_queue.stats["received"], 500)
+
+    def test_drop_overflow_discards_new_items(self):
+        events_queue = self.build_queue(capacity=CAPACITY, overflow="drop")
+
+        for index in range(100):
+            events_queue.put({"index": index, "message": "x" * 100})
+
+        stats = events_queue.stats
+        self.assertGreater(stats["dropped"], 0)
+        self.assertEqual(stats["sent"] + stats["dropped"], 100)
+
+        received = []
+        while not events_queue.empty():
+            received.append(events_queue.get_nowait()["index"])
+
+        self.assertEqual(received, list(range(stats["sent"])))
+
+    def test_block_overflow_times_out(self):
+        events_queue = self.build_queue(capacity=CAPACITY)
+        while True:
+            try:
+                events_queue.put_nowait("x" * 100)
+            except queue.Full:
+                break
+
+        started_at = time.monotonic()
+        with self.assertRaises(queue.Full):
+            events_queue.put("x" * 100, timeout=0.2)
+
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.2)
+        self.assertEqual(events_queue.stats["dropped"], 0)
+
+    def test_block_overflow_waits_for_the_consumer(self):
+        events_queue = self.build_queue(capacity=CAPACITY)
+        num_items = 200
+
+        items = [(index, "x" * 100) for index in range(num_items)]
+
+        producer = threading.Thread(
+            target=lambda: [events_queue.put(item, timeout=5) for item in items]
+        )
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+
+        received = [events_queue.get(timeout=5) for _index in range(num_items)]
+        producer.join(5)
+
+        self.assertEqual(received, items)
+        self.assertEqual(events_queue.stats["dropped"], 0)
+
+    def test_items_larger_than_half_the_buffer_are_rejected(self):
+        events_queue = self.build_queue(capacity=CAPACITY)
+
+        with self.assertRaises(ValueError):
+            events_queue.put("x" * (CAPACITY // 2))
+
+        self.assertTrue(events_queue.empty())
+
+    def test_get_times_out_on_an_empty_queue(self):
+        events_queue = self.build_queue(capacity=CAPACITY)
+
+        with self.assertRaises(queue.Empty):
+            events_queue.get(timeout=0.1)
+
+        with self.assertRaises(queue.Empty):
+            events_queue.get_nowait()
+
+    def test_items_are_received_from_another_process(self):
+        events_queue = self.build_queue(capacity=CAPACITY)
+        num_items = 2000
+
+        mp = get_mp_context("fork")
+        producer = mp.Process(target=produce, args=(pickle.dumps(events_queue), num_items))
+        producer.start()
+
+        received = [events_queue.get(timeout=5) for _index in range(num_items)]
+        producer.join(5)
+
+        self.assertEqual([item["index"] for item in received], list(range(num_items)))
+        self.assertEqual(received[299]["message"], "x" * 299)
+        self.assertEqual(producer.exitcode, 0)
+        self.assertEqual(events_queue.stats["pending"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from live_agent.services.state import (
+    TIMESTAMP_KEY,
+    DillFileBackend,
+    SQLiteBackend,
+    StateManager,
+    configure,
+)
+
+
+class BackendTestMixin(object):
+    backend_class = None
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+
+        self.directory.cleanup()
+
+    def build_backend(self, name="process"):
+        backend = self.backend_class("identifier", name, directory=self.directory.name)
+        self.backends.append(backend)
+        return backend
+
+    def test_missing_state_loads_as_empty(self):
+        self.assertEqual(self.build_backend().load(), {})
+
+    def test_saved_state_is_loaded(self):
+        state = {"counter": 3, "events": [{"ROP": 1.5}], "seen": {"a", "b"}}
+        self.build_backend().save(state)
+
+        self.assertEqual(self.build_backend().load(), state)
+
+    def test_latest_state_replaces_the_previous_one(self):
+        backend = self.build_backend()
+        backend.save({"counter": 1, "removed": True})
+        backend.save({"counter": 2})
+
+        self.assertEqual(self.build_backend().load(), {"counter": 2})
+
+
+class DillFileBackendTest(BackendTestMixin, unittest.TestCase):
+    backend_class = DillFileBackend
+
+    def test_failed_write_keeps_the_previous_state(self):
+        backend = self.build_backend()
+        backend.save({"counter": 1})
+
+        with mock.patch("dill.dump", side_effect=OSError("No space left on device")):
+            with self.assertRaises(OSError):
+                backend.save({"counter": 2})
+
+        self.assertEqual(self.build_backend().load(), {"counter": 1})
+
+    def test_no_temporary_files_are_left(self):
+        backend = self.build_backend()
+        backend.save({"counter": 1})
+        backend.save({"counter": 2})
+
+        self.assertEqual(os.listdir(self.directory.name), [os.path.basename(backend.filename)])
+
+    def test_corrupted_file_loads_as_empty(self):
+        backend = self.build_backend()
+        with open(backend.filename, "wb") as state_file:
+            state_file.write(b"not a pickle")
+
+        self.assertEqual(backend.load(), {})
+
+
+class SQLiteBackendTest(BackendTestMixin, unittest.TestCase):
+    backend_class = SQLiteBackend
+
+    def count_rows(self, backend):
+        return backend.connection.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+
+    def test_only_changed_keys_are_written(self):
+        backend = self.build_backend()
+        backend.save({"unchanged": list(range(100)), "counter": 1})
+
+        total_changes = backend.connection.total_changes
+        backend.save({"unchanged": list(range(100)), "counter": 2})
+
+        self.assertEqual(backend.connection.total_changes - total_changes, 1)
+        self.assertEqual(self.build_backend().load()["counter"], 2)
+
+    def test_removed_keys_are_deleted(self):
+        backend = self.build_backend()
+        backend.save({"counter": 1, "removed": True})
+        backend.save({"counter": 1})
+
+        self.assertEqual(self.count_rows(backend), 1)
+
+    def test_legacy_state_is_imported(self):
+        DillFileBackend("identifier", "process", directory=self.directory.name).save({"counter": 1})
+
+        self.assertEqual(self.build_backend().load(), {"counter": 1})
+
+
+class StateManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        configure(directory=self.directory.name)
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+
+        configure()
+        self.directory.cleanup()
+
+    def build_manager(self, **kwargs):
+        manager = StateManager("process", **kwargs)
+        self.managers.append(manager)
+        return manager
+
+    def test_write_behind_saves_are_coalesced(self):
+        manager = self.build_manager(delay_between_updates=60)
+        with mock.patch.object(manager.backend, "save", wraps=manager.backend.save) as save:
+            for counter in range(10):
+                manager.save({"counter": counter})
+
+            self.assertFalse(os.path.exists(manager.filename))
+            manager.flush()
+
+        self.assertEqual(save.call_count, 1)
+        state = self.build_manager(write_behind=False).load()
+        self.assertEqual(state["counter"], 9)
+        self.assertIn(TIMESTAMP_KEY, state)
+
+    def test_pending_state_is_written_after_max_pending_updates(self):
+        manager = self.build_manager(delay_between_updates=60, max_pending_updates=5)
+        for counter in range(5):
+            manager.save({"counter": counter})
+
+        # Written by the background thread, without waiting for `delay_between_updates`
+        deadline = time.monotonic() + 5
+        while manager.pending_state is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        with manager.flush_lock:
+            self.assertEqual(self.build_manager(write_behind=False).load()["counter"], 4)
+
+    def test_failed_write_is_retried_on_the_next_flush(self):
+        manager = self.build_manager(delay_between_updates=60)
+        manager.save({"counter": 1})
+
+        with mock.patch.object(manager.backend, "save", side_effect=OSError("Disk full")):
+            manager.flush()
+
+        self.assertEqual(manager.pending_updates, 1)
+        manager.flush()
+        self.assertEqual(self.build_manager(write_behind=False).load()["counter"], 1)
+
+    def test_values_changed_after_save_are_written_with_their_latest_contents(self):
+        manager = self.build_manager(delay_between_updates=60)
+        events = [1]
+        state = {"events": events}
+        manager.save(state)
+
+        # The keys are copied on save, but not the values
+        events.append(2)
+        state["counter"] = 1
+        manager.flush()
+
+        state = self.build_manager(write_behind=False).load()
+        self.assertEqual(state["events"], [1, 2])
+        self.assertNotIn("counter", state)
+
+    def test_immediate_saves_are_throttled(self):
+        manager = self.build_manager(delay_between_updates=60, write_behind=False)
+        manager.save({"counter": 1})
+        manager.save({"counter": 2})
+        self.assertEqual(self.build_manager(write_behind=False).load()["counter"], 1)
+
+        manager.save({"counter": 3}, force=True)
+        self.assertEqual(self.build_manager(write_behind=False).load()["counter"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()